@@ -0,0 +1,86 @@
+# cim_cursor.py
+"""
+Keyset cursors for /v1/cim-records, which pages Mongo documents in
+(timestamp desc, _id desc) order.
+
+`timestamp` is whatever the publisher stored: usually a date or an ISO string,
+sometimes Unix seconds as a number. The token therefore carries the last
+document's timestamp as canonical Extended JSON, so it decodes to the same BSON
+type, and the "after" clause also selects every type that sorts below it.
+"""
+from __future__ import annotations
+
+import base64
+from typing import Any, Optional
+
+from bson import encode as bson_encode
+from bson import json_util
+
+# BSON sort groups, highest first: ($type aliases, element type codes).
+_BSON_DESC_GROUPS: tuple[tuple[tuple[str, ...], tuple[int, ...]], ...] = (
+    (("regex",), (0x0B,)),
+    (("timestamp",), (0x11,)),
+    (("date",), (0x09,)),
+    (("bool",), (0x08,)),
+    (("objectId",), (0x07,)),
+    (("binData",), (0x05,)),
+    (("object",), (0x03,)),
+    (("string", "symbol"), (0x02, 0x0E)),
+    (("number",), (0x01, 0x10, 0x12, 0x13)),
+)
+# Regexes and embedded documents would read as patterns/operators in the query, and
+# arrays sort by their elements, so documents with such timestamps end cursor paging.
+_UNPAGEABLE_CODES = (0x03, 0x04, 0x0B)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _sort_group(value: Any) -> Optional[int]:
+    code = bson_encode({"v": value})[4]
+    if code in _UNPAGEABLE_CODES:
+        return None
+    for i, (_, codes) in enumerate(_BSON_DESC_GROUPS):
+        if code in codes:
+            return i
+    return None
+
+
+def encode_cim_cursor(doc: dict[str, Any], fingerprint: str) -> Optional[str]:
+    """Cursor for the page after `doc`, or None if its timestamp cannot be a keyset position."""
+    ts = doc.get("timestamp")
+    if ts is not None and _sort_group(ts) is None:
+        return None
+    token = {"id": doc["_id"], "ts": ts, "q": fingerprint}
+    raw = json_util.dumps(token, json_options=json_util.CANONICAL_JSON_OPTIONS, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def cim_cursor_query(cursor: str, fingerprint: str) -> dict[str, Any]:
+    """
+    Mongo clause selecting documents after `cursor` in (timestamp desc, _id desc)
+    order. Raises InvalidCursor for malformed tokens or a different `fingerprint`.
+    """
+    try:
+        token = json_util.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_id = token["id"]
+        ts = token.get("ts")
+        group = None if ts is None else _sort_group(ts)
+    except Exception as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    if ts is not None and group is None:
+        raise InvalidCursor("Invalid cursor")
+    if token.get("q") != fingerprint:
+        raise InvalidCursor("cursor was issued for different filters")
+
+    # Same timestamp and a lower _id, then lower values of the same type, then every
+    # type that sorts below it, then null/missing timestamps (which sort last).
+    clauses: list[dict[str, Any]] = [{"timestamp": ts, "_id": {"$lt": last_id}}]
+    if ts is not None:
+        clauses.append({"timestamp": {"$lt": ts}})
+        lower = [alias for aliases, _ in _BSON_DESC_GROUPS[group + 1:] for alias in aliases]
+        if lower:
+            clauses.append({"timestamp": {"$type": lower}})
+        clauses.append({"timestamp": None})
+    return {"$or": clauses}
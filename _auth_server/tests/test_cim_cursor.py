@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+try:
+    from bson import ObjectId
+except ImportError:  # bson ships with pymongo
+    ObjectId = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+if ObjectId is not None:
+    from cim_cursor import InvalidCursor, cim_cursor_query, encode_cim_cursor
+
+requires_bson = unittest.skipIf(ObjectId is None, "pymongo/bson is not installed")
+
+OID = ObjectId("65a4f0000000000000000001") if ObjectId is not None else None
+
+
+@requires_bson
+class CimCursorTests(unittest.TestCase):
+    def _clauses(self, timestamp) -> list:
+        cursor = encode_cim_cursor({"_id": OID, "timestamp": timestamp}, "fp")
+        return cim_cursor_query(cursor, "fp")["$or"]
+
+    def test_timestamp_keeps_its_bson_type(self) -> None:
+        for ts in (1768468810, 1768468810.25, "2026-01-15T09:20:10Z", datetime(2026, 1, 15, 9, 20, 10)):
+            with self.subTest(ts=ts):
+                first = self._clauses(ts)[0]
+                self.assertEqual(first["_id"], {"$lt": OID})
+                self.assertEqual(first["timestamp"], ts)
+                self.assertIs(type(first["timestamp"]), type(ts))
+
+    def test_lower_sorting_types_follow_the_cursor(self) -> None:
+        date_clauses = self._clauses(datetime(2026, 1, 15))
+        self.assertIn({"timestamp": {"$type": ["bool", "objectId", "binData", "object", "string", "symbol", "number"]}}, date_clauses)
+        self.assertIn({"timestamp": {"$type": ["number"]}}, self._clauses("2026-01-15"))
+        # Numbers sort lowest: only smaller numbers, then null/missing timestamps.
+        self.assertEqual(
+            self._clauses(1768468810),
+            [
+                {"timestamp": 1768468810, "_id": {"$lt": OID}},
+                {"timestamp": {"$lt": 1768468810}},
+                {"timestamp": None},
+            ],
+        )
+        self.assertEqual(self._clauses(None), [{"timestamp": None, "_id": {"$lt": OID}}])
+
+    def test_unpageable_timestamps_end_paging(self) -> None:
+        self.assertIsNone(encode_cim_cursor({"_id": OID, "timestamp": [1, 2]}, "fp"))
+        self.assertIsNone(encode_cim_cursor({"_id": OID, "timestamp": {"$ne": None}}, "fp"))
+
+    def test_invalid_and_foreign_cursors(self) -> None:
+        cursor = encode_cim_cursor({"_id": OID, "timestamp": 5}, "fp")
+        with self.assertRaisesRegex(InvalidCursor, "different filters"):
+            cim_cursor_query(cursor, "other")
+        for bad in ("garbage", "e30"):  # "e30" is {}
+            with self.subTest(cursor=bad), self.assertRaisesRegex(InvalidCursor, "Invalid cursor"):
+                cim_cursor_query(bad, "fp")
+
+
+if __name__ == "__main__":
+    unittest.main()
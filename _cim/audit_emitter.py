@@ -0,0 +1,242 @@
+# audit_emitter.py
+"""
+Background emitter for ingestion-audit rows.
+
+Submissions hand their rows to an in-memory queue and return immediately. A worker
+thread posts them to the SQL adapter in batches (by size or age), retries with
+backoff, and spools batches it cannot deliver (or that overflow the queue) to
+JSONL files on disk. Spooled batches are replayed once the adapter accepts posts
+again. Audit delivery therefore never delays or fails a submission.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+PostFn = Callable[[List[Dict[str, Any]], Optional[str]], None]
+
+
+class AuditEmitter:
+    """
+    post: sends one batch of rows (raises on failure).
+    max_queue_rows: rows held in memory before new rows go straight to the spool.
+    batch_rows / flush_s: a batch is sent when it reaches batch_rows or its oldest row is flush_s old.
+    retries / backoff_s: attempts per batch before spooling it (exponential backoff).
+    spool_dir: where undeliverable batches are written; replayed with `replay_auth_header`
+        because caller tokens are not persisted to disk.
+    """
+
+    def __init__(
+        self,
+        post: PostFn,
+        *,
+        max_queue_rows: int = 50000,
+        batch_rows: int = 500,
+        flush_s: float = 2.0,
+        retries: int = 3,
+        backoff_s: float = 0.5,
+        spool_dir: Optional[Path] = None,
+        replay_auth_header: Optional[str] = None,
+        replay_interval_s: float = 30.0,
+    ) -> None:
+        self._post = post
+        self.max_queue_rows = max(1, max_queue_rows)
+        self.batch_rows = max(1, batch_rows)
+        self.flush_s = flush_s
+        self.retries = max(1, retries)
+        self.backoff_s = backoff_s
+        self.spool_dir = spool_dir
+        self.replay_auth_header = replay_auth_header
+        self.replay_interval_s = replay_interval_s
+
+        self._cond = threading.Condition()
+        self._queue: Deque[Tuple[float, Optional[str], Dict[str, Any]]] = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # Guards spool files for the short reads/writes only, never across a post.
+        self._spool_lock = threading.Lock()
+        self._last_replay = 0.0
+        self._stats_lock = threading.Lock()
+        self._stats = {"queued": 0, "sent": 0, "spooled": 0, "replayed": 0, "failed_posts": 0}
+
+    # --- producer side -------------------------------------------------------------
+
+    def submit(self, rows: List[Dict[str, Any]], auth_header: Optional[str]) -> None:
+        if not rows:
+            return
+        self._ensure_started()
+        now = time.monotonic()
+        overflow: List[Dict[str, Any]] = []
+        with self._cond:
+            for row in rows:
+                if len(self._queue) >= self.max_queue_rows:
+                    overflow.append(row)
+                else:
+                    self._queue.append((now, auth_header, row))
+            self._cond.notify()
+        self._count("queued", len(rows) - len(overflow))
+        if overflow:
+            print(f"[cim-audit] Queue full; spooling {len(overflow)} rows", flush=True)
+            self._spool(overflow)
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._cond:
+            stats["pending"] = len(self._queue)
+        return {**stats, "spool_files": len(self._spool_files())}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def stop(self, timeout_s: float = 10.0) -> None:
+        """Flush what can be sent within `timeout_s`; spool the rest."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout_s)
+        with self._cond:
+            leftover = [row for _, _, row in self._queue]
+            self._queue.clear()
+        if leftover:
+            self._spool(leftover)
+
+    # --- worker --------------------------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cim-audit-emitter", daemon=True)
+                self._thread.start()
+
+    def _take_batch(self) -> List[Tuple[Optional[str], Dict[str, Any]]]:
+        with self._cond:
+            while not self._stopping:
+                if len(self._queue) >= self.batch_rows:
+                    break
+                if self._queue:
+                    age = time.monotonic() - self._queue[0][0]
+                    if age >= self.flush_s:
+                        break
+                    self._cond.wait(self.flush_s - age)
+                else:
+                    self._cond.wait(self.replay_interval_s)
+                    if not self._queue:
+                        return []
+            count = min(self.batch_rows, len(self._queue))
+            return [self._queue.popleft()[1:] for _ in range(count)]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            groups: Dict[Optional[str], List[Dict[str, Any]]] = {}
+            for auth_header, row in batch:
+                groups.setdefault(auth_header, []).append(row)
+            delivered = True
+            for auth_header, rows in groups.items():
+                if self._send(rows, auth_header):
+                    self._count("sent", len(rows))
+                else:
+                    delivered = False
+                    self._spool(rows)
+            if delivered:
+                self._maybe_replay()
+            with self._cond:
+                if self._stopping and not self._queue:
+                    return
+
+    def _send(self, rows: List[Dict[str, Any]], auth_header: Optional[str]) -> bool:
+        for attempt in range(self.retries):
+            try:
+                self._post(rows, auth_header)
+                return True
+            except Exception as exc:
+                self._count("failed_posts")
+                print(f"[cim-audit] Post of {len(rows)} rows failed (attempt {attempt + 1}): {exc}", flush=True)
+                if attempt + 1 < self.retries and not self._stopping:
+                    time.sleep(self.backoff_s * (2 ** attempt))
+        return False
+
+    # --- spool ---------------------------------------------------------------------
+
+    def _spool_files(self) -> List[Path]:
+        if self.spool_dir is None or not self.spool_dir.is_dir():
+            return []
+        return sorted(self.spool_dir.glob("audit-*.jsonl"))
+
+    def _spool(self, rows: List[Dict[str, Any]]) -> None:
+        if self.spool_dir is None:
+            print(f"[cim-audit] Dropping {len(rows)} audit rows (no spool dir configured)", flush=True)
+            return
+        try:
+            with self._spool_lock:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+                path = self.spool_dir / f"audit-{int(time.time() // 60):012d}-{os.getpid()}.jsonl"
+                with path.open("a", encoding="utf-8") as f:
+                    for i in range(0, len(rows), self.batch_rows):
+                        f.write(json.dumps({"rows": rows[i:i + self.batch_rows]}) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._count("spooled", len(rows))
+        except OSError as exc:
+            print(f"[cim-audit] Failed to spool {len(rows)} audit rows: {exc}", flush=True)
+
+    def _maybe_replay(self) -> None:
+        now = time.monotonic()
+        if now - self._last_replay < self.replay_interval_s:
+            return
+        self._last_replay = now
+        current = f"audit-{int(time.time() // 60):012d}-{os.getpid()}.jsonl"
+        for path in self._spool_files():
+            if path.name == current:
+                # Still being appended to; replay it on a later pass.
+                continue
+            with self._spool_lock:
+                try:
+                    data = path.read_bytes()
+                except OSError:
+                    continue
+            # Posts (and their backoff) run without the lock so submit() can keep spooling.
+            lines = data.decode("utf-8", "replace").splitlines()
+            remaining: List[str] = []
+            for i, line in enumerate(lines):
+                try:
+                    rows = json.loads(line).get("rows") or []
+                except (json.JSONDecodeError, AttributeError):
+                    print(f"[cim-audit] Skipping corrupt spool line in {path.name}", flush=True)
+                    continue
+                if not self._send(rows, self.replay_auth_header):
+                    remaining = lines[i:]
+                    break
+                self._count("replayed", len(rows))
+            if not self._finish_replay(path, len(data), remaining):
+                return
+
+    def _finish_replay(self, path: Path, replayed_bytes: int, remaining: List[str]) -> bool:
+        """
+        Rewrite `path` with the lines not yet delivered plus anything appended while
+        they were being posted; delete it when nothing is left. Returns False when
+        delivery stopped early, so the caller leaves the other files for a later pass.
+        """
+        with self._spool_lock:
+            try:
+                appended = path.read_bytes()[replayed_bytes:]
+                if remaining or appended:
+                    keep = ("\n".join(remaining) + "\n").encode("utf-8") if remaining else b""
+                    tmp = path.with_suffix(".tmp")
+                    tmp.write_bytes(keep + appended)
+                    os.replace(tmp, path)
+                else:
+                    path.unlink(missing_ok=True)
+            except OSError as exc:
+                print(f"[cim-audit] Failed to update spool file {path.name}: {exc}", flush=True)
+        return not remaining
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Offline microbenchmark for the CNR conversion path.
+
+Runs each stage over a synthetic corpus (see `corpus.py`) and prints one JSON
+document with records/s and tracemalloc allocation figures per stage:
+
+    detect_payload_type        cnr_transform.detect_payload_type, per entry
+    convert                    CNRConverter.convert, whole batch
+    convert_columns            CNRConverter.convert_columns, whole batch
+    to_envelope                cim-service envelope mapping, per converted record
+    build_envelope             process_dump envelope mapping (+ timestamp defaults), per record
+
+The corpus is generated from a seed (or read with --corpus) and its fingerprint is
+part of the report, so runs on different commits can be diffed directly:
+
+    python _cim/benchmarks/bench_conversion.py --records 20000 --output conv_bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(REPO_ROOT / "scripts" / "batch_submit_cnr"))
+sys.path.insert(0, str(REPO_ROOT / "_cim"))
+sys.path.insert(0, str(REPO_ROOT / "shared"))
+from corpus import DEFAULT_MIX, corpus_fingerprint, generate_corpus, parse_mix
+from cnr_transform import CNRConverter, detect_payload_type
+from main import to_envelope  # cim-service; importing it does not start the server
+from process_dump import build_envelope
+
+STAGES = ("detect_payload_type", "convert", "convert_columns", "to_envelope", "build_envelope")
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "-C", str(REPO_ROOT), "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _stage_fns(entries: List[Dict[str, Any]]) -> Dict[str, Callable[[], Any]]:
+    # Fixed recorded_at keeps the work identical across runs.
+    converter = CNRConverter(recorded_at_fn=lambda: datetime(2026, 1, 1))
+    records = converter.convert(entries)
+
+    def _build_envelopes() -> List[Dict[str, Any]]:
+        # process_dump hands build_envelope copies (it fills in defaults in place).
+        return [
+            build_envelope(rec.payload_type, dict(rec.fact_site_event), rec.detail_table, dict(rec.detail_row))
+            for rec in records
+        ]
+
+    return {
+        "detect_payload_type": lambda: [detect_payload_type(e) for e in entries],
+        "convert": lambda: converter.convert(entries),
+        "convert_columns": lambda: converter.convert_columns(entries),
+        "to_envelope": lambda: [to_envelope(rec) for rec in records],
+        "build_envelope": _build_envelopes,
+    }
+
+
+def _allocations(fn: Callable[[], Any], count: int) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        blocks_before = sum(s.count for s in tracemalloc.take_snapshot().statistics("filename"))
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        blocks_after = sum(s.count for s in tracemalloc.take_snapshot().statistics("filename"))
+    finally:
+        tracemalloc.stop()
+    del result
+    return {
+        "peak_bytes_per_record": round((peak - before) / count, 1),
+        "retained_bytes_per_record": round((current - before) / count, 1),
+        "retained_blocks_per_record": round((blocks_after - blocks_before) / count, 2),
+    }
+
+
+def bench_stage(name: str, fn: Callable[[], Any], count: int, repeats: int) -> Dict[str, Any]:
+    fn()  # warm-up: fills the key-plan and timestamp-layout caches
+    samples = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "stage": name,
+        "records": count,
+        "records_per_s": round(count / median, 1),
+        "median_us_per_record": round(median / count * 1e6, 3),
+        "min_us_per_record": round(samples[0] / count * 1e6, 3),
+        "max_us_per_record": round(samples[-1] / count * 1e6, 3),
+        "allocations": _allocations(fn, count),
+    }
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the CNR conversion path on a synthetic corpus")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=20260101)
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--corpus", type=Path, default=None, help="JSON array written by corpus.py (overrides --records/--seed/--mix)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of: {', '.join(STAGES)}")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None, help="Write JSON here instead of stdout")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    if args.corpus:
+        entries = json.loads(args.corpus.read_text(encoding="utf-8"))
+        corpus_params: Dict[str, Any] = {"file": str(args.corpus)}
+    else:
+        mix = parse_mix(args.mix)
+        entries = generate_corpus(args.records, args.seed, mix)
+        corpus_params = {"records": args.records, "seed": args.seed, "mix": mix}
+
+    fns = _stage_fns(entries)
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in fns]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    payload_types: Dict[str, int] = {}
+    for entry in entries:
+        kind = detect_payload_type(entry)
+        payload_types[kind] = payload_types.get(kind, 0) + 1
+
+    report = {
+        "benchmark": "cnr_conversion",
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {**corpus_params, "entries": len(entries), "fingerprint": corpus_fingerprint(entries), "payload_types": payload_types},
+        "params": {"repeats": args.repeats},
+        "stages": [bench_stage(name, fns[name], len(entries), args.repeats) for name in stages],
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Offline benchmark for record timestamp parsing.
+
+Compares the previous per-call parser of `cnr_transform` (regex, `fromisoformat`,
+`strptime` fallbacks) with the shared layout-caching parser, on synthetic records
+carrying the three timestamp fields the converter reads. Prints one JSON document:
+
+    python _cim/benchmarks/bench_timestamp_parser.py --output ts_bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "shared"))
+from timestamp_parser import parse_timestamp
+
+FIELDS = ("submit_time", "start_exec", "stop_exec")
+
+# One layout per source, as publishers send them.
+LAYOUTS: Dict[str, Callable[[datetime], str]] = {
+    "dirac": lambda dt: dt.strftime("%Y-%m-%d %H:%M:%S"),
+    "iso_z": lambda dt: dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    "iso_z_micro": lambda dt: dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    "iso_offset": lambda dt: dt.isoformat(),
+    "unix": lambda dt: str(int(dt.timestamp())),
+}
+
+
+def legacy_parse_timestamp(v: Any) -> Optional[datetime]:
+    """`cnr_transform.parse_timestamp` before the shared parser, kept for comparison."""
+    if v is None:
+        return None
+    if isinstance(v, datetime):
+        dt = v
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timezone.utc)
+        return dt.replace(tzinfo=None)
+    s = str(v).strip()
+    if s == "":
+        return None
+    if re.fullmatch(r"\d{10}(\.\d+)?", s):
+        try:
+            return datetime.fromtimestamp(float(s), tz=timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            pass
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(s)
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timezone.utc)
+        return dt.replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f"):
+        try:
+            return datetime.strptime(s, fmt).replace(tzinfo=None)
+        except ValueError:
+            continue
+    return None
+
+
+def _records(layout: str, count: int, seed: int) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    fmt = LAYOUTS[layout]
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    out = []
+    for _ in range(count):
+        submit = base + timedelta(seconds=rng.randrange(90 * 86400), microseconds=rng.randrange(10**6))
+        start = submit + timedelta(seconds=rng.randrange(600))
+        stop = start + timedelta(seconds=rng.randrange(1, 86400))
+        out.append(dict(zip(FIELDS, (fmt(submit), fmt(start), fmt(stop)))))
+    return out
+
+
+def _run_legacy(records: List[Dict[str, str]]) -> None:
+    for rec in records:
+        for field in FIELDS:
+            legacy_parse_timestamp(rec[field])
+
+
+def _run_shared(records: List[Dict[str, str]]) -> None:
+    for rec in records:
+        for field in FIELDS:
+            parse_timestamp(rec[field], field)
+
+
+def _per_record_us(fn: Callable[[List[Dict[str, str]]], None], records: List[Dict[str, str]], repeats: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(records)
+        samples.append((time.perf_counter() - start) / len(records) * 1e6)
+    samples.sort()
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(samples[0], 3),
+        "max_us": round(samples[-1], 3),
+    }
+
+
+def bench_layout(layout: str, count: int, seed: int, repeats: int) -> Dict[str, Any]:
+    records = _records(layout, count, seed)
+    mismatches = sum(
+        1
+        for rec in records
+        for field in FIELDS
+        if legacy_parse_timestamp(rec[field]) != parse_timestamp(rec[field], field)
+    )
+    legacy = _per_record_us(_run_legacy, records, repeats)
+    shared = _per_record_us(_run_shared, records, repeats)
+    return {
+        "layout": layout,
+        "sample": records[0]["start_exec"],
+        "mismatches": mismatches,
+        "legacy_per_record": legacy,
+        "shared_per_record": shared,
+        "speedup": round(legacy["median_us"] / shared["median_us"], 2) if shared["median_us"] else None,
+    }
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark record timestamp parsing (legacy vs shared parser)")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help=f"Comma-separated subset of: {', '.join(LAYOUTS)}")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=20260101)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None, help="Write JSON here instead of stdout")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    report = {
+        "benchmark": "timestamp_parser",
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"records": args.records, "seed": args.seed, "repeats": args.repeats, "fields_per_record": len(FIELDS)},
+        "layouts": [
+            bench_layout(layout.strip(), args.records, args.seed, args.repeats)
+            for layout in args.layouts.split(",")
+            if layout.strip()
+        ],
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Synthetic CNR submission corpus for conversion benchmarks.
+
+Generates grid, cloud and network entries shaped like the payloads in
+`_test_requests/01_raw.json`, mixing the key spellings partners actually send
+(`WallClockTime(s)` vs `WallClockTime_s`, `CFP(g)` vs `CFP_g`, `Energy(kwh)` vs
+`EnergyWh`, nested `detail_network` vs top-level network fields, DIRAC vs ISO
+timestamps). Output is deterministic for a given seed, so benchmark runs on
+different commits see the same input:
+
+    python _cim/benchmarks/corpus.py --count 50000 --output corpus.json
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List
+
+DEFAULT_MIX = {"grid": 0.6, "cloud": 0.25, "network": 0.15}
+
+SITES = ("IFCA-LCG2", "CNR-ISTI", "UKI-LT2-QMUL", "SoBigData-Pisa", "CESGA", "NIKHEF-ELPROD")
+VOS = ("atlas", "cms", "lhcb", "biomed", "openrisknet.org", "vo.greendigit.egi.eu")
+STATUSES = ("Done", "done", "Running", "Completing", "Failed")
+
+
+def _ts(rng: random.Random, dt: datetime) -> str:
+    layout = rng.random()
+    if layout < 0.5:
+        return dt.strftime("%Y-%m-%d %H:%M:%S")  # DIRAC
+    if layout < 0.85:
+        return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _common(rng: random.Random, i: int) -> Dict[str, Any]:
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(90 * 86400))
+    stop = start + timedelta(seconds=rng.randrange(60, 86400))
+    entry: Dict[str, Any] = {}
+    entry[rng.choice(("SiteName", "SiteGOCDB", "Site"))] = rng.choice(SITES)
+    if rng.random() < 0.8:
+        entry["ExecUnitID"] = f"{i:08x}-{rng.getrandbits(32):08x}"
+    else:
+        entry["JobID"] = str(rng.randrange(10**8))  # numeric ids become event_id as-is
+    entry["StartExecTime"] = _ts(rng, start)
+    entry[rng.choice(("EndExecTime", "StopExecTime"))] = _ts(rng, stop)
+    if rng.random() < 0.5:
+        entry["SubmissionTime"] = _ts(rng, start - timedelta(seconds=rng.randrange(3600)))
+    entry["Status"] = rng.choice(STATUSES)
+    entry[rng.choice(("VO", "Owner"))] = rng.choice(VOS)
+    if rng.random() < 0.5:
+        entry["Energy(kwh)"] = round(rng.uniform(0.01, 5.0), 4)
+    else:
+        entry["EnergyWh"] = round(rng.uniform(10, 5000), 2)
+    entry["Work"] = round(rng.uniform(1, 500), 2)
+    cfp = rng.random()
+    if cfp < 0.3:
+        entry["CFP(g)"] = round(rng.uniform(1, 900), 3)
+    elif cfp < 0.5:
+        entry["CFP_g"] = None
+    if rng.random() < 0.3:
+        entry["PUE"] = round(rng.uniform(1.1, 1.9), 2)
+        entry["CI_g"] = rng.randrange(20, 700)
+    entry["ExecUnitFinished"] = rng.choice((0, 1, "true", "false"))
+    return entry
+
+
+def grid_entry(rng: random.Random, i: int) -> Dict[str, Any]:
+    entry = _common(rng, i)
+    wall = rng.randrange(60, 86400)
+    entry[rng.choice(("WallClockTime_s", "WallClockTime(s)"))] = wall if rng.random() < 0.7 else str(wall)
+    entry["CPUNormalizationFactor"] = round(rng.uniform(0.8, 3.0), 2)
+    entry["NCores"] = rng.choice((1, 2, 4, 8, "8"))
+    entry[rng.choice(("NormCPUTime_s", "NormCPUTime(s)"))] = rng.randrange(wall * 4)
+    entry[rng.choice(("CEE", "Efficiency"))] = round(rng.random(), 3)
+    entry[rng.choice(("TDP", "TDP(W)"))] = rng.choice((95, 125, 165, 205))
+    entry[rng.choice(("TotalCPUTime_s", "TotalCPUTime(s)"))] = rng.randrange(wall * 4)
+    entry["ScaledCPUTime_s"] = rng.randrange(wall * 8)
+    return entry
+
+
+def cloud_entry(rng: random.Random, i: int) -> Dict[str, Any]:
+    entry = _common(rng, i)
+    wall = rng.randrange(60, 86400)
+    entry["WallClockTime_s"] = wall
+    entry["SuspendDuration_s"] = rng.randrange(600)
+    entry["CpuDuration_s"] = rng.randrange(wall)
+    entry["CPUNormalizationFactor"] = round(rng.uniform(0.8, 3.0), 2)
+    entry["Efficiency"] = round(rng.random(), 2)
+    entry["CloudType"] = rng.choice(("openstack", "opennebula", "kubernetes"))
+    entry["CloudComputeService"] = rng.choice(("ifca", "cesnet", "egi-fedcloud"))
+    return entry
+
+
+def network_entry(rng: random.Random, i: int) -> Dict[str, Any]:
+    entry = _common(rng, i)
+    fields = {
+        "AmountOfDataTransferred": rng.randrange(10**12),
+        "NetworkType": rng.choice(("wan", "lan", "lhcone")),
+        "MeasurementType": rng.choice(("fts", "perfsonar")),
+        "DestinationExecUnitID": f"dst-{rng.getrandbits(32):08x}",
+    }
+    if rng.random() < 0.5:
+        entry["detail_network"] = fields
+    else:
+        entry.update(fields)
+    return entry
+
+
+GENERATORS: Dict[str, Callable[[random.Random, int], Dict[str, Any]]] = {
+    "grid": grid_entry,
+    "cloud": cloud_entry,
+    "network": network_entry,
+}
+
+
+def generate_corpus(count: int, seed: int = 20260101, mix: Dict[str, float] = DEFAULT_MIX) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    return [GENERATORS[kind](rng, i) for i, kind in enumerate(rng.choices(kinds, weights, k=count))]
+
+
+def corpus_fingerprint(entries: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(entries, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def parse_mix(raw: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in raw.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in GENERATORS:
+            raise ValueError(f"Unknown payload type in mix: {kind!r}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic CNR submission corpus")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=20260101)
+    parser.add_argument("--mix", default="grid=0.6,cloud=0.25,network=0.15")
+    parser.add_argument("--output", type=Path, default=None, help="Write the JSON array here instead of stdout")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    entries = generate_corpus(args.count, args.seed, parse_mix(args.mix))
+    text = json.dumps(entries)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"wrote {len(entries)} entries ({corpus_fingerprint(entries)}) to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
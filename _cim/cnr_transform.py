@@ -3,11 +3,30 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Tuple
+import os
 import re
+import sys
 import zlib
 
 
+def _add_shared_dir_to_path() -> None:
+    # Modules shared between services live in ./shared: $GD_SHARED_DIR, else the nearest
+    # shared/ above this file (repo checkout), else /opt/shared (Docker mount).
+    here = Path(__file__).resolve()
+    candidates = [os.getenv("GD_SHARED_DIR"), *(str(p / "shared") for p in here.parents), "/opt/shared"]
+    for candidate in candidates:
+        if candidate and os.path.isfile(os.path.join(candidate, "cfp_formula.py")):
+            if candidate not in sys.path:
+                sys.path.insert(0, candidate)
+            return
+
+
+_add_shared_dir_to_path()
+from timestamp_parser import parse_timestamp  # noqa: E402
+
+
 PayloadType = Literal["grid", "cloud", "network"]
 
 
@@ -20,6 +39,93 @@ class ConvertedRecord:
     raw: Dict[str, Any]
 
 
+# Column order of the rows `CNRConverter` produces (dict key order in `convert`,
+# array order in `convert_columns`).
+FACT_COLUMNS: Tuple[str, ...] = (
+    "event_id",
+    "site_id",
+    "event_start_time",
+    "event_end_times",
+    "recorded_at",
+    "job_finished",
+    "CI_g",
+    "CFP_g",
+    "PUE",
+    "site",
+    "energy_wh",
+    "work",
+    "startexectime",
+    "stopexectime",
+    "status",
+    "owner",
+    "execunitid",
+    "execunitfinished",
+)
+DETAIL_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    # detail_id intentionally omitted (assume DB auto-generates)
+    "detail_grid": (
+        "site_id",
+        "event_id",
+        "execunitid",
+        "wallclocktime_s",
+        "cpunormalizationfactor",
+        "ncores",
+        "normcputime_s",
+        "efficiency",
+        "tdp_w",
+        "totalcputime_s",
+        "scaledcputime_s",
+    ),
+    "detail_cloud": (
+        "event_id",
+        "site_id",
+        "execunitid",
+        "wallclocktime_s",
+        "suspendduration_s",
+        "cpuduration_s",
+        "cpunormalizationfactor",
+        "efficiency",
+        "cloud_type",
+        "compute_service",
+    ),
+    "detail_network": (
+        "detail_id",  # safe placeholder if your insert layer wants explicit None; remove if you prefer
+        "site_id",
+        "event_id",
+        "execunitid",
+        "amountofdatatransferred",
+        "networktype",
+        "measurementtype",
+        "destinationexecunitid",
+    ),
+}
+_DETAIL_TABLES: Dict[PayloadType, str] = {"grid": "detail_grid", "cloud": "detail_cloud", "network": "detail_network"}
+
+
+@dataclass(frozen=True)
+class ConvertedColumns:
+    """
+    Output of `CNRConverter.convert_columns`: one list per column for
+    `fact_site_event` and each `detail_*` table (columns in FACT_COLUMNS /
+    DETAIL_COLUMNS order). Fact row i belongs to input entry i; its detail row is
+    `detail_rows[i]` in table `_DETAIL_TABLES[payload_types[i]]`.
+    """
+
+    tables: Dict[str, Dict[str, List[Any]]]
+    payload_types: List[PayloadType]
+    detail_rows: List[int]
+
+    def row_count(self, table: str) -> int:
+        columns = self.tables[table]
+        return len(next(iter(columns.values()))) if columns else 0
+
+
+def _to_columns(names: Tuple[str, ...], rows: List[Tuple[Any, ...]]) -> Dict[str, List[Any]]:
+    if not rows:
+        return {name: [] for name in names}
+    return dict(zip(names, map(list, zip(*rows))))
+
+
 def _utcnow_naive() -> datetime:
     return datetime.now(timezone.utc).replace(tzinfo=None)
 
@@ -76,6 +182,108 @@ def _get_by_norm_contains(d: Dict[str, Any], idx: Dict[str, str], needle: str) -
     return None
 
 
+# Candidate source keys per target field, in priority order (see `_get`).
+_FIELD_CANDIDATES: Dict[str, Tuple[str, ...]] = {
+    "site": ("SiteGOCDB", "SiteName", "Site", "site"),
+    "execunitid": ("ExecUnitID", "JobID", "execunitid"),
+    "status": ("Status", "status"),
+    # SQL/API currently use `fact.owner` as the VO dimension.
+    # OwnerGroup is a group within the VO and must not be promoted to VO.
+    "owner": ("VO", "vo", "Owner", "owner"),
+    "submit_time": ("SubmissionTime", "submit_time"),
+    "start_exec": ("StartExecTime", "StartExecTime", "startexectime"),
+    "stop_exec": ("StopExecTime", "EndExecTime", "StopExecTime", "stopexectime", "EndExecTime"),
+    "pue": ("PUE", "pue"),
+    "ci_g": ("CI_g", "CIg", "CI", "ci_g", "ci"),
+    "cfp_g": ("CFP_g", "CFPg", "cfp_g"),
+    "energy": ("Energy_wh", "EnergyWh", "energy_wh", "Energy(kwh)", "Energy_kwh"),
+    "work": ("Work", "work"),
+    "exec_finished": ("ExecUnitFinished", "execunitfinished"),
+    "detail_network": ("detail_network",),
+    # Payload type markers (checked individually, value must be non-null).
+    "marker.amountofdatatransferred": ("amountofdatatransferred",),
+    "marker.networktype": ("networktype",),
+    "marker.measurementtype": ("measurementtype",),
+    "marker.destinationexecunitid": ("destinationexecunitid",),
+    "marker.cloudtype": ("cloudtype",),
+    "marker.cloudcomputeservice": ("cloudcomputeservice",),
+    "marker.cpuduration_s": ("cpuduration_s",),
+    "marker.suspendduration_s": ("suspendduration_s",),
+    # Detail columns.
+    "wallclocktime_s": ("WallClockTime_s", "WallClockTime(s)", "wallclocktime_s"),
+    "cpunormalizationfactor": ("CPUNormalizationFactor", "cpunormalizationfactor"),
+    "ncores": ("NCores", "ncores"),
+    "normcputime_s": ("NormCPUTime_s", "NormCPUTime(s)", "normcputime_s"),
+    "grid_efficiency": ("CEE", "cee", "Efficiency", "efficiency"),
+    "tdp_w": ("TDP", "TDP_w", "TDP(W)", "tdp_w"),
+    "totalcputime_s": ("TotalCPUTime_s", "TotalCPUTime(s)", "totalcputime_s"),
+    "scaledcputime_s": ("ScaledCPUTime_s", "ScaledCPUTime(s)", "scaledcputime_s"),
+    "suspendduration_s": ("SuspendDuration_s", "suspendduration_s"),
+    "cpuduration_s": ("CpuDuration_s", "CPUDuration_s", "cpuduration_s"),
+    "efficiency": ("Efficiency", "efficiency"),
+    "cloud_type": ("CloudType", "cloud_type"),
+    "compute_service": ("CloudComputeService", "compute_service"),
+    "amountofdatatransferred": ("AmountOfDataTransferred", "amountofdatatransferred"),
+    "networktype": ("NetworkType", "networktype"),
+    "measurementtype": ("MeasurementType", "measurementtype"),
+    "destinationexecunitid": ("DestinationExecUnitID", "destinationexecunitid"),
+}
+
+_NETWORK_MARKERS = (
+    "marker.amountofdatatransferred",
+    "marker.networktype",
+    "marker.measurementtype",
+    "marker.destinationexecunitid",
+)
+_CLOUD_MARKERS = (
+    "marker.cloudtype",
+    "marker.cloudcomputeservice",
+    "marker.cpuduration_s",
+    "marker.suspendduration_s",
+)
+
+
+class _KeyPlan:
+    """
+    Resolved source key for every field of `_FIELD_CANDIDATES`, computed once per
+    key layout with `_get_matched`. Lookups through a plan are plain dict reads
+    and give the same result as `_get` on any entry with that layout.
+    """
+
+    __slots__ = ("src", "cfp_fallback", "energy_is_kwh")
+
+    def __init__(self, entry: Dict[str, Any]) -> None:
+        idx = _index_keys(entry)
+        self.src: Dict[str, Optional[str]] = {
+            field: _get_matched(entry, idx, *candidates)[0] for field, candidates in _FIELD_CANDIDATES.items()
+        }
+        # Same key `_get_by_norm_contains(entry, idx, "cfp")` would pick.
+        self.cfp_fallback = next((original for nk, original in idx.items() if "cfp" in nk), None)
+        energy_key = self.src["energy"]
+        self.energy_is_kwh = energy_key is not None and _norm_key(energy_key) in {"energykwh"}
+
+    def get(self, entry: Dict[str, Any], field: str) -> Any:
+        key = self.src[field]
+        return None if key is None else entry[key]
+
+
+_PLAN_CACHE: Dict[Tuple[Any, ...], _KeyPlan] = {}
+_PLAN_CACHE_MAX = 4096
+
+
+def _plan_for(entry: Dict[str, Any]) -> _KeyPlan:
+    """Return the cached plan for the entry's key layout (key order matters for ties)."""
+    layout = tuple(entry)
+    plan = _PLAN_CACHE.get(layout)
+    if plan is None:
+        plan = _KeyPlan(entry)
+        if len(_PLAN_CACHE) >= _PLAN_CACHE_MAX:
+            # Publishers reuse a handful of layouts; a flood of unique ones just resets the cache.
+            _PLAN_CACHE.clear()
+        _PLAN_CACHE[layout] = plan
+    return plan
+
+
 def _to_int(v: Any) -> Optional[int]:
     if v is None:
         return None
@@ -124,58 +332,6 @@ def _to_bool(v: Any) -> Optional[bool]:
     return None
 
 
-def parse_timestamp(v: Any) -> Optional[datetime]:
-    """
-    Parse:
-      - "2026-01-15 09:20:10"
-      - "2026-01-15T00:00:01Z"
-      - "2026-01-14T20:07:04.773563Z"
-    Returns UTC naive datetime (tz stripped).
-    """
-    if v is None:
-        return None
-    if isinstance(v, datetime):
-        dt = v
-        if dt.tzinfo is not None:
-            dt = dt.astimezone(timezone.utc)
-        return dt.replace(tzinfo=None)
-
-    s = str(v).strip()
-    if s == "":
-        return None
-
-    # Unix seconds (rare, but happens)
-    if re.fullmatch(r"\d{10}(\.\d+)?", s):
-        try:
-            ts = float(s)
-            return datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)
-        except ValueError:
-            pass
-
-    # ISO with Z
-    if s.endswith("Z"):
-        s = s[:-1] + "+00:00"
-
-    # Try fromisoformat (handles "+00:00" and microseconds)
-    try:
-        dt = datetime.fromisoformat(s)
-        if dt.tzinfo is not None:
-            dt = dt.astimezone(timezone.utc)
-        return dt.replace(tzinfo=None)
-    except ValueError:
-        pass
-
-    # Try common "YYYY-MM-DD HH:MM:SS"
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f"):
-        try:
-            dt = datetime.strptime(s, fmt)
-            return dt.replace(tzinfo=None)
-        except ValueError:
-            continue
-
-    return None
-
-
 def normalise_payload(payload: Any) -> List[Dict[str, Any]]:
     """
     Step 1: detect whether payload is an array or a single object.
@@ -196,19 +352,16 @@ def detect_payload_type(entry: Dict[str, Any]) -> PayloadType:
       - cloud: has CloudType/CloudComputeService/CpuDuration_s
       - else: grid
     """
-    idx = _index_keys(entry)
+    return _detect_payload_type(entry, _plan_for(entry))
 
-    if _get(entry, idx, "detail_network") is not None:
-        return "network"
 
-    network_markers = ("amountofdatatransferred", "networktype", "measurementtype", "destinationexecunitid")
-    if any(_get(entry, idx, m) is not None for m in network_markers):
+def _detect_payload_type(entry: Dict[str, Any], plan: _KeyPlan) -> PayloadType:
+    if plan.get(entry, "detail_network") is not None:
         return "network"
-
-    cloud_markers = ("cloudtype", "cloudcomputeservice", "cpuduration_s", "suspendduration_s")
-    if any(_get(entry, idx, m) is not None for m in cloud_markers):
+    if any(plan.get(entry, m) is not None for m in _NETWORK_MARKERS):
+        return "network"
+    if any(plan.get(entry, m) is not None for m in _CLOUD_MARKERS):
         return "cloud"
-
     return "grid"
 
 
@@ -250,8 +403,9 @@ class CNRConverter:
     def convert(self, payload: Any) -> List[ConvertedRecord]:
         out: List[ConvertedRecord] = []
         for entry in normalise_payload(payload):
-            ptype = detect_payload_type(entry)
-            fact, detail_table, detail = self._convert_one(entry, ptype)
+            plan = _plan_for(entry)
+            ptype = _detect_payload_type(entry, plan)
+            fact, detail_table, detail = self._convert_one(entry, ptype, plan)
             out.append(
                 ConvertedRecord(
                     payload_type=ptype,
@@ -263,9 +417,34 @@ class CNRConverter:
             )
         return out
 
-    def _resolve_site(self, entry: Dict[str, Any], idx: Dict[str, str]) -> Optional[str]:
+    def convert_columns(self, payload: Any) -> ConvertedColumns:
+        """
+        Columnar variant of `convert` for bulk loaders: same coercion and event_id
+        rules, but rows are kept as tuples and transposed once per table instead of
+        building a `ConvertedRecord` and two dicts per entry.
+        """
+        fact_rows: List[Tuple[Any, ...]] = []
+        detail_rows: Dict[str, List[Tuple[Any, ...]]] = {table: [] for table in DETAIL_COLUMNS}
+        payload_types: List[PayloadType] = []
+        detail_index: List[int] = []
+        for entry in normalise_payload(payload):
+            plan = _plan_for(entry)
+            ptype = _detect_payload_type(entry, plan)
+            fact, detail = self._convert_row(entry, ptype, plan)
+            rows = detail_rows[_DETAIL_TABLES[ptype]]
+            detail_index.append(len(rows))
+            rows.append(detail)
+            fact_rows.append(fact)
+            payload_types.append(ptype)
+
+        tables = {"fact_site_event": _to_columns(FACT_COLUMNS, fact_rows)}
+        for table, rows in detail_rows.items():
+            tables[table] = _to_columns(DETAIL_COLUMNS[table], rows)
+        return ConvertedColumns(tables=tables, payload_types=payload_types, detail_rows=detail_index)
+
+    def _resolve_site(self, entry: Dict[str, Any], plan: _KeyPlan) -> Optional[str]:
         # Prefer GOCDB-style if present, then explicit SiteName, then Site.
-        site = _get(entry, idx, "SiteGOCDB", "SiteName", "Site", "site")
+        site = plan.get(entry, "site")
         if site is None:
             return None
         s = str(site).strip()
@@ -276,43 +455,51 @@ class CNRConverter:
             return None
         return self.site_id_resolver(site)
 
-    def _convert_one(self, entry: Dict[str, Any], ptype: PayloadType) -> Tuple[Dict[str, Any], str, Dict[str, Any]]:
-        idx = _index_keys(entry)
-
-        site = self._resolve_site(entry, idx)
+    def _convert_one(
+        self,
+        entry: Dict[str, Any],
+        ptype: PayloadType,
+        plan: Optional[_KeyPlan] = None,
+    ) -> Tuple[Dict[str, Any], str, Dict[str, Any]]:
+        if plan is None:
+            plan = _plan_for(entry)
+        fact, detail = self._convert_row(entry, ptype, plan)
+        detail_table = _DETAIL_TABLES[ptype]
+        return dict(zip(FACT_COLUMNS, fact)), detail_table, dict(zip(DETAIL_COLUMNS[detail_table], detail))
+
+    def _convert_row(self, entry: Dict[str, Any], ptype: PayloadType, plan: _KeyPlan) -> Tuple[Tuple[Any, ...], Tuple[Any, ...]]:
+        """Fact and detail values as tuples in FACT_COLUMNS / DETAIL_COLUMNS order."""
+        site = self._resolve_site(entry, plan)
         site_id = self._resolve_site_id(site)
 
-        execunitid = _get(entry, idx, "ExecUnitID", "JobID", "execunitid")
+        execunitid = plan.get(entry, "execunitid")
         execunitid_str = None if execunitid is None else str(execunitid)
 
-        status = _get(entry, idx, "Status", "status")
+        status = plan.get(entry, "status")
         status_str = None if status is None else str(status)
 
-        # SQL/API currently use `fact.owner` as the VO dimension.
-        # OwnerGroup is a group within the VO and must not be promoted to VO.
-        owner = _get(entry, idx, "VO", "vo", "Owner", "owner")
+        owner = plan.get(entry, "owner")
         owner_str = None if owner is None else str(owner)
 
         # Times
-        submit_time = parse_timestamp(_get(entry, idx, "SubmissionTime", "submit_time"))
-        start_exec = parse_timestamp(_get(entry, idx, "StartExecTime", "StartExecTime", "startexectime"))
-        stop_exec = parse_timestamp(_get(entry, idx, "StopExecTime", "EndExecTime", "StopExecTime", "stopexectime", "EndExecTime"))
+        submit_time = parse_timestamp(plan.get(entry, "submit_time"), "submit_time")
+        start_exec = parse_timestamp(plan.get(entry, "start_exec"), "start_exec")
+        stop_exec = parse_timestamp(plan.get(entry, "stop_exec"), "stop_exec")
 
         # Metrics (may be present or filled later)
-        pue = _to_float(_get(entry, idx, "PUE", "pue"))
-        ci_g = _to_int(_get(entry, idx, "CI_g", "CIg", "CI", "ci_g", "ci"))
-        cfp_raw = _get(entry, idx, "CFP_g", "CFPg", "cfp_g")
-        if cfp_raw is None:
-            cfp_raw = _get_by_norm_contains(entry, idx, "cfp")
+        pue = _to_float(plan.get(entry, "pue"))
+        ci_g = _to_int(plan.get(entry, "ci_g"))
+        cfp_raw = plan.get(entry, "cfp_g")
+        if cfp_raw is None and plan.cfp_fallback is not None:
+            cfp_raw = entry[plan.cfp_fallback]
         cfp_g = _to_float(cfp_raw)
 
-        energy_key, energy_raw = _get_matched(entry, idx, "Energy_wh", "EnergyWh", "energy_wh", "Energy(kwh)", "Energy_kwh")
-        energy_wh = _to_float(energy_raw)
-        if energy_wh is not None and energy_key is not None and _norm_key(energy_key) in {"energykwh"}:
+        energy_wh = _to_float(plan.get(entry, "energy"))
+        if energy_wh is not None and plan.energy_is_kwh:
             energy_wh *= 1000.0
-        work = _to_float(_get(entry, idx, "Work", "work"))
+        work = _to_float(plan.get(entry, "work"))
 
-        exec_finished = _to_bool(_get(entry, idx, "ExecUnitFinished", "execunitfinished"))
+        exec_finished = _to_bool(plan.get(entry, "exec_finished"))
         # If missing, infer from status
         if exec_finished is None and status_str is not None:
             if status_str.strip().lower() in {"done", "finished", "success", "succeeded"}:
@@ -333,88 +520,90 @@ class CNRConverter:
         # Sensible default:
         # - event_start_time = SubmissionTime if available else StartExecTime
         # - event_end_times = Stop/End exec time
-        fact: Dict[str, Any] = {
-            "event_id": event_id,
-            "site_id": site_id,
-            "event_start_time": submit_time or start_exec,
-            "event_end_times": stop_exec,
-            "recorded_at": recorded_at,
-            "job_finished": bool(exec_finished) if exec_finished is not None else None,
-            "CI_g": ci_g,
-            "CFP_g": cfp_g,
-            "PUE": pue,
-            "site": site,
-            "energy_wh": energy_wh,
-            "work": work,
-            "startexectime": start_exec,
-            "stopexectime": stop_exec,
-            "status": status_str,
-            "owner": owner_str,
-            "execunitid": execunitid_str,
-            "execunitfinished": bool(exec_finished) if exec_finished is not None else None,
-        }
+        job_finished = bool(exec_finished) if exec_finished is not None else None
+        fact = (
+            event_id,
+            site_id,
+            submit_time or start_exec,  # event_start_time
+            stop_exec,  # event_end_times
+            recorded_at,
+            job_finished,
+            ci_g,
+            cfp_g,
+            pue,
+            site,
+            energy_wh,
+            work,
+            start_exec,
+            stop_exec,
+            status_str,
+            owner_str,
+            execunitid_str,
+            job_finished,  # execunitfinished
+        )
 
         if ptype == "grid":
-            return fact, "detail_grid", self._detail_grid(entry, idx, event_id, site_id, execunitid_str)
+            return fact, self._detail_grid(entry, plan, event_id, site_id, execunitid_str)
         if ptype == "cloud":
-            return fact, "detail_cloud", self._detail_cloud(entry, idx, event_id, site_id, execunitid_str)
-        return fact, "detail_network", self._detail_network(entry, idx, event_id, site_id, execunitid_str)
-
-    def _detail_grid(self, entry: Dict[str, Any], idx: Dict[str, str], event_id: int, site_id: Optional[int], execunitid: Optional[str]) -> Dict[str, Any]:
-        return {
-            # detail_id intentionally omitted (assume DB auto-generates)
-            "site_id": site_id,
-            "event_id": event_id,
-            "execunitid": execunitid,
-            "wallclocktime_s": _to_int(_get(entry, idx, "WallClockTime_s", "WallClockTime(s)", "wallclocktime_s")),
-            "cpunormalizationfactor": _to_float(_get(entry, idx, "CPUNormalizationFactor", "cpunormalizationfactor")),
-            "ncores": _to_int(_get(entry, idx, "NCores", "ncores")),
-            "normcputime_s": _to_int(_get(entry, idx, "NormCPUTime_s", "NormCPUTime(s)", "normcputime_s")),
-            "efficiency": _to_float(_get(entry, idx, "CEE", "cee", "Efficiency", "efficiency")),
-            "tdp_w": _to_int(_get(entry, idx, "TDP", "TDP_w", "TDP(W)", "tdp_w")),
-            "totalcputime_s": _to_int(_get(entry, idx, "TotalCPUTime_s", "TotalCPUTime(s)", "totalcputime_s")),
-            "scaledcputime_s": _to_int(_get(entry, idx, "ScaledCPUTime_s", "ScaledCPUTime(s)", "scaledcputime_s")),
-        }
-
-    def _detail_cloud(self, entry: Dict[str, Any], idx: Dict[str, str], event_id: int, site_id: Optional[int], execunitid: Optional[str]) -> Dict[str, Any]:
-        return {
-            "event_id": event_id,
-            "site_id": site_id,
-            "execunitid": execunitid,
-            "wallclocktime_s": _to_int(_get(entry, idx, "WallClockTime_s", "WallClockTime(s)", "wallclocktime_s")),
-            "suspendduration_s": _to_int(_get(entry, idx, "SuspendDuration_s", "suspendduration_s")),
-            "cpuduration_s": _to_int(_get(entry, idx, "CpuDuration_s", "CPUDuration_s", "cpuduration_s")),
-            "cpunormalizationfactor": _to_float(_get(entry, idx, "CPUNormalizationFactor", "cpunormalizationfactor")),
-            "efficiency": _to_float(_get(entry, idx, "Efficiency", "efficiency")),
-            "cloud_type": _get(entry, idx, "CloudType", "cloud_type"),
-            "compute_service": _get(entry, idx, "CloudComputeService", "compute_service"),
-        }
-
-    def _detail_network(self, entry: Dict[str, Any], idx: Dict[str, str], event_id: int, site_id: Optional[int], execunitid: Optional[str]) -> Dict[str, Any]:
+            return fact, self._detail_cloud(entry, plan, event_id, site_id, execunitid_str)
+        return fact, self._detail_network(entry, plan, event_id, site_id, execunitid_str)
+
+    # Detail builders return values in DETAIL_COLUMNS order.
+
+    def _detail_grid(self, entry: Dict[str, Any], plan: _KeyPlan, event_id: int, site_id: Optional[int], execunitid: Optional[str]) -> Tuple[Any, ...]:
+        return (
+            site_id,
+            event_id,
+            execunitid,
+            _to_int(plan.get(entry, "wallclocktime_s")),
+            _to_float(plan.get(entry, "cpunormalizationfactor")),
+            _to_int(plan.get(entry, "ncores")),
+            _to_int(plan.get(entry, "normcputime_s")),
+            _to_float(plan.get(entry, "grid_efficiency")),
+            _to_int(plan.get(entry, "tdp_w")),
+            _to_int(plan.get(entry, "totalcputime_s")),
+            _to_int(plan.get(entry, "scaledcputime_s")),
+        )
+
+    def _detail_cloud(self, entry: Dict[str, Any], plan: _KeyPlan, event_id: int, site_id: Optional[int], execunitid: Optional[str]) -> Tuple[Any, ...]:
+        return (
+            event_id,
+            site_id,
+            execunitid,
+            _to_int(plan.get(entry, "wallclocktime_s")),
+            _to_int(plan.get(entry, "suspendduration_s")),
+            _to_int(plan.get(entry, "cpuduration_s")),
+            _to_float(plan.get(entry, "cpunormalizationfactor")),
+            _to_float(plan.get(entry, "efficiency")),
+            plan.get(entry, "cloud_type"),
+            plan.get(entry, "compute_service"),
+        )
+
+    def _detail_network(self, entry: Dict[str, Any], plan: _KeyPlan, event_id: int, site_id: Optional[int], execunitid: Optional[str]) -> Tuple[Any, ...]:
         # Partners are inconsistent: sometimes network fields are nested under `detail_network`,
         # sometimes they're top-level (e.g. AmountOfDataTransferred, NetworkType, ...).
-        nested = _get(entry, idx, "detail_network")
+        nested = plan.get(entry, "detail_network")
         if not isinstance(nested, dict):
             nested = {}
 
-        nidx = _index_keys(nested)
+        nplan = _plan_for(nested)
 
-        def _net_get(*candidates: str) -> Any:
-            v = _get(nested, nidx, *candidates)
+        def _net_get(field: str) -> Any:
+            v = nplan.get(nested, field)
             if v is not None:
                 return v
-            return _get(entry, idx, *candidates)
-
-        return {
-            "detail_id": None,  # safe placeholder if your insert layer wants explicit None; remove if you prefer
-            "site_id": site_id,
-            "event_id": event_id,
-            "execunitid": execunitid,
-            "amountofdatatransferred": _to_int(_net_get("AmountOfDataTransferred", "amountofdatatransferred")),
-            "networktype": _net_get("NetworkType", "networktype"),
-            "measurementtype": _net_get("MeasurementType", "measurementtype"),
-            "destinationexecunitid": _net_get("DestinationExecUnitID", "destinationexecunitid"),
-        }
+            return plan.get(entry, field)
+
+        return (
+            None,  # detail_id
+            site_id,
+            event_id,
+            execunitid,
+            _to_int(_net_get("amountofdatatransferred")),
+            _net_get("networktype"),
+            _net_get("measurementtype"),
+            _net_get("destinationexecunitid"),
+        )
 
 
 # Optional: enrichment hook (step 3) you can wire later.
@@ -0,0 +1,248 @@
+# http_pool.py
+"""
+Small keep-alive HTTP client for the CIM service's upstream calls (KPI, SQL adapter).
+
+Connections are pooled per (scheme, host, port) and reused across requests and
+handler threads. Each upstream has a cap on concurrently open connections; callers
+wait for a free slot rather than opening more. Errors mirror urllib so existing
+`except urllib.error.HTTPError` handling keeps working.
+
+A request that fails on a reused connection because the server dropped it is
+retried on a fresh one only when that cannot apply it twice: the method is
+idempotent, the request carries an Idempotency-Key, or it failed before the body
+was fully sent.
+"""
+from __future__ import annotations
+
+import http.client
+import io
+import select
+import threading
+import time
+import urllib.error
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Tuple
+
+# Errors raised when the server silently closed an idle keep-alive connection.
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+_Origin = Tuple[str, str, int]
+
+
+@dataclass
+class _IdleConnection:
+    conn: http.client.HTTPConnection
+    released_at: float
+
+
+@dataclass
+class _Upstream:
+    slots: threading.BoundedSemaphore
+    max_connections: int
+    acquire_timeout_s: Optional[float]
+    idle: List[_IdleConnection] = field(default_factory=list)
+    opened: int = 0
+    reused: int = 0
+    requests: int = 0
+    in_use: int = 0
+
+
+class HTTPConnectionPool:
+    """
+    Thread-safe pool of persistent HTTP(S) connections.
+
+    max_per_host: open connections allowed per upstream at once, unless set for
+        that upstream with configure_upstream().
+    timeout_s: default socket timeout (connect + each read) per request.
+    idle_s: idle connections older than this are dropped instead of reused; keep it
+        below the upstream's keep-alive timeout (uvicorn closes after 5s by default).
+    acquire_timeout_s: how long to wait for a free slot before failing the call;
+        None waits as long as the request's own timeout.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_per_host: int = 8,
+        timeout_s: float = 30.0,
+        idle_s: float = 4.0,
+        acquire_timeout_s: Optional[float] = None,
+        user_agent: str = "cim-service/1.0",
+    ) -> None:
+        self.max_per_host = max(1, max_per_host)
+        self.timeout_s = timeout_s
+        self.idle_s = idle_s
+        self.acquire_timeout_s = acquire_timeout_s
+        self.user_agent = user_agent
+        self._lock = threading.Lock()
+        self._upstreams: Dict[_Origin, _Upstream] = {}
+        self._limits: Dict[_Origin, Tuple[int, Optional[float]]] = {}
+
+    def configure_upstream(
+        self,
+        url: str,
+        *,
+        max_connections: int,
+        acquire_timeout_s: Optional[float] = None,
+    ) -> None:
+        """
+        Set the connection cap (and slot wait) for the upstream serving `url`.
+        Call before the first request to that upstream.
+        """
+        origin, _ = self._origin(url)
+        with self._lock:
+            if origin in self._upstreams:
+                raise RuntimeError(f"upstream {origin[1]}:{origin[2]} is already in use")
+            self._limits[origin] = (max(1, max_connections), acquire_timeout_s)
+
+    @staticmethod
+    def _origin(url: str) -> Tuple[_Origin, str]:
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported URL for pooled client: {url}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        return (scheme, parts.hostname, port), path
+
+    def _upstream(self, origin: _Origin) -> _Upstream:
+        with self._lock:
+            up = self._upstreams.get(origin)
+            if up is None:
+                max_connections, acquire_timeout_s = self._limits.get(
+                    origin, (self.max_per_host, self.acquire_timeout_s)
+                )
+                up = _Upstream(
+                    slots=threading.BoundedSemaphore(max_connections),
+                    max_connections=max_connections,
+                    acquire_timeout_s=acquire_timeout_s,
+                )
+                self._upstreams[origin] = up
+            return up
+
+    @staticmethod
+    def _dropped(conn: http.client.HTTPConnection) -> bool:
+        """True when the server already closed an idle connection (readable EOF or error)."""
+        if conn.sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def _checkout(self, origin: _Origin, up: _Upstream, timeout_s: float) -> Tuple[http.client.HTTPConnection, bool]:
+        now = time.monotonic()
+        with self._lock:
+            while up.idle:
+                item = up.idle.pop()
+                if now - item.released_at <= self.idle_s and not self._dropped(item.conn):
+                    up.reused += 1
+                    return item.conn, True
+                item.conn.close()
+            up.opened += 1
+        scheme, host, port = origin
+        conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return conn_cls(host, port, timeout=timeout_s), False
+
+    def _checkin(self, up: _Upstream, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            up.idle.append(_IdleConnection(conn=conn, released_at=time.monotonic()))
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout_s: Optional[float] = None,
+    ) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        """
+        Send one request and return `(status, headers, body)`.
+        Raises urllib.error.HTTPError for status >= 400 and urllib.error.URLError
+        for connection failures, like urllib.request.urlopen.
+        """
+        origin, path = self._origin(url)
+        up = self._upstream(origin)
+        timeout = self.timeout_s if timeout_s is None else timeout_s
+        hdrs = {"User-Agent": self.user_agent, "Connection": "keep-alive"}
+        if headers:
+            hdrs.update(headers)
+        # Safe to resend after the server may have processed it.
+        replayable = method.upper() in _IDEMPOTENT_METHODS or any(
+            k.lower() == "idempotency-key" for k in hdrs
+        )
+
+        acquire_timeout = timeout if up.acquire_timeout_s is None else up.acquire_timeout_s
+        if not up.slots.acquire(timeout=acquire_timeout):
+            raise urllib.error.URLError(
+                f"connection pool exhausted for {origin[1]}:{origin[2]} "
+                f"({up.max_connections} in use for {acquire_timeout:.0f}s)"
+            )
+        with self._lock:
+            up.in_use += 1
+            up.requests += 1
+        try:
+            while True:
+                conn, reused = self._checkout(origin, up, timeout)
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                sent = False
+                try:
+                    conn.request(method, path, body=body, headers=hdrs)
+                    sent = True
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except _STALE_ERRORS as exc:
+                    conn.close()
+                    # Only a reused connection may have been closed by the server while idle;
+                    # retry once on a fresh one. Fresh-connection failures are real errors, and
+                    # so is a lost reply to a request the server may already have applied.
+                    if reused and (replayable or not sent):
+                        continue
+                    raise urllib.error.URLError(exc) from exc
+                except (OSError, http.client.HTTPException) as exc:
+                    conn.close()
+                    raise urllib.error.URLError(exc) from exc
+
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._checkin(up, conn)
+                break
+        finally:
+            with self._lock:
+                up.in_use -= 1
+            up.slots.release()
+
+        if resp.status >= 400:
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(data))
+        return resp.status, resp.headers, data
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                f"{scheme}://{host}:{port}": {
+                    "idle": len(up.idle),
+                    "in_use": up.in_use,
+                    "max": up.max_connections,
+                    "opened": up.opened,
+                    "reused": up.reused,
+                    "requests": up.requests,
+                }
+                for (scheme, host, port), up in self._upstreams.items()
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for up in self._upstreams.values():
+                for item in up.idle:
+                    item.conn.close()
+                up.idle.clear()
@@ -0,0 +1,153 @@
+# json_stream.py
+"""
+Incremental parsing of a top-level JSON array read from a byte stream.
+
+Only one element (plus a read-ahead buffer) is held in memory at a time, which lets
+the CIM service convert and forward very large submissions chunk by chunk.
+"""
+from __future__ import annotations
+
+import codecs
+import json
+from typing import Any, BinaryIO, Callable, Iterator, List, Optional
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789.eE+-"
+
+
+class BoundedReader:
+    """Read at most `length` bytes from `stream` (e.g. a request body with Content-Length)."""
+
+    def __init__(self, stream: BinaryIO, length: Optional[int]) -> None:
+        self._stream = stream
+        self._remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining is None:
+            return self._stream.read(size)
+        if self._remaining <= 0:
+            return b""
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._stream.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class _Buffer:
+    def __init__(self, read: Callable[[int], bytes], read_size: int) -> None:
+        self._read = read
+        self._read_size = read_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Append more decoded text; return False once the stream is exhausted."""
+        if self.eof:
+            return False
+        data = self._read(self._read_size)
+        if not data:
+            self.text += self._decoder.decode(b"", final=True)
+            self.eof = True
+            return False
+        # Drop consumed text before growing the buffer so it stays O(element + read_size).
+        if self.pos:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        self.text += self._decoder.decode(data)
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character (or '' at EOF) without consuming it."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+
+def iter_json_array(
+    read: Callable[[int], bytes],
+    *,
+    read_size: int = 64 * 1024,
+) -> Iterator[Any]:
+    """
+    Yield the elements of a top-level JSON array one at a time.
+
+    A top-level object or scalar is yielded as a single item so callers can treat
+    both payload shapes the same way. Raises JSONStreamError on malformed input.
+    """
+    decoder = json.JSONDecoder()
+    buf = _Buffer(read, read_size)
+
+    first = buf.peek()
+    if first == "":
+        return
+    if first != "[":
+        # Not an array: read the remainder and parse it as one document.
+        while buf.fill():
+            pass
+        try:
+            yield json.loads(buf.text[buf.pos:])
+        except json.JSONDecodeError as exc:
+            raise JSONStreamError(f"Invalid JSON: {exc}") from exc
+        return
+
+    buf.pos += 1
+    if buf.peek() == "]":
+        buf.pos += 1
+        return
+
+    while True:
+        if buf.peek() == "":
+            raise JSONStreamError("Invalid JSON: unterminated array")
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf.text, buf.pos)
+            except json.JSONDecodeError as exc:
+                if buf.fill():
+                    continue
+                raise JSONStreamError(f"Invalid JSON: {exc}") from exc
+            # A number at the end of the buffer may continue in the next read ("1." + "5e3").
+            if (
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and not buf.eof
+                and buf.text[end:].strip(_NUMBER_CHARS) == ""
+                and buf.fill()
+            ):
+                continue
+            break
+        buf.pos = end
+        yield value
+
+        sep = buf.peek()
+        if sep == ",":
+            buf.pos += 1
+            continue
+        if sep == "]":
+            buf.pos += 1
+            break
+        raise JSONStreamError(f"Invalid JSON: expected ',' or ']' at offset {buf.pos}, got {sep!r}")
+
+    if buf.peek() != "":
+        raise JSONStreamError("Invalid JSON: trailing data after top-level array")
+
+
+def chunked(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
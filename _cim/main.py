@@ -1,21 +1,131 @@
+import atexit
 import http.server
 import json
 import os
+import socketserver
+import sys
+import threading
+import time
 import urllib.error
 import urllib.parse
-import urllib.request
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+from audit_emitter import AuditEmitter
 from cnr_transform import CNRConverter, ConvertedRecord
+from http_pool import HTTPConnectionPool
+from json_stream import BoundedReader, JSONStreamError, chunked, iter_json_array
+from outbox import Outbox, OutboxFull, OutboxRejected
+
+
+def _add_shared_dir_to_path() -> None:
+    # Modules shared between services live in ./shared: $GD_SHARED_DIR, else the nearest
+    # shared/ above this file (repo checkout), else /opt/shared (Docker mount).
+    here = Path(__file__).resolve()
+    candidates = [os.getenv("GD_SHARED_DIR"), *(str(p / "shared") for p in here.parents), "/opt/shared"]
+    for candidate in candidates:
+        if candidate and os.path.isfile(os.path.join(candidate, "cfp_formula.py")):
+            if candidate not in sys.path:
+                sys.path.insert(0, candidate)
+            return
+
+
+_add_shared_dir_to_path()
+from cfp_formula import CFP_FORMULA_VERSION, cfp_grams, round_cfp  # noqa: E402
+from compression import BodyDecodeError, DecompressingReader, gzip_body, normalise_encoding  # noqa: E402
 
 LISTEN_PORT = int(os.getenv("LISTEN_PORT", "8012"))
 KPI_BASE = os.getenv("KPI_BASE", "http://kpi-service:8011/v1")
 CNR_SQL_FORWARD_URL = os.getenv("CNR_SQL_FORWARD_URL", "http://sql-adapter:8033/cnr-sql-service")
 CNR_SQL_AUDIT_URL = os.getenv("CNR_SQL_AUDIT_URL", "http://sql-adapter:8033/ingestion-audit")
 PUE_FALLBACK = float(os.getenv("PUE_DEFAULT", "1.7"))
+# Max submissions handled concurrently; 1 keeps the old single-threaded server.
+CIM_MAX_WORKERS = max(1, int(os.getenv("CIM_MAX_WORKERS", "8")))
+# Records whose event time falls in the same bucket share one CI lookup per location.
+CI_TIME_BUCKET_S = max(1, int(os.getenv("CIM_CI_BUCKET_S", "3600")))
+
+# Upstream HTTP (keep-alive pool shared by all handler threads).
+HTTP_MAX_PER_HOST = int(os.getenv("CIM_HTTP_MAX_PER_HOST", "8"))
+HTTP_IDLE_S = float(os.getenv("CIM_HTTP_IDLE_S", "4"))
+KPI_TIMEOUT_S = float(os.getenv("CIM_KPI_TIMEOUT_S", "30"))
+SQL_TIMEOUT_S = float(os.getenv("CIM_SQL_TIMEOUT_S", "120"))
+# Enrichment concurrency: shared worker pool, per-upstream limits and a per-batch deadline.
+ENRICH_WORKERS = max(1, int(os.getenv("CIM_ENRICH_WORKERS", "16")))
+PUE_CONCURRENCY = int(os.getenv("CIM_PUE_CONCURRENCY", "4"))
+CI_CONCURRENCY = int(os.getenv("CIM_CI_CONCURRENCY", "8"))
+ENRICH_DEADLINE_S = float(os.getenv("CIM_ENRICH_DEADLINE_S", "60"))
+# Requests sent with this header set to 1 are parsed incrementally and forwarded per chunk.
+STREAM_HEADER = "X-CIM-Stream"
+STREAM_CHUNK_RECORDS = max(1, int(os.getenv("CIM_STREAM_CHUNK_RECORDS", "1000")))
+# Streamed responses list failed records only, at most this many.
+STREAM_MAX_FAILED_RESULTS = max(0, int(os.getenv("CIM_STREAM_MAX_FAILED_RESULTS", "1000")))
+# Synchronous forwarding: bulk posts of FORWARD_CHUNK_RECORDS envelopes, FORWARD_IN_FLIGHT at a time.
+FORWARD_CHUNK_RECORDS = max(1, int(os.getenv("CIM_FORWARD_CHUNK_RECORDS", "500")))
+FORWARD_IN_FLIGHT = max(1, int(os.getenv("CIM_FORWARD_IN_FLIGHT", "3")))
+FORWARD_RETRIES = max(0, int(os.getenv("CIM_FORWARD_RETRIES", "2")))
+FORWARD_BACKOFF_S = float(os.getenv("CIM_FORWARD_BACKOFF_S", "0.5"))
+# Ingestion audit is posted in the background (set CIM_AUDIT_ASYNC=0 for inline posts).
+AUDIT_ASYNC = os.getenv("CIM_AUDIT_ASYNC", "1").strip().lower() not in {"0", "false", "no"}
+AUDIT_BATCH_ROWS = int(os.getenv("CIM_AUDIT_BATCH_ROWS", "500"))
+AUDIT_FLUSH_S = float(os.getenv("CIM_AUDIT_FLUSH_S", "2"))
+AUDIT_MAX_QUEUE_ROWS = int(os.getenv("CIM_AUDIT_MAX_QUEUE_ROWS", "50000"))
+AUDIT_RETRIES = int(os.getenv("CIM_AUDIT_RETRIES", "3"))
+AUDIT_SPOOL_DIR = os.getenv("CIM_AUDIT_SPOOL_DIR", "/tmp/cim-audit-spool")
+# CFP is computed in-process with the shared formula (cfp_source "computed"); CIM_CFP_REMOTE=1
+# keeps the KPI /cfp call (cfp_source "cfp_api") for audit parity with older deployments. The
+# shared per-location /ci lookup no longer sends energy_wh, so "ci_api" is not recorded any more.
+CFP_REMOTE = os.getenv("CIM_CFP_REMOTE", "0").strip().lower() in {"1", "true", "yes"}
+# Durable outbox: when set, enriched envelopes are persisted here, the submission is answered
+# with 202 and a background drainer forwards them to the adapter's bulk endpoint.
+OUTBOX_DIR = os.getenv("CIM_OUTBOX_DIR", "").strip()
+OUTBOX_BATCH_RECORDS = int(os.getenv("CIM_OUTBOX_BATCH_RECORDS", "2000"))
+OUTBOX_SEGMENT_BYTES = int(os.getenv("CIM_OUTBOX_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+OUTBOX_MAX_PENDING_BYTES = int(os.getenv("CIM_OUTBOX_MAX_PENDING_BYTES", str(2 * 1024 * 1024 * 1024)))
+OUTBOX_MAX_BACKOFF_S = float(os.getenv("CIM_OUTBOX_MAX_BACKOFF_S", "60"))
+# Request bodies may be gzip/deflate(/zstd) encoded; this caps the decoded size (0 = unlimited).
+MAX_DECODED_BYTES = int(os.getenv("CIM_MAX_DECODED_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Posts to the SQL adapter at least this large are sent gzip-encoded (0 disables).
+COMPRESS_MIN_BYTES = int(os.getenv("CIM_COMPRESS_MIN_BYTES", "32768"))
+SERVICE_TOKEN = os.getenv("JWT_TOKEN")
+# Connections to the SQL adapter: by default one per forwarding worker, plus the audit
+# emitter and the outbox drainer, so forwarding never waits on the pool itself.
+SQL_MAX_CONNECTIONS = int(
+    os.getenv("CIM_SQL_MAX_CONNECTIONS", str(CIM_MAX_WORKERS * FORWARD_IN_FLIGHT + 2))
+)
+# KPI lookups are bounded by the PUE and CI gates; remote CFP calls run on handler threads.
+KPI_MAX_CONNECTIONS = int(
+    os.getenv(
+        "CIM_KPI_MAX_CONNECTIONS",
+        str(max(1, PUE_CONCURRENCY) + max(1, CI_CONCURRENCY) + (CIM_MAX_WORKERS if CFP_REMOTE else 0)),
+    )
+)
 
 converter = CNRConverter()
+http_pool = HTTPConnectionPool(
+    max_per_host=HTTP_MAX_PER_HOST,
+    timeout_s=KPI_TIMEOUT_S,
+    idle_s=HTTP_IDLE_S,
+)
+
+
+def _configure_http_pool() -> None:
+    # Slot waits match each upstream's request timeout; the SQL URLs usually share one origin.
+    for url, max_connections, timeout_s in (
+        (CNR_SQL_FORWARD_URL, SQL_MAX_CONNECTIONS, SQL_TIMEOUT_S),
+        (CNR_SQL_AUDIT_URL, SQL_MAX_CONNECTIONS, SQL_TIMEOUT_S),
+        (KPI_BASE, KPI_MAX_CONNECTIONS, KPI_TIMEOUT_S),
+    ):
+        try:
+            http_pool.configure_upstream(url, max_connections=max_connections, acquire_timeout_s=timeout_s)
+        except ValueError as exc:
+            print(f"[cim] {exc}", flush=True)
+
+
+_configure_http_pool()
 
 
 def _to_iso_z(dt: datetime) -> str:
@@ -88,42 +198,69 @@ def _infer_times(fact: Dict[str, Any]) -> tuple[datetime, datetime, datetime]:
     return start, stop, when
 
 
-def _post_json(url: str, payload: Any, auth_header: Optional[str]) -> Dict[str, Any]:
+def _decode_json_body(body: bytes) -> Dict[str, Any]:
+    text = body.decode("utf-8")
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return {"raw": text}
+
+
+def _post_json(
+    url: str,
+    payload: Any,
+    auth_header: Optional[str],
+    timeout_s: Optional[float] = None,
+    extra_headers: Optional[Dict[str, str]] = None,
+    compress: bool = False,
+) -> Dict[str, Any]:
     data_bytes = json.dumps(payload).encode("utf-8")
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "cim-service/1.0",
-    }
+    headers = {"Content-Type": "application/json"}
+    # Only the SQL adapter accepts encoded bodies, so callers opt in.
+    if compress and COMPRESS_MIN_BYTES > 0 and len(data_bytes) >= COMPRESS_MIN_BYTES:
+        data_bytes = gzip_body(data_bytes)
+        headers["Content-Encoding"] = "gzip"
     if auth_header:
         headers["Authorization"] = auth_header
+    if extra_headers:
+        headers.update(extra_headers)
 
-    req = urllib.request.Request(url, data=data_bytes, headers=headers)
-    with urllib.request.urlopen(req, timeout=30) as response:
-        body = response.read().decode("utf-8")
-        try:
-            return json.loads(body)
-        except json.JSONDecodeError:
-            return {"raw": body}
+    _, _, body = http_pool.request("POST", url, body=data_bytes, headers=headers, timeout_s=timeout_s)
+    return _decode_json_body(body)
 
 
-def _get_json(url: str, auth_header: Optional[str]) -> Dict[str, Any]:
-    headers = {"User-Agent": "cim-service/1.0"}
+def _get_json(url: str, auth_header: Optional[str], timeout_s: Optional[float] = None) -> Dict[str, Any]:
+    headers = {}
     if auth_header:
         headers["Authorization"] = auth_header
-    req = urllib.request.Request(url, headers=headers, method="GET")
-    with urllib.request.urlopen(req, timeout=30) as response:
-        body = response.read().decode("utf-8")
-        try:
-            return json.loads(body)
-        except json.JSONDecodeError:
-            return {"raw": body}
+    _, _, body = http_pool.request("GET", url, headers=headers, timeout_s=timeout_s)
+    return _decode_json_body(body)
+
+
+def _post_audit_rows(rows: List[Dict[str, Any]], auth_header: Optional[str]) -> None:
+    _post_json(CNR_SQL_AUDIT_URL, {"rows": rows}, auth_header, SQL_TIMEOUT_S, compress=True)
+
+
+audit_emitter = AuditEmitter(
+    _post_audit_rows,
+    max_queue_rows=AUDIT_MAX_QUEUE_ROWS,
+    batch_rows=AUDIT_BATCH_ROWS,
+    flush_s=AUDIT_FLUSH_S,
+    retries=AUDIT_RETRIES,
+    spool_dir=Path(AUDIT_SPOOL_DIR) if AUDIT_SPOOL_DIR else None,
+    replay_auth_header=f"Bearer {SERVICE_TOKEN}" if SERVICE_TOKEN else None,
+)
+atexit.register(audit_emitter.stop)
 
 
 def _emit_ingestion_audit(rows: List[Dict[str, Any]], auth_header: Optional[str]) -> None:
     if not rows:
         return
+    if AUDIT_ASYNC:
+        audit_emitter.submit(rows, auth_header)
+        return
     try:
-        _post_json(CNR_SQL_AUDIT_URL, {"rows": rows}, auth_header)
+        _post_audit_rows(rows, auth_header)
     except Exception as exc:
         print(f"[cim] Failed to emit ingestion audit: {exc}", flush=True)
 
@@ -225,6 +362,722 @@ def to_envelope(rec: ConvertedRecord) -> Dict[str, Any]:
     return jsonable(env)
 
 
+@dataclass
+class PendingRecord:
+    """Per-record enrichment state; lookups are resolved once per batch and fanned out."""
+
+    rec: ConvertedRecord
+    envelope: Dict[str, Any]
+    fact: Dict[str, Any]
+    site_name: Optional[str]
+    resolved_pue: Optional[float]
+    pue_source: Optional[str]
+    need_ci: bool
+    energy_wh: Optional[float]
+    ci_g: Optional[float]
+    ci_source: Optional[str]
+    cfp_g: Optional[float]
+    cfp_source: Optional[str]
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    ci_key: Optional[Tuple[float, float, datetime, float]] = None
+
+
+def _ci_bucket(when: datetime) -> datetime:
+    """Floor `when` to the CI time bucket so records from the same hour share a lookup."""
+    ts = int(when.timestamp())
+    return datetime.fromtimestamp(ts - ts % CI_TIME_BUCKET_S, tz=timezone.utc)
+
+
+def _prepare_record(rec: ConvertedRecord) -> PendingRecord:
+    envelope = to_envelope(rec)
+    fact = envelope["fact_site_event"]
+    site_name = fact.get("site")
+
+    # Normalise partner-provided aliases (keep values if present; only fetch missing KPIs).
+    if "CI_site_g" not in fact:
+        partner_ci = fact.get("CI_g") if fact.get("CI_g") is not None else fact.get("CIg")
+        if partner_ci is not None:
+            fact["CI_site_g"] = partner_ci
+    if "CFP_site_g" not in fact:
+        partner_cfp = fact.get("CFP_g") if fact.get("CFP_g") is not None else fact.get("CFPg")
+        if partner_cfp is not None:
+            fact["CFP_site_g"] = partner_cfp
+    if fact.get("CI_g") is None and fact.get("CIg") is not None:
+        fact["CI_g"] = fact.get("CIg")
+    if fact.get("CFP_g") is None and fact.get("CFPg") is not None:
+        fact["CFP_g"] = fact.get("CFPg")
+    fact.pop("CIg", None)
+    fact.pop("CFPg", None)
+
+    # SQL adapter expects event_start_timestamp/event_end_timestamp (NOT NULL).
+    # Some partners omit times or send unexpected formats; ensure we always provide a value.
+    start_ts_dt, end_ts_dt, _ = _infer_times(fact)
+    start_ts = _to_iso_z(start_ts_dt)
+    end_ts = _to_iso_z(end_ts_dt)
+    def _put(k: str, v: str) -> None:
+        if k not in fact or fact.get(k) in (None, ""):
+            fact[k] = v
+
+    _put("event_start_timestamp", start_ts)
+    _put("event_end_timestamp", end_ts)
+    # Keep legacy keys in sync as well.
+    _put("event_start_time", start_ts)
+    _put("event_end_times", end_ts)
+    # DB schema (via sql-adapter) also expects these to be NOT NULL in practice.
+    _put("startexectime", start_ts)
+    _put("stopexectime", end_ts)
+
+    # DB-level NOT NULL booleans.
+    if fact.get("execunitfinished") in (None, ""):
+        jf = fact.get("job_finished")
+        if isinstance(jf, bool):
+            fact["execunitfinished"] = jf
+        else:
+            st = str(fact.get("status") or "").strip().lower()
+            fact["execunitfinished"] = st in {"done", "finished", "success", "succeeded"}
+
+    if fact.get("job_finished") in (None, ""):
+        euf = fact.get("execunitfinished")
+        fact["job_finished"] = bool(euf) if isinstance(euf, bool) else False
+
+    # PUE as provided (only looked up if missing/invalid, or when the site location is needed for CI).
+    resolved_pue = fact.get("PUE")
+    pue_source = "provided" if resolved_pue not in (None, "") else None
+    if resolved_pue is not None:
+        try:
+            resolved_pue = float(resolved_pue)
+        except Exception:
+            resolved_pue = None
+            pue_source = None
+    need_ci = True
+    if fact.get("CI_g") is not None:
+        try:
+            float(fact.get("CI_g"))
+            need_ci = False
+        except Exception:
+            need_ci = True
+
+    # Energy
+    energy_wh = envelope.get("energy_wh")
+    if energy_wh is None:
+        energy_wh = fact.get("energy_wh")
+    if energy_wh is None:
+        energy_wh = fact.get("EnergyWh")
+    if energy_wh is not None:
+        try:
+            energy_wh = float(energy_wh)
+        except Exception:
+            energy_wh = None
+
+    # CI / CFP as provided: only fetch what's missing.
+    ci_g = None
+    cfp_g = None
+    ci_source = "provided" if fact.get("CI_g") is not None else None
+    cfp_source = "provided" if fact.get("CFP_g") is not None else None
+    try:
+        if fact.get("CI_g") is not None:
+            ci_g = float(fact.get("CI_g"))
+    except Exception:
+        ci_g = None
+        ci_source = None
+    try:
+        if fact.get("CFP_g") is not None:
+            cfp_g = float(fact.get("CFP_g"))
+    except Exception:
+        cfp_g = None
+        cfp_source = None
+
+    return PendingRecord(
+        rec=rec,
+        envelope=envelope,
+        fact=fact,
+        site_name=site_name,
+        resolved_pue=resolved_pue,
+        pue_source=pue_source,
+        need_ci=need_ci,
+        energy_wh=energy_wh,
+        ci_g=ci_g,
+        ci_source=ci_source,
+        cfp_g=cfp_g,
+        cfp_source=cfp_source,
+    )
+
+
+def _pue_lookup_site(item: PendingRecord) -> Optional[str]:
+    if item.site_name and (item.resolved_pue is None or item.need_ci):
+        return item.site_name
+    return None
+
+
+def _apply_pue(item: PendingRecord, pue_resp: Optional[Dict[str, Any]]) -> None:
+    if pue_resp and item.resolved_pue is None:
+        item.resolved_pue = pue_resp.get("pue")
+        item.pue_source = pue_resp.get("source") or "lookup"
+    if item.resolved_pue is None:
+        item.resolved_pue = PUE_FALLBACK
+        item.pue_source = "default"
+    try:
+        item.resolved_pue = float(item.resolved_pue)
+    except Exception:
+        item.resolved_pue = PUE_FALLBACK
+        item.pue_source = "default"
+
+    # Resolve lat/lon (from PUE response if available)
+    if pue_resp:
+        loc = pue_resp.get("location") or {}
+        item.lat = loc.get("latitude")
+        item.lon = loc.get("longitude")
+
+    if item.ci_g is None and item.lat is not None and item.lon is not None:
+        _, _, when = _infer_times(item.fact)
+        item.ci_key = (item.lat, item.lon, _ci_bucket(when), item.resolved_pue)
+
+
+def _fetch_ci_for_key(key: Tuple[float, float, datetime, float], auth_header: Optional[str]) -> Optional[Dict[str, Any]]:
+    lat, lon, bucket, pue = key
+    # energy_wh is per record, so it is left out of the shared lookup; CFP is derived per record below.
+    return fetch_ci(lat, lon, bucket - timedelta(hours=1), bucket + timedelta(hours=2), pue, None, auth_header)
+
+
+def _apply_ci(item: PendingRecord, ci_resp: Optional[Dict[str, Any]]) -> None:
+    if not ci_resp:
+        return
+    item.ci_source = ci_resp.get("source") or "lookup"
+    ci_val = ci_resp.get("ci_gco2_per_kwh")
+    if ci_val is None:
+        ci_val = ci_resp.get("ci_g")
+    try:
+        if ci_val is not None:
+            item.ci_g = float(ci_val)
+    except Exception:
+        item.ci_g = None
+
+
+def _finalise_record(item: PendingRecord, auth_header: Optional[str]) -> None:
+    fact = item.fact
+    ci_g, cfp_g, energy_wh = item.ci_g, item.cfp_g, item.energy_wh
+    resolved_pue = item.resolved_pue
+
+    # If CFP missing but CI+PUE+energy exist, compute it locally (or ask KPI-service when CFP_REMOTE).
+    if cfp_g is None and ci_g is not None and energy_wh is not None:
+        cfp_resp = fetch_cfp(ci_g, resolved_pue, energy_wh, auth_header) if CFP_REMOTE else None
+        if cfp_resp:
+            cfp_val = cfp_resp.get("cfp_g")
+            try:
+                if cfp_val is not None:
+                    cfp_g = float(cfp_val)
+                    item.cfp_source = "cfp_api"
+            except Exception:
+                cfp_g = None
+        if cfp_g is None:
+            cfp_g = cfp_grams(energy_wh, resolved_pue, ci_g)
+            item.cfp_source = "computed"
+    item.cfp_g = cfp_g
+
+    # Final injection into fact
+    fact["PUE"] = resolved_pue
+    if ci_g is not None:
+        fact["CI_g"] = ci_g
+    if cfp_g is not None:
+        fact["CFP_g"] = round_cfp(cfp_g)
+    if energy_wh is not None and "energy_wh" not in fact:
+        fact["energy_wh"] = energy_wh
+
+    item.envelope["audit"] = {
+        "pue_source": item.pue_source or "unknown",
+        "ci_source": item.ci_source or ("missing" if ci_g is None else "unknown"),
+        "cfp_source": item.cfp_source or ("missing" if cfp_g is None else "unknown"),
+        "cfp_null_reason": (
+            "missing_ci_and_energy" if ci_g is None and energy_wh is None else
+            "missing_ci" if ci_g is None else
+            "missing_energy" if energy_wh is None and cfp_g is None else
+            None
+        ),
+        "used_default_pue": item.pue_source == "default",
+        "used_cached_ci": item.ci_source == "local",
+    }
+
+
+class _LookupRunner:
+    """
+    Runs the distinct lookups of one batch on the shared enrichment pool.
+    Each upstream has a gate (semaphore) so concurrent batches together never exceed
+    its limit. Results not back by the batch deadline count as failed lookups, so the
+    usual fallbacks (PUE_FALLBACK, missing CI) apply.
+    """
+
+    def __init__(self, deadline: float) -> None:
+        self.deadline = deadline
+        self.futures: Dict[Future, Tuple[str, Any]] = {}
+        self.timed_out = 0
+
+    def submit(self, kind: str, key: Any, gate: threading.BoundedSemaphore, fn: Callable[[], Any]) -> None:
+        def _gated() -> Any:
+            with gate:
+                if time.monotonic() >= self.deadline:
+                    return None
+                return fn()
+
+        self.futures[_enrichment_pool().submit(_gated)] = (kind, key)
+
+    def completed(self) -> Iterator[Tuple[str, Any, Any]]:
+        """Yield `(kind, key, result)` as lookups finish, including ones submitted meanwhile."""
+        while self.futures:
+            remaining = self.deadline - time.monotonic()
+            done, _ = wait(list(self.futures), timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            if not done:
+                for fut in self.futures:
+                    fut.cancel()
+                self.timed_out += len(self.futures)
+                self.futures.clear()
+                return
+            for fut in done:
+                kind, key = self.futures.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as exc:
+                    print(f"[cim] {kind} lookup failed for {key}: {exc}", flush=True)
+                    result = None
+                yield kind, key, result
+
+
+_ENRICH_POOL: Optional[ThreadPoolExecutor] = None
+_ENRICH_POOL_LOCK = threading.Lock()
+_PUE_GATE = threading.BoundedSemaphore(max(1, PUE_CONCURRENCY))
+_CI_GATE = threading.BoundedSemaphore(max(1, CI_CONCURRENCY))
+
+
+def _enrichment_pool() -> ThreadPoolExecutor:
+    global _ENRICH_POOL
+    if _ENRICH_POOL is None:
+        with _ENRICH_POOL_LOCK:
+            if _ENRICH_POOL is None:
+                _ENRICH_POOL = ThreadPoolExecutor(max_workers=ENRICH_WORKERS, thread_name_prefix="cim-enrich")
+    return _ENRICH_POOL
+
+
+def plan_enrichment(records: List[ConvertedRecord], auth_header: Optional[str]) -> List[PendingRecord]:
+    """
+    Enrich a batch with one PUE lookup per distinct site and one CI lookup per
+    distinct (lat, lon, time bucket, PUE), then fan results back out in record order.
+    Lookups run concurrently; a site's CI lookups start as soon as its PUE answer
+    arrives. Per-record audit fields (pue_source, ci_source, cfp_source) are kept.
+    """
+    pending = [_prepare_record(rec) for rec in records]
+    runner = _LookupRunner(time.monotonic() + ENRICH_DEADLINE_S)
+
+    by_site: Dict[str, List[PendingRecord]] = {}
+    by_ci_key: Dict[Tuple[float, float, datetime, float], List[PendingRecord]] = {}
+
+    def _queue_ci(items: List[PendingRecord]) -> None:
+        for item in items:
+            if item.ci_key is None:
+                continue
+            if item.ci_key not in by_ci_key:
+                by_ci_key[item.ci_key] = []
+                runner.submit(
+                    "CI", item.ci_key, _CI_GATE, lambda key=item.ci_key: _fetch_ci_for_key(key, auth_header)
+                )
+            by_ci_key[item.ci_key].append(item)
+
+    no_lookup: List[PendingRecord] = []
+    for item in pending:
+        site = _pue_lookup_site(item)
+        if site is None:
+            no_lookup.append(item)
+            continue
+        if site not in by_site:
+            by_site[site] = []
+            runner.submit("PUE", site, _PUE_GATE, lambda site=site: fetch_pue(site, auth_header))
+        by_site[site].append(item)
+
+    pue_lookups = len(by_site)
+    for item in no_lookup:
+        _apply_pue(item, None)
+    _queue_ci(no_lookup)
+
+    for kind, key, result in runner.completed():
+        if kind == "PUE":
+            for item in by_site[key]:
+                _apply_pue(item, result)
+            _queue_ci(by_site.pop(key))
+        else:
+            for item in by_ci_key[key]:
+                _apply_ci(item, result)
+
+    # Sites whose PUE lookup missed the deadline fall back to PUE_FALLBACK without CI.
+    for items in by_site.values():
+        for item in items:
+            _apply_pue(item, None)
+            item.ci_key = None
+
+    for item in pending:
+        _finalise_record(item, auth_header)
+
+    if pending:
+        print(
+            f"[cim] Enriched {len(pending)} records with {pue_lookups} PUE and {len(by_ci_key)} CI lookups"
+            + (f" ({runner.timed_out} past deadline)" if runner.timed_out else ""),
+            flush=True,
+        )
+    return pending
+
+
+class ForwardFailed(Exception):
+    """SQL forwarding failed; reject audit rows have already been emitted."""
+
+    def __init__(self, status: int, payload: Dict[str, Any]) -> None:
+        super().__init__(payload.get("error"))
+        self.status = status
+        self.payload = payload
+
+
+def _bulk_forward_url() -> Optional[str]:
+    if CNR_SQL_FORWARD_URL.endswith("/cnr-sql-adapter"):
+        return CNR_SQL_FORWARD_URL + "-bulk"
+    return None
+
+
+def _audit_candidate(item: PendingRecord) -> Dict[str, Any]:
+    return {
+        "vo": item.fact.get("owner"),
+        "site": item.fact.get("site"),
+        "activity": item.rec.payload_type,
+    }
+
+
+_FORWARD_POOL: Optional[ThreadPoolExecutor] = None
+_FORWARD_POOL_LOCK = threading.Lock()
+
+
+def _forward_pool() -> ThreadPoolExecutor:
+    global _FORWARD_POOL
+    if _FORWARD_POOL is None:
+        with _FORWARD_POOL_LOCK:
+            if _FORWARD_POOL is None:
+                _FORWARD_POOL = ThreadPoolExecutor(
+                    max_workers=CIM_MAX_WORKERS * FORWARD_IN_FLIGHT,
+                    thread_name_prefix="cim-forward",
+                )
+    return _FORWARD_POOL
+
+
+def _forward_result(item: PendingRecord, candidate: Dict[str, Any], **fields: Any) -> Dict[str, Any]:
+    return {
+        "detail_table": item.rec.detail_table,
+        "site": candidate["site"],
+        "activity": candidate["activity"],
+        **fields,
+    }
+
+
+def _failed_result(
+    item: PendingRecord,
+    candidate: Dict[str, Any],
+    http_status: int,
+    reason: str,
+    error: str,
+) -> Dict[str, Any]:
+    return _forward_result(item, candidate, status="error", http_status=http_status, reason=reason, error=error)
+
+
+def _forward_chunk(
+    chunk: List[PendingRecord],
+    bulk_url: Optional[str],
+    auth_header: Optional[str],
+) -> List[Dict[str, Any]]:
+    """
+    Forward one chunk and return one result per record ("ok" or "error").
+    Bulk is tried first; transient failures are retried, then the chunk falls back
+    to per-entry posts. Other adapter errors fail this chunk's records only.
+    """
+    candidates = [_audit_candidate(item) for item in chunk]
+
+    if bulk_url:
+        envelopes = [item.envelope for item in chunk]
+        # One key for all attempts: a retry after a lost reply is not applied twice. The
+        # adapter keeps only the key, so such a replay answers without per-record results.
+        idempotency_key = f"cim-{uuid.uuid4().hex}"
+        for attempt in range(FORWARD_RETRIES + 1):
+            retry = attempt < FORWARD_RETRIES
+            try:
+                print(f"[cim] Forwarding bulk ({len(envelopes)}) to SQL adapter ({bulk_url})", flush=True)
+                bulk_resp = _post_json(
+                    bulk_url,
+                    envelopes,
+                    auth_header,
+                    SQL_TIMEOUT_S,
+                    {"Idempotency-Key": idempotency_key, "X-Idempotency-Replay": "minimal"},
+                    compress=True,
+                )
+            except urllib.error.HTTPError as exc:
+                error_body = exc.read().decode("utf-8", "replace")
+                if exc.code == 404:
+                    # Bulk not supported on adapter; fall back to per-entry.
+                    break
+                if exc.code in (502, 503, 504) and retry:
+                    time.sleep(FORWARD_BACKOFF_S * (2 ** attempt))
+                    continue
+                print(f"[cim] CNR error {exc.code}: {error_body[:200]}", flush=True)
+                return [
+                    _failed_result(item, c, exc.code, f"sql_bulk_http_{exc.code}", error_body)
+                    for item, c in zip(chunk, candidates)
+                ]
+            except Exception as exc:
+                if retry:
+                    time.sleep(FORWARD_BACKOFF_S * (2 ** attempt))
+                    continue
+                # Fall back to per-entry on transient bulk failures.
+                print(f"[cim] Bulk forwarding failed, falling back to per-entry: {exc}", flush=True)
+                break
+            bulk_results = bulk_resp.get("results") if isinstance(bulk_resp, dict) else None
+            if not (isinstance(bulk_results, list) and len(bulk_results) == len(envelopes)):
+                # best-effort: report entire response for every record
+                bulk_results = [bulk_resp] * len(envelopes)
+            return [
+                _forward_result(item, c, status="ok", cnr_response=r)
+                for item, c, r in zip(chunk, candidates, bulk_results)
+            ]
+
+    results: List[Dict[str, Any]] = []
+    for i, (item, c) in enumerate(zip(chunk, candidates)):
+        try:
+            print(f"[cim] Forwarding metric to SQL adapter ({CNR_SQL_FORWARD_URL})", flush=True)
+            response = _post_json(CNR_SQL_FORWARD_URL, item.envelope, auth_header, SQL_TIMEOUT_S, compress=True)
+        except urllib.error.HTTPError as exc:
+            error_body = exc.read().decode("utf-8", "replace")
+            print(f"[cim] CNR error {exc.code}: {error_body[:200]}", flush=True)
+            results.append(_failed_result(item, c, exc.code, f"sql_http_{exc.code}", error_body))
+            continue
+        except Exception as exc:
+            # Adapter unreachable: the rest of this chunk would fail the same way.
+            print(f"[cim] Forwarding to SQL failed: {exc}", flush=True)
+            results.extend(
+                _failed_result(other, oc, 502, "sql_forward_failed", f"Forwarding failed: {exc}")
+                for other, oc in zip(chunk[i:], candidates[i:])
+            )
+            break
+        results.append(_forward_result(item, c, status="ok", cnr_response=response))
+    return results
+
+
+def forward_pending(
+    pending: List[PendingRecord],
+    auth_header: Optional[str],
+    publisher_email: Optional[str],
+    caller_email: Optional[str],
+) -> List[Dict[str, Any]]:
+    """
+    Forward enriched records to the SQL adapter in chunks of FORWARD_CHUNK_RECORDS,
+    with up to FORWARD_IN_FLIGHT chunks in flight, and return one result per record
+    in input order. Accepted/rejected ingestion-audit rows are emitted per record.
+    Raises ForwardFailed when no record could be stored.
+    """
+    if not pending:
+        return []
+    bulk_url = _bulk_forward_url()
+    chunks = [pending[i:i + FORWARD_CHUNK_RECORDS] for i in range(0, len(pending), FORWARD_CHUNK_RECORDS)]
+    outcomes: List[List[Dict[str, Any]]] = [[] for _ in chunks]
+
+    if len(chunks) == 1 or FORWARD_IN_FLIGHT == 1:
+        for idx, chunk in enumerate(chunks):
+            outcomes[idx] = _forward_chunk(chunk, bulk_url, auth_header)
+    else:
+        pool = _forward_pool()
+        in_flight: Dict[Future, int] = {}
+        next_idx = 0
+        while next_idx < len(chunks) or in_flight:
+            while next_idx < len(chunks) and len(in_flight) < FORWARD_IN_FLIGHT:
+                in_flight[pool.submit(_forward_chunk, chunks[next_idx], bulk_url, auth_header)] = next_idx
+                next_idx += 1
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for fut in done:
+                outcomes[in_flight.pop(fut)] = fut.result()
+
+    results = [r for chunk_results in outcomes for r in chunk_results]
+    _emit_ingestion_audit(
+        [
+            _audit_row(
+                publisher_email=publisher_email,
+                caller_email=caller_email,
+                vo=item.fact.get("owner"),
+                site=r["site"],
+                activity=r["activity"],
+                submitted_count=1,
+                accepted_count=1 if r["status"] == "ok" else 0,
+                rejected_count=0 if r["status"] == "ok" else 1,
+                outcome="accepted" if r["status"] == "ok" else "rejected",
+                reason=r.get("reason"),
+            )
+            for item, r in zip(pending, results)
+        ],
+        auth_header,
+    )
+
+    failed = [r for r in results if r["status"] != "ok"]
+    if len(failed) == len(results):
+        first = failed[0]
+        raise ForwardFailed(first["http_status"], {"error": first["error"]})
+    if failed:
+        print(f"[cim] {len(failed)} of {len(results)} records were not stored", flush=True)
+    return results
+
+
+def stored_count(results: List[Dict[str, Any]]) -> int:
+    return sum(1 for r in results if r.get("status") in ("ok", "queued"))
+
+
+# --- Durable outbox --------------------------------------------------------------
+
+
+def _post_outbox_batch(envelopes: List[Dict[str, Any]], idempotency_key: str) -> None:
+    # Caller tokens are not persisted with the envelopes; the drainer uses the service token.
+    auth_header = f"Bearer {SERVICE_TOKEN}" if SERVICE_TOKEN else None
+    try:
+        _post_json(
+            _bulk_forward_url(),
+            envelopes,
+            auth_header,
+            SQL_TIMEOUT_S,
+            {"Idempotency-Key": idempotency_key, "X-Idempotency-Replay": "minimal"},
+            compress=True,
+        )
+    except urllib.error.HTTPError as exc:
+        # Validation errors will not succeed on retry; auth, missing route and throttling might.
+        if 400 <= exc.code < 500 and exc.code not in (401, 403, 404, 408, 429):
+            error_body = exc.read().decode("utf-8", "replace")
+            raise OutboxRejected(f"sql_bulk_http_{exc.code}: {error_body}") from exc
+        raise
+
+
+def _outbox_audit_rows(entries: List[Dict[str, Any]], outcome: str, reason: Optional[str]) -> List[Dict[str, Any]]:
+    rows = []
+    for entry in entries:
+        audit = entry.get("audit") or {}
+        accepted = outcome == "accepted"
+        rows.append(
+            _audit_row(
+                publisher_email=audit.get("publisher_email"),
+                caller_email=audit.get("caller_email"),
+                vo=audit.get("vo"),
+                site=audit.get("site"),
+                activity=audit.get("activity"),
+                submitted_count=1,
+                accepted_count=1 if accepted else 0,
+                rejected_count=0 if accepted else 1,
+                outcome=outcome,
+                reason=reason,
+            )
+        )
+    return rows
+
+
+def _outbox_delivered(entries: List[Dict[str, Any]]) -> None:
+    auth_header = f"Bearer {SERVICE_TOKEN}" if SERVICE_TOKEN else None
+    _emit_ingestion_audit(_outbox_audit_rows(entries, "accepted", None), auth_header)
+
+
+def _outbox_rejected(entries: List[Dict[str, Any]], reason: str) -> None:
+    auth_header = f"Bearer {SERVICE_TOKEN}" if SERVICE_TOKEN else None
+    _emit_ingestion_audit(_outbox_audit_rows(entries, "rejected", reason.split(":", 1)[0]), auth_header)
+
+
+def _make_outbox() -> Optional[Outbox]:
+    if not OUTBOX_DIR:
+        return None
+    if _bulk_forward_url() is None:
+        print(f"[cim] CIM_OUTBOX_DIR ignored: {CNR_SQL_FORWARD_URL} has no bulk endpoint", flush=True)
+        return None
+    if not SERVICE_TOKEN:
+        # The drainer cannot reuse caller tokens; 401/403 answers are retried until a token is set.
+        print("[cim] CIM_OUTBOX_DIR is set but JWT_TOKEN is not: outbox posts are sent without a token", flush=True)
+    box = Outbox(
+        Path(OUTBOX_DIR),
+        _post_outbox_batch,
+        on_delivered=_outbox_delivered,
+        on_rejected=_outbox_rejected,
+        batch_records=OUTBOX_BATCH_RECORDS,
+        segment_bytes=OUTBOX_SEGMENT_BYTES,
+        max_pending_bytes=OUTBOX_MAX_PENDING_BYTES,
+        max_backoff_s=OUTBOX_MAX_BACKOFF_S,
+    )
+    box.start()
+    atexit.register(box.stop)
+    return box
+
+
+outbox = _make_outbox()
+
+
+def enqueue_pending(
+    pending: List[PendingRecord],
+    auth_header: Optional[str],
+    publisher_email: Optional[str],
+    caller_email: Optional[str],
+) -> List[Dict[str, Any]]:
+    """
+    Persist enriched records in the outbox and return one "queued" result per record.
+    Ingestion audit rows are emitted by the drainer once the adapter stores them.
+    """
+    candidates = [_audit_candidate(item) for item in pending]
+    entries = [
+        {
+            "envelope": item.envelope,
+            "audit": {**candidate, "publisher_email": publisher_email, "caller_email": caller_email},
+        }
+        for item, candidate in zip(pending, candidates)
+    ]
+    try:
+        keys = outbox.append(entries)
+    except OutboxFull as exc:
+        print(f"[cim] {exc}; rejecting {len(pending)} records", flush=True)
+        _emit_ingestion_audit(
+            [
+                _audit_row(
+                    publisher_email=publisher_email,
+                    caller_email=caller_email,
+                    vo=c["vo"],
+                    site=c["site"],
+                    activity=c["activity"],
+                    submitted_count=1,
+                    accepted_count=0,
+                    rejected_count=1,
+                    outcome="rejected",
+                    reason="outbox_full",
+                )
+                for c in candidates
+            ],
+            auth_header,
+        )
+        raise ForwardFailed(503, {"error": "Ingestion backlog is full, retry later"})
+    return [
+        {
+            "detail_table": item.rec.detail_table,
+            "status": "queued",
+            "site": candidate["site"],
+            "activity": candidate["activity"],
+            "outbox_key": key,
+        }
+        for item, candidate, key in zip(pending, candidates, keys)
+    ]
+
+
+def deliver_pending(
+    pending: List[PendingRecord],
+    auth_header: Optional[str],
+    publisher_email: Optional[str],
+    caller_email: Optional[str],
+) -> Tuple[bool, List[Dict[str, Any]]]:
+    """Queue records in the outbox when enabled, else forward them now. Returns (queued, results)."""
+    if outbox is not None:
+        try:
+            return True, enqueue_pending(pending, auth_header, publisher_email, caller_email)
+        except OSError as exc:
+            print(f"[cim] Outbox write failed, forwarding directly: {exc}", flush=True)
+    return False, forward_pending(pending, auth_header, publisher_email, caller_email)
+
+
 class CIMHandler(http.server.BaseHTTPRequestHandler):
     def _json_response(self, status: int, payload: Dict[str, Any]) -> None:
         self.send_response(status)
@@ -241,14 +1094,132 @@ class CIMHandler(http.server.BaseHTTPRequestHandler):
                     "kpi_base": KPI_BASE,
                     "sql_adapter": CNR_SQL_FORWARD_URL,
                     "audit_url": CNR_SQL_AUDIT_URL,
+                    "cfp": {"formula_version": CFP_FORMULA_VERSION, "remote": CFP_REMOTE},
+                    "http_pool": http_pool.stats(),
+                    "audit_emitter": audit_emitter.stats() if AUDIT_ASYNC else None,
+                    "outbox": outbox.stats() if outbox is not None else None,
                 },
             )
             return
         self._json_response(404, {"error": "Not found"})
 
+    def _reject_audit(self, submitted_count: int, reason: str) -> None:
+        _emit_ingestion_audit(
+            [
+                _audit_row(
+                    publisher_email=self.headers.get("X-Publisher-Email"),
+                    caller_email=self.headers.get("X-Caller-Email"),
+                    vo=None,
+                    site=None,
+                    activity=None,
+                    submitted_count=submitted_count,
+                    accepted_count=0,
+                    rejected_count=submitted_count,
+                    outcome="rejected",
+                    reason=reason,
+                )
+            ],
+            self.headers.get("Authorization"),
+        )
+
+    def _post_streaming(self, read: Callable[[int], bytes]) -> None:
+        """
+        Parse the body array incrementally; convert, enrich and forward one chunk of
+        STREAM_CHUNK_RECORDS entries before reading the next. Only counts and failed
+        records are kept across chunks, so memory stays bounded by the chunk.
+        Chunks delivered before a failure stay ingested: every response carries the
+        stored count and `records`, and an error response sets `partial` when
+        anything was already stored.
+        """
+        auth_header = self.headers.get("Authorization")
+        publisher_email = self.headers.get("X-Publisher-Email")
+        caller_email = self.headers.get("X-Caller-Email")
+        total = 0
+        stored = 0
+        failed: List[Dict[str, Any]] = []
+        queued = False
+
+        def summary() -> Dict[str, Any]:
+            payload: Dict[str, Any] = {"queued" if queued else "forwarded": stored, "records": total, "results": failed}
+            if stored < total:
+                payload["failed"] = total - stored
+                if total - stored > len(failed):
+                    payload["results_truncated"] = True
+            return payload
+
+        def error(status: int, payload: Dict[str, Any]) -> None:
+            self._json_response(status, {**payload, **summary(), "partial": stored > 0})
+
+        try:
+            for chunk in chunked(iter_json_array(read), STREAM_CHUNK_RECORDS):
+                try:
+                    records = converter.convert(chunk)
+                except Exception as exc:
+                    self._reject_audit(len(chunk), f"transform_failed:{type(exc).__name__}")
+                    error(400, {"error": f"Transform failed: {exc}"})
+                    return
+                if not records:
+                    continue
+
+                pending = plan_enrichment(records, auth_header)
+                try:
+                    chunk_queued, chunk_results = deliver_pending(pending, auth_header, publisher_email, caller_email)
+                except ForwardFailed as exc:
+                    error(exc.status, exc.payload)
+                    return
+                queued = queued or chunk_queued
+                chunk_stored = stored_count(chunk_results)
+                total += len(chunk_results)
+                stored += chunk_stored
+                if chunk_stored < len(chunk_results) and len(failed) < STREAM_MAX_FAILED_RESULTS:
+                    failed.extend(
+                        r for r in chunk_results if r.get("status") not in ("ok", "queued")
+                    )
+                    del failed[STREAM_MAX_FAILED_RESULTS:]
+                del pending, records, chunk_results
+        except JSONStreamError as exc:
+            error(400, {"error": str(exc)})
+            return
+        except BodyDecodeError as exc:
+            error(exc.status, {"error": str(exc)})
+            return
+
+        if not total:
+            self._reject_audit(0, "no_valid_records")
+            error(400, {"error": "No valid metric entries in payload"})
+            return
+        # Unlike the buffered path, "results" holds only the records that were not stored.
+        if stored < total:
+            self._json_response(207, summary())
+            return
+        self._json_response(202 if queued else 200, summary())
+
+    def _respond_delivered(self, queued: bool, results: List[Dict[str, Any]]) -> None:
+        stored = stored_count(results)
+        # Queued records are persisted locally; the outbox drainer forwards them to the SQL adapter.
+        payload: Dict[str, Any] = {"queued" if queued else "forwarded": stored, "results": results}
+        if stored < len(results):
+            # Some chunks were refused by the adapter: per-record statuses tell which.
+            payload["failed"] = len(results) - stored
+            self._json_response(207, payload)
+            return
+        self._json_response(202 if queued else 200, payload)
+
     def do_POST(self):
         length = int(self.headers.get("content-length", 0))
-        raw_body = self.rfile.read(length) if length else b""
+        encoding = normalise_encoding(self.headers.get("Content-Encoding"))
+        try:
+            read = BoundedReader(self.rfile, length).read
+            if encoding != "identity":
+                read = DecompressingReader(read, encoding, max_bytes=MAX_DECODED_BYTES).read
+            if (self.headers.get(STREAM_HEADER) or "").strip() == "1":
+                # Opt-in: the response lists failed records only (see _post_streaming).
+                self._post_streaming(read)
+                return
+            raw_body = read(-1)
+        except BodyDecodeError as exc:
+            self._json_response(exc.status, {"error": str(exc)})
+            return
 
         try:
             incoming = json.loads(raw_body.decode("utf-8") or "null")
@@ -260,395 +1231,72 @@ class CIMHandler(http.server.BaseHTTPRequestHandler):
             records = converter.convert(incoming)
         except Exception as exc:
             submitted_count = len(incoming) if isinstance(incoming, list) else 1
-            _emit_ingestion_audit(
-                [
-                    _audit_row(
-                        publisher_email=self.headers.get("X-Publisher-Email"),
-                        caller_email=self.headers.get("X-Caller-Email"),
-                        vo=None,
-                        site=None,
-                        activity=None,
-                        submitted_count=submitted_count,
-                        accepted_count=0,
-                        rejected_count=submitted_count,
-                        outcome="rejected",
-                        reason=f"transform_failed:{type(exc).__name__}",
-                    )
-                ],
-                self.headers.get("Authorization"),
-            )
+            self._reject_audit(submitted_count, f"transform_failed:{type(exc).__name__}")
             self._json_response(400, {"error": f"Transform failed: {exc}"})
             return
 
         if not records:
-            _emit_ingestion_audit(
-                [
-                    _audit_row(
-                        publisher_email=self.headers.get("X-Publisher-Email"),
-                        caller_email=self.headers.get("X-Caller-Email"),
-                        vo=None,
-                        site=None,
-                        activity=None,
-                        submitted_count=0,
-                        accepted_count=0,
-                        rejected_count=0,
-                        outcome="rejected",
-                        reason="no_valid_records",
-                    )
-                ],
-                self.headers.get("Authorization"),
-            )
+            self._reject_audit(0, "no_valid_records")
             self._json_response(400, {"error": "No valid metric entries in payload"})
             return
 
         auth_header = self.headers.get("Authorization")
         publisher_email = self.headers.get("X-Publisher-Email")
         caller_email = self.headers.get("X-Caller-Email")
-        results: List[Dict[str, Any]] = []
-        audit_candidates: List[Dict[str, Any]] = []
-
-        envelopes: List[Dict[str, Any]] = []
-        detail_tables: List[str] = []
-
-        for rec in records:
-            envelope = to_envelope(rec)
-            fact = envelope["fact_site_event"]
-            site_name = fact.get("site")
-            detail_tables.append(rec.detail_table)
-
-            # Normalise partner-provided aliases (keep values if present; only fetch missing KPIs).
-            if "CI_site_g" not in fact:
-                partner_ci = fact.get("CI_g") if fact.get("CI_g") is not None else fact.get("CIg")
-                if partner_ci is not None:
-                    fact["CI_site_g"] = partner_ci
-            if "CFP_site_g" not in fact:
-                partner_cfp = fact.get("CFP_g") if fact.get("CFP_g") is not None else fact.get("CFPg")
-                if partner_cfp is not None:
-                    fact["CFP_site_g"] = partner_cfp
-            if fact.get("CI_g") is None and fact.get("CIg") is not None:
-                fact["CI_g"] = fact.get("CIg")
-            if fact.get("CFP_g") is None and fact.get("CFPg") is not None:
-                fact["CFP_g"] = fact.get("CFPg")
-            fact.pop("CIg", None)
-            fact.pop("CFPg", None)
-
-            # SQL adapter expects event_start_timestamp/event_end_timestamp (NOT NULL).
-            # Some partners omit times or send unexpected formats; ensure we always provide a value.
-            start_ts_dt, end_ts_dt, _ = _infer_times(fact)
-            start_ts = _to_iso_z(start_ts_dt)
-            end_ts = _to_iso_z(end_ts_dt)
-            def _put(k: str, v: str) -> None:
-                if k not in fact or fact.get(k) in (None, ""):
-                    fact[k] = v
-
-            _put("event_start_timestamp", start_ts)
-            _put("event_end_timestamp", end_ts)
-            # Keep legacy keys in sync as well.
-            _put("event_start_time", start_ts)
-            _put("event_end_times", end_ts)
-            # DB schema (via sql-adapter) also expects these to be NOT NULL in practice.
-            _put("startexectime", start_ts)
-            _put("stopexectime", end_ts)
-
-            # DB-level NOT NULL booleans.
-            if fact.get("execunitfinished") in (None, ""):
-                jf = fact.get("job_finished")
-                if isinstance(jf, bool):
-                    fact["execunitfinished"] = jf
-                else:
-                    st = str(fact.get("status") or "").strip().lower()
-                    fact["execunitfinished"] = st in {"done", "finished", "success", "succeeded"}
-
-            if fact.get("job_finished") in (None, ""):
-                euf = fact.get("execunitfinished")
-                fact["job_finished"] = bool(euf) if isinstance(euf, bool) else False
-
-            # Resolve PUE (only fetch if missing/invalid; but we may still fetch site location if CI is missing)
-            resolved_pue = fact.get("PUE")
-            pue_source = "provided" if resolved_pue not in (None, "") else None
-            if resolved_pue is not None:
-                try:
-                    resolved_pue = float(resolved_pue)
-                except Exception:
-                    resolved_pue = None
-                    pue_source = None
-            pue_resp = None
-            need_ci = True
-            if fact.get("CI_g") is not None:
-                try:
-                    float(fact.get("CI_g"))
-                    need_ci = False
-                except Exception:
-                    need_ci = True
-            if site_name and (resolved_pue is None or need_ci):
-                pue_resp = fetch_pue(site_name, auth_header)
-                if pue_resp and resolved_pue is None:
-                    resolved_pue = pue_resp.get("pue")
-                    pue_source = pue_resp.get("source") or "lookup"
-            if resolved_pue is None:
-                resolved_pue = PUE_FALLBACK
-                pue_source = "default"
-            try:
-                resolved_pue = float(resolved_pue)
-            except Exception:
-                resolved_pue = PUE_FALLBACK
-                pue_source = "default"
-
-            # Resolve lat/lon (from PUE response if available)
-            lat = None
-            lon = None
-            if pue_resp:
-                loc = pue_resp.get("location") or {}
-                lat = loc.get("latitude")
-                lon = loc.get("longitude")
-
-            # Energy
-            energy_wh = envelope.get("energy_wh")
-            if energy_wh is None:
-                energy_wh = fact.get("energy_wh")
-            if energy_wh is None:
-                energy_wh = fact.get("EnergyWh")
-            if energy_wh is not None:
-                try:
-                    energy_wh = float(energy_wh)
-                except Exception:
-                    energy_wh = None
-
-            # CI / CFP resolution: only fetch what's missing.
-            ci_g = None
-            cfp_g = None
-            ci_source = "provided" if fact.get("CI_g") is not None else None
-            cfp_source = "provided" if fact.get("CFP_g") is not None else None
-            try:
-                if fact.get("CI_g") is not None:
-                    ci_g = float(fact.get("CI_g"))
-            except Exception:
-                ci_g = None
-                ci_source = None
-            try:
-                if fact.get("CFP_g") is not None:
-                    cfp_g = float(fact.get("CFP_g"))
-            except Exception:
-                cfp_g = None
-                cfp_source = None
-
-            # If CI missing and we have location, fetch CI (and possibly CFP) from KPI-service.
-            if ci_g is None and lat is not None and lon is not None:
-                _, _, when = _infer_times(fact)
-                ci_start = when - timedelta(hours=1)
-                ci_end = when + timedelta(hours=2)
-                ci_resp = fetch_ci(lat, lon, ci_start, ci_end, resolved_pue, energy_wh, auth_header)
-                if ci_resp:
-                    ci_source = ci_resp.get("source") or "lookup"
-                    ci_val = ci_resp.get("ci_gco2_per_kwh")
-                    if ci_val is None:
-                        ci_val = ci_resp.get("ci_g")
-                    try:
-                        if ci_val is not None:
-                            ci_g = float(ci_val)
-                    except Exception:
-                        ci_g = None
-                    if cfp_g is None:
-                        cfp_val = ci_resp.get("cfp_g")
-                        try:
-                            if cfp_val is not None:
-                                cfp_g = float(cfp_val)
-                                cfp_source = "ci_api"
-                        except Exception:
-                            cfp_g = None
-
-            # If CFP missing but CI+PUE+energy exist, ask KPI-service to compute CFP, else compute locally.
-            if cfp_g is None and ci_g is not None and energy_wh is not None:
-                cfp_resp = fetch_cfp(ci_g, resolved_pue, energy_wh, auth_header)
-                if cfp_resp:
-                    cfp_val = cfp_resp.get("cfp_g")
-                    try:
-                        if cfp_val is not None:
-                            cfp_g = float(cfp_val)
-                            cfp_source = "cfp_api"
-                    except Exception:
-                        cfp_g = None
-                if cfp_g is None:
-                    cfp_g = (energy_wh / 1000.0) * resolved_pue * ci_g
-                    cfp_source = "computed"
-
-            # Final injection into fact
-            fact["PUE"] = resolved_pue
-            if ci_g is not None:
-                fact["CI_g"] = ci_g
-            if cfp_g is not None:
-                fact["CFP_g"] = round(cfp_g, 4)
-            if energy_wh is not None and "energy_wh" not in fact:
-                fact["energy_wh"] = energy_wh
-
-            envelope["audit"] = {
-                "pue_source": pue_source or "unknown",
-                "ci_source": ci_source or ("missing" if ci_g is None else "unknown"),
-                "cfp_source": cfp_source or ("missing" if cfp_g is None else "unknown"),
-                "cfp_null_reason": (
-                    "missing_ci_and_energy" if ci_g is None and energy_wh is None else
-                    "missing_ci" if ci_g is None else
-                    "missing_energy" if energy_wh is None and cfp_g is None else
-                    None
-                ),
-                "used_default_pue": pue_source == "default",
-                "used_cached_ci": ci_source == "local",
-            }
-
-            audit_candidates.append(
-                {
-                    "vo": fact.get("owner"),
-                    "site": fact.get("site"),
-                    "activity": rec.payload_type,
-                }
-            )
 
-            envelopes.append(envelope)
-
-        # Forward to SQL adapter (CNR) in bulk when possible (reduces per-entry HTTP overhead).
-        bulk_url = None
-        if CNR_SQL_FORWARD_URL.endswith("/cnr-sql-adapter"):
-            bulk_url = CNR_SQL_FORWARD_URL + "-bulk"
-
-        if bulk_url:
-            try:
-                print(f"[cim] Forwarding bulk ({len(envelopes)}) to SQL adapter ({bulk_url})", flush=True)
-                bulk_resp = _post_json(bulk_url, envelopes, auth_header)
-                bulk_results = bulk_resp.get("results") if isinstance(bulk_resp, dict) else None
-                if isinstance(bulk_results, list) and len(bulk_results) == len(envelopes):
-                    for i, r in enumerate(bulk_results):
-                        results.append(
-                            {
-                                "detail_table": detail_tables[i],
-                                "status": "ok",
-                                "site": audit_candidates[i]["site"],
-                                "activity": audit_candidates[i]["activity"],
-                                "cnr_response": r,
-                            }
-                        )
-                else:
-                    # best-effort: report entire response once
-                    for i in range(len(envelopes)):
-                        results.append(
-                            {
-                                "detail_table": detail_tables[i],
-                                "status": "ok",
-                                "site": audit_candidates[i]["site"],
-                                "activity": audit_candidates[i]["activity"],
-                                "cnr_response": bulk_resp,
-                            }
-                        )
-            except urllib.error.HTTPError as exc:
-                error_body = exc.read().decode("utf-8", "replace")
-                if exc.code == 404:
-                    # Bulk not supported on adapter; fall back to per-entry.
-                    bulk_url = None
-                else:
-                    print(f"[cim] CNR error {exc.code}: {error_body[:200]}", flush=True)
-                    _emit_ingestion_audit(
-                        [
-                            _audit_row(
-                                publisher_email=publisher_email,
-                                caller_email=caller_email,
-                                vo=item["vo"],
-                                site=item["site"],
-                                activity=item["activity"],
-                                submitted_count=1,
-                                accepted_count=0,
-                                rejected_count=1,
-                                outcome="rejected",
-                                reason=f"sql_bulk_http_{exc.code}",
-                            )
-                            for item in audit_candidates
-                        ],
-                        auth_header,
-                    )
-                    self._json_response(exc.code, {"error": error_body})
-                    return
-            except Exception as exc:
-                # Fall back to per-entry on transient bulk failures.
-                print(f"[cim] Bulk forwarding failed, falling back to per-entry: {exc}", flush=True)
-                bulk_url = None
-
-        if not bulk_url:
-            for i, envelope in enumerate(envelopes):
-                try:
-                    print(f"[cim] Forwarding metric to SQL adapter ({CNR_SQL_FORWARD_URL})", flush=True)
-                    response = _post_json(CNR_SQL_FORWARD_URL, envelope, auth_header)
-                    results.append(
-                        {
-                            "detail_table": detail_tables[i],
-                            "status": "ok",
-                            "site": audit_candidates[i]["site"],
-                            "activity": audit_candidates[i]["activity"],
-                            "cnr_response": response,
-                        }
-                    )
-                except urllib.error.HTTPError as exc:
-                    error_body = exc.read().decode("utf-8", "replace")
-                    print(f"[cim] CNR error {exc.code}: {error_body[:200]}", flush=True)
-                    reject_rows = [
-                        _audit_row(
-                            publisher_email=publisher_email,
-                            caller_email=caller_email,
-                            vo=audit_candidates[j]["vo"],
-                            site=audit_candidates[j]["site"],
-                            activity=audit_candidates[j]["activity"],
-                            submitted_count=1,
-                            accepted_count=1 if j < i else 0,
-                            rejected_count=0 if j < i else 1,
-                            outcome="accepted" if j < i else "rejected",
-                            reason=None if j < i else f"sql_http_{exc.code}",
-                        )
-                        for j in range(len(audit_candidates))
-                    ]
-                    _emit_ingestion_audit(reject_rows, auth_header)
-                    self._json_response(exc.code, {"error": error_body})
-                    return
-                except Exception as exc:
-                    print(f"[cim] Forwarding to SQL failed: {exc}", flush=True)
-                    reject_rows = [
-                        _audit_row(
-                            publisher_email=publisher_email,
-                            caller_email=caller_email,
-                            vo=audit_candidates[j]["vo"],
-                            site=audit_candidates[j]["site"],
-                            activity=audit_candidates[j]["activity"],
-                            submitted_count=1,
-                            accepted_count=1 if j < i else 0,
-                            rejected_count=0 if j < i else 1,
-                            outcome="accepted" if j < i else "rejected",
-                            reason=None if j < i else "sql_forward_failed",
-                        )
-                        for j in range(len(audit_candidates))
-                    ]
-                    _emit_ingestion_audit(reject_rows, auth_header)
-                    self._json_response(502, {"error": f"Forwarding failed: {exc}"})
-                    return
+        pending = plan_enrichment(records, auth_header)
+        try:
+            queued, results = deliver_pending(pending, auth_header, publisher_email, caller_email)
+        except ForwardFailed as exc:
+            self._json_response(exc.status, exc.payload)
+            return
 
-        accepted_rows = [
-            _audit_row(
-                publisher_email=publisher_email,
-                caller_email=caller_email,
-                vo=item["vo"],
-                site=item["site"],
-                activity=item["activity"],
-                submitted_count=1,
-                accepted_count=1,
-                rejected_count=0,
-                outcome="accepted",
-                reason=None,
-            )
-            for item in audit_candidates
-        ]
-        _emit_ingestion_audit(accepted_rows, auth_header)
-        self._json_response(200, {"forwarded": len(results), "results": results})
+        self._respond_delivered(queued, results)
 
     def log_message(self, format: str, *args: Any) -> None:  # type: ignore[override]
         # Silence default http.server logging to keep Docker logs clean.
         return
 
 
+class BoundedThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    Thread-per-request server capped at `max_workers` in-flight requests.
+    When all workers are busy the accept loop blocks, so extra connections wait
+    in the listen backlog instead of spawning unbounded threads.
+    """
+
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, server_address, handler_class, max_workers: int) -> None:
+        self._slots = threading.BoundedSemaphore(max_workers)
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address) -> None:
+        self._slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address) -> None:
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+def make_server(port: int = LISTEN_PORT, max_workers: int = CIM_MAX_WORKERS) -> http.server.HTTPServer:
+    if max_workers <= 1:
+        return http.server.HTTPServer(("0.0.0.0", port), CIMHandler)
+    return BoundedThreadingHTTPServer(("0.0.0.0", port), CIMHandler, max_workers)
+
+
 if __name__ == "__main__":
-    print(f"cim-service listening on port {LISTEN_PORT}, using KPI at {KPI_BASE} and SQL adapter at {CNR_SQL_FORWARD_URL}", flush=True)
-    http.server.HTTPServer(("0.0.0.0", LISTEN_PORT), CIMHandler).serve_forever()
+    print(
+        f"cim-service listening on port {LISTEN_PORT} ({CIM_MAX_WORKERS} workers), "
+        f"using KPI at {KPI_BASE} and SQL adapter at {CNR_SQL_FORWARD_URL}",
+        flush=True,
+    )
+    make_server().serve_forever()
@@ -0,0 +1,384 @@
+# outbox.py
+"""
+Durable, append-only outbox for enriched envelopes bound for the SQL adapter.
+
+Submissions append their envelopes to JSONL segment files (fsynced) and are
+acknowledged as soon as the write returns. A drainer thread reads the segments in
+order, posts them to the adapter's bulk endpoint in large batches with an
+idempotency key, and only then advances a persisted cursor. Batches are retried
+with backoff until delivered; batches the adapter refuses outright are split until
+the refused entries are isolated, and those are moved to a dead-letter file. Fully
+drained segments are deleted.
+
+A batch is the byte range of its segment it was first read from. The range is
+recorded in the cursor before the first post and every retry, also after a
+restart, re-sends exactly those entries under the same key, so a batch whose reply
+was lost is never re-sent as a different one.
+
+Layout of the outbox directory:
+    instance            random id that prefixes idempotency keys
+    cursor.json         {"segment": <seq>, "offset": <bytes>, "batch_end": <bytes>} of the
+                        next undelivered line and of the batch being sent from it
+    outbox-<seq>.jsonl  one entry per line: {"key", "envelope", "audit"}
+    dead-letter.jsonl   refused entries with the adapter's reason
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Entry = Dict[str, Any]
+PostFn = Callable[[List[Dict[str, Any]], str], None]
+EntriesFn = Callable[[List[Entry]], None]
+RejectedFn = Callable[[List[Entry], str], None]
+
+
+class OutboxFull(Exception):
+    """Raised by append() when the undelivered backlog exceeds max_pending_bytes."""
+
+
+class OutboxRejected(Exception):
+    """Raised by the post callable when the adapter refuses a batch permanently (no retry)."""
+
+
+@dataclass
+class _Batch:
+    """Entries read from bytes [start, end) of segment `seq`; ends[i] is where entry i's line ends."""
+
+    seq: int
+    start: int
+    end: int
+    entries: List[Entry]
+    ends: List[int]
+
+    def split(self) -> List["_Batch"]:
+        mid = len(self.entries) // 2
+        cut = self.ends[mid - 1]
+        return [
+            _Batch(self.seq, self.start, cut, self.entries[:mid], self.ends[:mid]),
+            _Batch(self.seq, cut, self.end, self.entries[mid:], self.ends[mid:]),
+        ]
+
+
+class Outbox:
+    """
+    directory: where segments and the cursor live (must be on persistent storage).
+    post: sends one batch of envelopes with an idempotency key; raises on failure.
+    on_delivered / on_rejected: called from the drainer thread after a batch is
+        stored / dead-lettered (used for ingestion audit rows).
+    batch_records: envelopes per bulk post.
+    segment_bytes: a new segment file is started once the current one is this large.
+    max_pending_bytes: append() raises OutboxFull beyond this backlog (0 = unbounded).
+    backoff_s / max_backoff_s: exponential backoff between failed attempts.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        post: PostFn,
+        *,
+        on_delivered: Optional[EntriesFn] = None,
+        on_rejected: Optional[RejectedFn] = None,
+        batch_records: int = 2000,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_pending_bytes: int = 0,
+        backoff_s: float = 1.0,
+        max_backoff_s: float = 60.0,
+    ) -> None:
+        self.directory = directory
+        self._post = post
+        self._on_delivered = on_delivered
+        self._on_rejected = on_rejected
+        self.batch_records = max(1, batch_records)
+        self.segment_bytes = max(1, segment_bytes)
+        self.max_pending_bytes = max(0, max_pending_bytes)
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.instance = self._load_instance()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._cursor, self._batch_end = self._load_cursor()
+        segments = self._segment_seqs()
+        # Always start a fresh segment: an older one may end in a torn write.
+        self._write_seq = max(segments[-1] + 1 if segments else 0, self._cursor[0])
+        self._write_file = None
+        self._write_size = 0
+        self._seq_counter = 0
+        self._last_error: Optional[str] = None
+        self._stats = {"appended": 0, "delivered": 0, "dead_lettered": 0, "failed_posts": 0}
+
+    # --- files ---------------------------------------------------------------------
+
+    def _load_instance(self) -> str:
+        path = self.directory / "instance"
+        try:
+            value = path.read_text(encoding="utf-8").strip()
+            if value:
+                return value
+        except OSError:
+            pass
+        value = uuid.uuid4().hex[:12]
+        path.write_text(value + "\n", encoding="utf-8")
+        return value
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.directory / f"outbox-{seq:012d}.jsonl"
+
+    def _segment_seqs(self) -> List[int]:
+        seqs = []
+        for path in self.directory.glob("outbox-*.jsonl"):
+            try:
+                seqs.append(int(path.stem.split("-", 1)[1]))
+            except ValueError:
+                continue
+        return sorted(seqs)
+
+    def _load_cursor(self) -> Tuple[Tuple[int, int], Optional[int]]:
+        try:
+            doc = json.loads((self.directory / "cursor.json").read_text(encoding="utf-8"))
+            batch_end = doc.get("batch_end")
+            return (int(doc["segment"]), int(doc["offset"])), (None if batch_end is None else int(batch_end))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            segments = self._segment_seqs()
+            return ((segments[0] if segments else 0), 0), None
+
+    def _save_cursor(self, seq: int, offset: int, batch_end: Optional[int] = None) -> None:
+        path = self.directory / "cursor.json"
+        tmp = path.with_suffix(".tmp")
+        doc: Dict[str, int] = {"segment": seq, "offset": offset}
+        if batch_end is not None:
+            doc["batch_end"] = batch_end
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(doc, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        with self._cond:
+            self._cursor = (seq, offset)
+            self._batch_end = batch_end
+
+    def _pending_bytes(self) -> int:
+        seq, offset = self._cursor
+        total = 0
+        for s in self._segment_seqs():
+            if s < seq:
+                continue
+            try:
+                size = self._segment_path(s).stat().st_size
+            except OSError:
+                continue
+            total += size - offset if s == seq else size
+        return max(0, total)
+
+    # --- producer side -------------------------------------------------------------
+
+    def append(self, entries: List[Entry]) -> List[str]:
+        """
+        Persist entries (each needs "envelope"; "audit" is optional) and return
+        their keys. Returns only after the data is fsynced.
+        """
+        if not entries:
+            return []
+        self._ensure_started()
+        with self._cond:
+            if self.max_pending_bytes and self._pending_bytes() >= self.max_pending_bytes:
+                raise OutboxFull(f"outbox backlog above {self.max_pending_bytes} bytes")
+            self._seq_counter += 1
+            prefix = f"{self.instance}-{int(time.time() * 1000)}-{self._seq_counter}"
+            keys = [f"{prefix}-{i}" for i in range(len(entries))]
+            data = "".join(
+                json.dumps({"key": key, "envelope": entry["envelope"], "audit": entry.get("audit")}) + "\n"
+                for key, entry in zip(keys, entries)
+            ).encode("utf-8")
+
+            if self._write_file is None or self._write_size >= self.segment_bytes:
+                if self._write_file is not None:
+                    self._write_file.close()
+                    self._write_seq += 1
+                self._write_file = self._segment_path(self._write_seq).open("ab")
+                self._write_size = self._write_file.tell()
+            self._write_file.write(data)
+            self._write_file.flush()
+            os.fsync(self._write_file.fileno())
+            self._write_size += len(data)
+            self._stats["appended"] += len(entries)
+            self._cond.notify()
+        return keys
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._stats,
+                "pending_bytes": self._pending_bytes(),
+                "segments": len(self._segment_seqs()),
+                "cursor": {"segment": self._cursor[0], "offset": self._cursor[1]},
+                "last_error": self._last_error,
+            }
+
+    def stop(self, timeout_s: float = 10.0) -> None:
+        """Stop the drainer; undelivered entries stay on disk for the next start."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout_s)
+        with self._cond:
+            if self._write_file is not None:
+                self._write_file.close()
+                self._write_file = None
+
+    # --- drainer -------------------------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cim-outbox-drainer", daemon=True)
+                self._thread.start()
+
+    def start(self) -> None:
+        """Start draining entries left over from a previous run."""
+        self._ensure_started()
+
+    def _read_batch(self) -> Optional[_Batch]:
+        """
+        Return the next batch, or None when idle. A batch recorded in the cursor
+        (batch_end) is read back exactly; otherwise up to batch_records entries.
+        """
+        while True:
+            with self._cond:
+                seq, offset = self._cursor
+                limit = self._batch_end
+                active = self._write_seq
+            path = self._segment_path(seq)
+            entries: List[Entry] = []
+            ends: List[int] = []
+            end = offset
+            at_eof = True
+            try:
+                with path.open("rb") as f:
+                    f.seek(offset)
+                    while True:
+                        if (end >= limit) if limit is not None else (len(entries) >= self.batch_records):
+                            at_eof = False
+                            break
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            # Torn tail: still being written (active) or a crash mid-write (old segment).
+                            if line and seq != active:
+                                print(f"[cim-outbox] Skipping torn line at end of {path.name}", flush=True)
+                                end += len(line)
+                            break
+                        end += len(line)
+                        try:
+                            entries.append(json.loads(line))
+                            ends.append(end)
+                        except json.JSONDecodeError:
+                            print(f"[cim-outbox] Skipping corrupt line in {path.name}", flush=True)
+            except FileNotFoundError:
+                pass
+            if entries:
+                return _Batch(seq, offset, end, entries, ends)
+            if not at_eof:
+                # Only corrupt lines up to the batch limit: skip them and keep reading.
+                self._save_cursor(seq, end)
+                continue
+            if seq >= active:
+                if end != offset or limit is not None:
+                    self._save_cursor(seq, end)
+                return None
+            # Older segment fully drained: drop it and move on.
+            self._save_cursor(seq + 1, 0)
+            path.unlink(missing_ok=True)
+
+    def _run(self) -> None:
+        attempt = 0
+        # Batches read but not yet delivered, in segment order. A refused batch is
+        # replaced by its two halves, so the refused entries end up on their own.
+        todo: List[_Batch] = []
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            if not todo:
+                batch = self._read_batch()
+                if batch is None:
+                    with self._cond:
+                        if self._stopping:
+                            return
+                        self._cond.wait(1.0)
+                    continue
+                todo.append(batch)
+
+            batch = todo[0]
+            entries = batch.entries
+            with self._cond:
+                frozen = self._cursor == (batch.seq, batch.start) and self._batch_end == batch.end
+            if not frozen:
+                self._save_cursor(batch.seq, batch.start, batch.end)
+            key = f"{self.instance}:{batch.seq}:{batch.start}:{batch.end}"
+            try:
+                self._post([e.get("envelope") for e in entries], key)
+            except OutboxRejected as exc:
+                todo.pop(0)
+                attempt = 0
+                if len(entries) > 1:
+                    print(f"[cim-outbox] Adapter refused a batch of {len(entries)} envelopes, splitting it: {str(exc)[:200]}", flush=True)
+                    todo[0:0] = batch.split()
+                    continue
+                self._dead_letter(entries, str(exc))
+                self._advance(batch, todo)
+                continue
+            except Exception as exc:
+                self._stats["failed_posts"] += 1
+                self._last_error = str(exc)
+                delay = min(self.max_backoff_s, self.backoff_s * (2 ** attempt))
+                attempt += 1
+                print(f"[cim-outbox] Bulk post of {len(entries)} envelopes failed (attempt {attempt}): {exc}; retrying in {delay:.1f}s", flush=True)
+                deadline = time.monotonic() + delay
+                with self._cond:
+                    # New appends notify the condition too; keep waiting out the backoff.
+                    while not self._stopping and time.monotonic() < deadline:
+                        self._cond.wait(deadline - time.monotonic())
+                continue
+
+            todo.pop(0)
+            self._advance(batch, todo)
+            self._stats["delivered"] += len(entries)
+            self._last_error = None
+            attempt = 0
+            if self._on_delivered is not None:
+                self._notify(self._on_delivered, entries)
+
+    def _advance(self, done: _Batch, todo: List[_Batch]) -> None:
+        """Move the cursor past `done`, recording the next split half as the batch in flight."""
+        self._save_cursor(done.seq, done.end, todo[0].end if todo else None)
+
+    def _dead_letter(self, entries: List[Entry], reason: str) -> None:
+        print(f"[cim-outbox] Adapter refused {len(entries)} envelopes, moving to dead-letter: {reason[:200]}", flush=True)
+        path = self.directory / "dead-letter.jsonl"
+        with path.open("a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps({**entry, "reason": reason, "failed_at": int(time.time())}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._stats["dead_lettered"] += len(entries)
+        if self._on_rejected is not None:
+            self._notify(self._on_rejected, entries, reason)
+
+    @staticmethod
+    def _notify(callback: Callable[..., None], *args: Any) -> None:
+        try:
+            callback(*args)
+        except Exception as exc:
+            print(f"[cim-outbox] Callback failed: {exc}", flush=True)
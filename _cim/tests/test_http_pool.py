@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import http.server
+import sys
+import threading
+import time
+import unittest
+import urllib.error
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from http_pool import HTTPConnectionPool
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.server.seen.append((self.command, self.path, body))
+        if self.server.swallow:
+            # Request received (and, for the caller, possibly applied) but the reply is lost.
+            self.server.swallow -= 1
+            self.close_connection = True
+            return
+        time.sleep(self.server.delay_s)
+        data = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        # Keep-alive as far as the client knows, but drop the connection like an idle timeout would.
+        self.close_connection = self.server.drop_after_reply
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, format, *args):  # noqa: A002
+        return
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.seen = []
+        self.delay_s = 0.0
+        self.drop_after_reply = False
+        self.swallow = 0
+
+
+class HTTPConnectionPoolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = _Server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/bulk"
+        self.pool = HTTPConnectionPool(max_per_host=2, timeout_s=5.0, idle_s=30.0)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _stats(self) -> dict:
+        return next(iter(self.pool.stats().values()))
+
+    def _skip_drop_check(self) -> None:
+        # Reuse the dropped connection so the request itself hits the stale socket.
+        self.pool._dropped = lambda conn: False
+
+    def test_reuses_keep_alive_connections(self) -> None:
+        for _ in range(3):
+            status, _, body = self.pool.request("GET", self.url)
+            self.assertEqual((status, body), (200, b'{"ok": true}'))
+        self.assertEqual(self._stats()["opened"], 1)
+        self.assertEqual(self._stats()["reused"], 2)
+
+    def test_dropped_idle_connection_is_not_reused(self) -> None:
+        self.server.drop_after_reply = True
+        self.pool.request("POST", self.url, body=b"1")
+        time.sleep(0.05)
+        self.pool.request("POST", self.url, body=b"2")
+        self.assertEqual(self._stats()["opened"], 2)
+        self.assertEqual([body for _, _, body in self.server.seen], [b"1", b"2"])
+
+    def test_send_failure_on_stale_connection_is_retried(self) -> None:
+        self._skip_drop_check()
+        self.server.drop_after_reply = True
+        self.pool.request("POST", self.url, body=b"first")
+        time.sleep(0.05)
+        status, _, _ = self.pool.request("POST", self.url, body=b"second")
+        self.assertEqual(status, 200)
+        self.assertEqual([body for _, _, body in self.server.seen], [b"first", b"second"])
+
+    def test_lost_reply_is_retried_only_when_replayable(self) -> None:
+        self.pool.request("GET", self.url)
+        self.server.swallow = 1
+        status, _, _ = self.pool.request("GET", self.url)
+        self.assertEqual(status, 200)
+
+        self.server.swallow = 1
+        status, _, _ = self.pool.request("POST", self.url, body=b"keyed", headers={"Idempotency-Key": "k1"})
+        self.assertEqual(status, 200)
+        self.assertEqual([body for _, _, body in self.server.seen[-2:]], [b"keyed", b"keyed"])
+
+        self.server.swallow = 1
+        with self.assertRaises(urllib.error.URLError):
+            self.pool.request("POST", self.url, body=b"plain")
+        self.assertEqual([body for _, _, body in self.server.seen].count(b"plain"), 1)
+
+    def test_acquire_timeout_per_upstream(self) -> None:
+        self.pool.configure_upstream(self.url, max_connections=1, acquire_timeout_s=0.1)
+        self.server.delay_s = 0.5
+        holder = threading.Thread(target=self.pool.request, args=("GET", self.url))
+        holder.start()
+        time.sleep(0.1)
+        started = time.monotonic()
+        with self.assertRaisesRegex(urllib.error.URLError, "pool exhausted"):
+            self.pool.request("GET", self.url)
+        self.assertLess(time.monotonic() - started, 0.4)
+        holder.join()
+        self.assertEqual(self._stats()["max"], 1)
+        with self.assertRaises(RuntimeError):
+            self.pool.configure_upstream(self.url, max_connections=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import io
+import json
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from json_stream import BoundedReader, JSONStreamError, chunked, iter_json_array
+
+
+def _parse(text: str, read_size: int = 1) -> list:
+    return list(iter_json_array(io.BytesIO(text.encode("utf-8")).read, read_size=read_size))
+
+
+class IterJSONArrayTests(unittest.TestCase):
+    def test_matches_json_loads_for_every_read_size(self) -> None:
+        doc = [
+            {"SiteName": "CNR-ISTI", "nested": {"a": [1, 2, {"b": None}]}, "ok": True},
+            -12.5e3,
+            1234567890,
+            "quote \" backslash \\ slash / brackets ] [ , }",
+            "unicode é ü 中文   😀",
+            [],
+            {},
+            False,
+        ]
+        text = json.dumps(doc, ensure_ascii=False, indent=1)
+        for read_size in (1, 2, 3, 7, 64 * 1024):
+            with self.subTest(read_size=read_size):
+                self.assertEqual(_parse(text, read_size), doc)
+        self.assertEqual(_parse(json.dumps(doc)), doc)  # \\uXXXX escapes, incl. surrogate pairs
+
+    def test_numbers_split_across_reads(self) -> None:
+        self.assertEqual(_parse("[1.5e3,22,-0.25]"), [1500.0, 22, -0.25])
+        self.assertEqual(_parse("[123456]", read_size=2), [123456])
+
+    def test_non_array_and_empty_inputs(self) -> None:
+        self.assertEqual(_parse('{"a": 1}'), [{"a": 1}])
+        self.assertEqual(_parse("  [ ]  "), [])
+        self.assertEqual(_parse(""), [])
+
+    def test_malformed_input(self) -> None:
+        for text in ('[{"a": 1}', "[1 2]", "[1,]", '[{"a": }]', "[1] x", "[1]]", '{"a": 1'):
+            with self.subTest(text=text), self.assertRaises(JSONStreamError):
+                _parse(text)
+
+    def test_yields_before_reading_the_rest(self) -> None:
+        data = io.BytesIO(b'[{"a": 1}, {"b": 2}' + b" " * 4096 + b"]")
+        items = iter_json_array(data.read, read_size=16)
+        self.assertEqual(next(items), {"a": 1})
+        self.assertLess(data.tell(), 64)
+        self.assertEqual(list(items), [{"b": 2}])
+
+
+class HelperTests(unittest.TestCase):
+    def test_bounded_reader_stops_at_length(self) -> None:
+        reader = BoundedReader(io.BytesIO(b"[1,2]trailing"), 5)
+        self.assertEqual(reader.read(3), b"[1,")
+        self.assertEqual(reader.read(), b"2]")
+        self.assertEqual(reader.read(), b"")
+
+    def test_chunked(self) -> None:
+        self.assertEqual(list(chunked(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked(iter([]), 2)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import json
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from outbox import Outbox, OutboxRejected
+
+
+def _wait_until(predicate, timeout_s: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def _entries(*ids) -> list:
+    return [{"envelope": {"id": i}, "audit": {"site": "CNR-ISTI"}} for i in ids]
+
+
+class _Adapter:
+    """Records every post; `fail` decides per call whether to raise."""
+
+    def __init__(self) -> None:
+        self.calls = []
+        self.stored = {}
+        self.fail = lambda envelopes, key: None
+        self.lock = threading.Lock()
+
+    def post(self, envelopes, key) -> None:
+        with self.lock:
+            self.calls.append((key, [e["id"] for e in envelopes]))
+        self.fail(envelopes, key)
+        # Like monitoring.ingest_idempotency: a repeated key is not stored again.
+        self.stored.setdefault(key, [e["id"] for e in envelopes])
+
+    def stored_ids(self) -> list:
+        return sorted(i for ids in self.stored.values() for i in ids)
+
+
+class OutboxTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+        self.adapter = _Adapter()
+        self.boxes = []
+
+    def tearDown(self) -> None:
+        for box in self.boxes:
+            box.stop()
+        self._tmp.cleanup()
+
+    def _box(self, **kwargs) -> Outbox:
+        options = dict(backoff_s=0.01, max_backoff_s=0.05)
+        options.update(kwargs)
+        box = Outbox(self.dir, self.adapter.post, **options)
+        self.boxes.append(box)
+        return box
+
+    def test_lost_ack_resends_the_same_batch_under_the_same_key(self) -> None:
+        box = self._box()
+        lost = []
+
+        def fail(envelopes, key):
+            if not lost:
+                # The adapter commits, more entries arrive, and then the reply is lost.
+                lost.append(key)
+                self.adapter.stored[key] = [e["id"] for e in envelopes]
+                box.append(_entries(3, 4))
+                raise ConnectionResetError("reply lost")
+
+        self.adapter.fail = fail
+        box.append(_entries(1, 2))
+        self.assertTrue(_wait_until(lambda: box.stats()["delivered"] == 4))
+
+        first, retry = self.adapter.calls[0], self.adapter.calls[1]
+        self.assertEqual(retry, first)
+        self.assertEqual(first[1], [1, 2])
+        self.assertEqual(self.adapter.calls[2][1], [3, 4])
+        self.assertNotEqual(self.adapter.calls[2][0], first[0])
+        self.assertEqual(self.adapter.stored_ids(), [1, 2, 3, 4])
+
+    def test_batch_key_survives_a_restart(self) -> None:
+        box = self._box()
+
+        def fail(envelopes, key):
+            if len(self.adapter.calls) == 1:
+                box.append(_entries(3))  # lands in the same segment as the batch in flight
+            raise TimeoutError("no reply")
+
+        self.adapter.fail = fail
+        box.append(_entries(1, 2))
+        self.assertTrue(_wait_until(lambda: len(self.adapter.calls) >= 2))
+        box.stop()
+        first = self.adapter.calls[0]
+        self.assertEqual(first[1], [1, 2])
+
+        self.adapter.fail = lambda envelopes, key: None
+        self.adapter.calls.clear()
+        box = self._box()
+        box.append(_entries(4))
+        self.assertTrue(_wait_until(lambda: box.stats()["delivered"] == 4))
+        self.assertEqual(self.adapter.calls[0], first)
+        self.assertEqual([ids for _, ids in self.adapter.calls[1:]], [[3], [4]])
+
+    def test_refused_entries_are_isolated_before_dead_lettering(self) -> None:
+        rejected = []
+
+        def fail(envelopes, key):
+            if any(e["id"] in (3, 6) for e in envelopes):
+                raise OutboxRejected("sql_bulk_http_422: invalid envelope")
+
+        self.adapter.fail = fail
+        box = self._box(on_rejected=lambda entries, reason: rejected.extend(e["envelope"]["id"] for e in entries))
+        box.append(_entries(*range(1, 9)))
+        self.assertTrue(_wait_until(lambda: box.stats()["delivered"] == 6))
+        self.assertTrue(_wait_until(lambda: box.stats()["dead_lettered"] == 2))
+
+        self.assertEqual(self.adapter.stored_ids(), [1, 2, 4, 5, 7, 8])
+        self.assertEqual(sorted(rejected), [3, 6])
+        dead = [json.loads(line) for line in (self.dir / "dead-letter.jsonl").read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([d["envelope"]["id"] for d in dead], [3, 6])
+        self.assertTrue(dead[0]["reason"].startswith("sql_bulk_http_422"))
+
+    def test_segments_rotate_and_drained_ones_are_removed(self) -> None:
+        gate = threading.Event()
+        self.adapter.fail = lambda envelopes, key: gate.wait(5)
+        box = self._box(segment_bytes=100, batch_records=2)
+        for i in range(6):
+            box.append(_entries(i))
+        self.assertGreaterEqual(len(list(self.dir.glob("outbox-*.jsonl"))), 3)
+        gate.set()
+        self.assertTrue(_wait_until(lambda: box.stats()["delivered"] == 6))
+        self.assertTrue(_wait_until(lambda: len(list(self.dir.glob("outbox-*.jsonl"))) == 1))
+        box.stop()
+
+        # A restart resumes from the persisted cursor and sends nothing twice.
+        self.adapter.calls.clear()
+        box = self._box()
+        box.start()
+        time.sleep(0.2)
+        self.assertEqual(self.adapter.calls, [])
+        self.assertEqual(self.adapter.stored_ids(), list(range(6)))
+
+    def test_torn_tail_of_an_old_segment_is_skipped(self) -> None:
+        lines = [json.dumps({"key": f"k{i}", "envelope": {"id": i}, "audit": None}) + "\n" for i in (1, 2)]
+        (self.dir / "outbox-000000000000.jsonl").write_text("".join(lines) + '{"key": "k3", "env', encoding="utf-8")
+        box = self._box()
+        box.start()
+        self.assertTrue(_wait_until(lambda: box.stats()["delivered"] == 2))
+        self.assertEqual(self.adapter.stored_ids(), [1, 2])
+        box.append(_entries(4))
+        self.assertTrue(_wait_until(lambda: box.stats()["delivered"] == 3))
+        self.assertFalse((self.dir / "outbox-000000000000.jsonl").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
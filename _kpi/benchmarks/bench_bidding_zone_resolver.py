@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Offline benchmark for lat/lon -> bidding-zone resolution.
+
+Runs against the vendored ENTSO-E GeoJSON pack and prints one JSON document, so
+runs from different commits (or geometry pack updates) can be diffed directly:
+
+    python _kpi/benchmarks/bench_bidding_zone_resolver.py --output bz_bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import hashlib
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from bidding_zone_resolver import (
+    DEFAULT_MANIFEST_NAME,
+    BiddingZoneNotFoundError,
+    BiddingZoneResolver,
+    write_manifest,
+)
+from prefetch_ci_cache import default_geojson_dir, load_lookup_area
+
+# Well inside a single zone.
+INTERIOR_POINTS: List[Tuple[str, float, float]] = [
+    ("paris", 48.8566, 2.3522),
+    ("berlin", 52.5200, 13.4050),
+    ("madrid", 40.4168, -3.7038),
+    ("warsaw", 52.2297, 21.0122),
+    ("pisa", 43.7189, 10.4228),
+    ("oslo", 59.9139, 10.7522),
+]
+
+# Outside every zone of the pack (ocean, non-ENTSO-E countries).
+OUTSIDE_POINTS: List[Tuple[str, float, float]] = [
+    ("atlantic", 45.0, -30.0),
+    ("moscow", 55.7558, 37.6173),
+    ("cairo", 30.0444, 31.2357),
+    ("reykjavik", 64.1466, -21.9426),
+]
+
+# Europe-wide bbox used for the seeded batch workload.
+BATCH_BBOX = (-10.0, 35.0, 32.0, 71.0)  # min_lon, min_lat, max_lon, max_lat
+
+
+def _pack_fingerprint(geojson_dir: Path) -> Dict[str, object]:
+    digest = hashlib.sha256()
+    files = sorted(geojson_dir.glob("*.geojson"))
+    total = 0
+    for path in files:
+        data = path.read_bytes()
+        total += len(data)
+        digest.update(path.name.encode("utf-8"))
+        digest.update(data)
+    return {"files": len(files), "bytes": total, "sha256": digest.hexdigest()}
+
+
+def _border_points(geojson_dir: Path, limit: int) -> List[Tuple[str, float, float]]:
+    # Shell vertices lie exactly on a zone boundary, which is the slowest path
+    # through the ring test (segment check before the crossing test).
+    points: List[Tuple[str, float, float]] = []
+    for path in sorted(geojson_dir.glob("*.geojson")):
+        for feature in BiddingZoneResolver._read_geojson(path):
+            ring = feature.polygons[0].rings[0]
+            lon, lat = ring[len(ring) // 2]
+            points.append((f"{feature.zone_name}_vertex", lat, lon))
+            break
+        if len(points) >= limit:
+            break
+    return points
+
+
+def _batch_points(count: int, seed: int) -> List[Tuple[float, float]]:
+    rng = random.Random(seed)
+    min_lon, min_lat, max_lon, max_lat = BATCH_BBOX
+    return [(rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)) for _ in range(count)]
+
+
+def _resolve_or_none(resolver: BiddingZoneResolver, lat: float, lon: float) -> Optional[str]:
+    try:
+        return resolver.resolve(lat, lon)[0]
+    except BiddingZoneNotFoundError:
+        return None
+
+
+def _timed(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _summary_us(samples_s: Iterable[float]) -> Dict[str, float]:
+    values = sorted(s * 1e6 for s in samples_s)
+    return {
+        "median_us": round(statistics.median(values), 3),
+        "min_us": round(values[0], 3),
+        "max_us": round(values[-1], 3),
+    }
+
+
+def _build(mode: str, geojson_dir: Path, manifest: Path, lookup) -> BiddingZoneResolver:
+    if mode == "index":
+        return BiddingZoneResolver(geojson_dir, area_lookup=lookup)
+    if mode == "scan":
+        return BiddingZoneResolver(geojson_dir, use_spatial_index=False, area_lookup=lookup)
+    if mode == "manifest":
+        return BiddingZoneResolver(geojson_dir, area_lookup=lookup, manifest_path=manifest)
+    raise ValueError(f"unknown mode: {mode}")
+
+
+def bench_mode(
+    mode: str,
+    geojson_dir: Path,
+    manifest: Path,
+    lookup,
+    *,
+    load_repeats: int,
+    latency_repeats: int,
+    batch: List[Tuple[float, float]],
+    border: List[Tuple[str, float, float]],
+) -> Dict[str, object]:
+    result: Dict[str, object] = {"mode": mode}
+
+    load_samples = []
+    for _ in range(load_repeats):
+        gc.collect()
+        load_samples.append(_timed(lambda: _build(mode, geojson_dir, manifest, lookup)))
+    result["cold_load"] = {
+        "repeats": load_repeats,
+        "median_ms": round(statistics.median(load_samples) * 1e3, 3),
+        "min_ms": round(min(load_samples) * 1e3, 3),
+    }
+
+    gc.collect()
+    tracemalloc.start()
+    resolver = _build(mode, geojson_dir, manifest, lookup)
+    after_load, _ = tracemalloc.get_traced_memory()
+    for _, lat, lon in INTERIOR_POINTS[:1]:
+        _resolve_or_none(resolver, lat, lon)
+    after_first, _ = tracemalloc.get_traced_memory()
+    for lat, lon in batch:
+        _resolve_or_none(resolver, lat, lon)
+    after_batch, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["memory"] = {
+        "after_load_kib": round(after_load / 1024, 1),
+        "after_first_resolve_kib": round(after_first / 1024, 1),
+        "after_batch_kib": round(after_batch / 1024, 1),
+        "peak_kib": round(peak / 1024, 1),
+        "loaded_files_after_batch": len(resolver.loaded_files),
+    }
+
+    # Latency is measured on a fresh, fully warmed resolver so lazy loading
+    # does not leak into per-point numbers.
+    resolver = _build(mode, geojson_dir, manifest, lookup)
+    for lat, lon in batch:
+        _resolve_or_none(resolver, lat, lon)
+
+    latency: Dict[str, Dict[str, object]] = {}
+    for kind, points in (("interior", INTERIOR_POINTS), ("border", border), ("outside", OUTSIDE_POINTS)):
+        per_point = {}
+        for name, lat, lon in points:
+            zone = _resolve_or_none(resolver, lat, lon)
+            samples = [_timed(lambda: _resolve_or_none(resolver, lat, lon)) for _ in range(latency_repeats)]
+            per_point[name] = {"zone": zone, **_summary_us(samples)}
+        latency[kind] = per_point
+    result["latency"] = latency
+
+    start = time.perf_counter()
+    resolved = sum(1 for lat, lon in batch if _resolve_or_none(resolver, lat, lon) is not None)
+    elapsed = time.perf_counter() - start
+    result["batch"] = {
+        "points": len(batch),
+        "resolved": resolved,
+        "elapsed_ms": round(elapsed * 1e3, 3),
+        "points_per_s": round(len(batch) / elapsed, 1) if elapsed > 0 else None,
+    }
+    return result
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark bidding-zone resolution on the local GeoJSON pack")
+    parser.add_argument("--geojson-dir", type=Path, default=default_geojson_dir())
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help=f"Zone manifest (default: <geojson-dir>/{DEFAULT_MANIFEST_NAME}, generated to a temp file if missing)",
+    )
+    parser.add_argument(
+        "--modes",
+        default="index,manifest",
+        help="Comma-separated: index, manifest, scan (scan = no bbox prefilter, slow)",
+    )
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=20260101)
+    parser.add_argument("--load-repeats", type=int, default=3)
+    parser.add_argument("--latency-repeats", type=int, default=50)
+    parser.add_argument("--output", type=Path, default=None, help="Write JSON here instead of stdout")
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    geojson_dir = args.geojson_dir.resolve()
+    manifest = args.manifest or (geojson_dir / DEFAULT_MANIFEST_NAME)
+    tmp_dir = None
+    if not manifest.is_file():
+        import tempfile
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        manifest = write_manifest(geojson_dir, Path(tmp_dir.name) / DEFAULT_MANIFEST_NAME)
+
+    lookup = load_lookup_area()
+    batch = _batch_points(args.batch_size, args.seed)
+    border = _border_points(geojson_dir, limit=6)
+
+    report = {
+        "benchmark": "bidding_zone_resolver",
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pack": _pack_fingerprint(geojson_dir),
+        "params": {
+            "batch_size": args.batch_size,
+            "seed": args.seed,
+            "load_repeats": args.load_repeats,
+            "latency_repeats": args.latency_repeats,
+        },
+        "modes": [
+            bench_mode(
+                mode.strip(),
+                geojson_dir,
+                manifest,
+                lookup,
+                load_repeats=args.load_repeats,
+                latency_repeats=args.latency_repeats,
+                batch=batch,
+                border=border,
+            )
+            for mode in args.modes.split(",")
+            if mode.strip()
+        ],
+    }
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
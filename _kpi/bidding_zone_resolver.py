@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import argparse
 import json
 import importlib.util
 import os
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable, List, Optional, Sequence, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+MANIFEST_VERSION = 1
+DEFAULT_MANIFEST_NAME = "manifest.json"
 
 
 class BiddingZoneResolverError(RuntimeError):
@@ -30,6 +35,16 @@ class BiddingZoneFeature:
     area: float
 
 
+@dataclass(frozen=True)
+class ManifestEntry:
+    # Index row for one feature; geometry stays on disk until a point hits the bbox.
+    zone_name: str
+    file: str
+    feature_index: int
+    bbox: Tuple[float, float, float, float]
+    area: float
+
+
 def _ring_area(ring: Sequence[Tuple[float, float]]) -> float:
     if len(ring) < 3:
         return 0.0
@@ -103,12 +118,20 @@ class BiddingZoneResolver:
         *,
         use_spatial_index: bool = True,
         area_lookup: Optional[Callable[[str], object]] = None,
+        manifest_path: Optional[Path] = None,
     ) -> None:
         self.geojson_dir = geojson_dir
         self.use_spatial_index = use_spatial_index
+        self.manifest_path = manifest_path
         self._features: List[BiddingZoneFeature] = []
+        self._manifest: List[ManifestEntry] = []
+        self._file_cache: Dict[str, List[BiddingZoneFeature]] = {}
+        self._file_lock = threading.Lock()
         self._area_lookup = area_lookup or self._default_area_lookup()
-        self._load_geojsons()
+        if manifest_path is not None:
+            self._load_manifest(manifest_path)
+        else:
+            self._load_geojsons()
 
     @staticmethod
     def _default_area_lookup() -> Callable[[str], object]:
@@ -213,49 +236,134 @@ class BiddingZoneResolver:
             area += max(0.0, shell - holes)
         return area
 
-    def _load_geojsons(self) -> None:
-        if not self.geojson_dir.exists() or not self.geojson_dir.is_dir():
-            raise BiddingZoneResolverError(f"GeoJSON directory not found: {self.geojson_dir}")
+    @classmethod
+    def _features_from_doc(cls, path: Path, doc: object) -> List[BiddingZoneFeature]:
+        if not isinstance(doc, dict) or doc.get("type") != "FeatureCollection":
+            return []
+        features: List[BiddingZoneFeature] = []
+        raw_features = doc.get("features") or []
+        for idx, raw in enumerate(raw_features):
+            props = raw.get("properties") or {}
+            zone_name = str(props.get("zoneName") or "").strip()
+            if not zone_name:
+                raise BiddingZoneResolverError(
+                    f"{path.name} feature #{idx} missing properties.zoneName"
+                )
+
+            geom = raw.get("geometry")
+            if not isinstance(geom, dict):
+                continue
+            polygons = cls._parse_geometry(geom)
+            bbox = cls._bbox_for_polygons(polygons)
+            area = cls._area_for_polygons(polygons)
+            features.append(
+                BiddingZoneFeature(
+                    zone_name=zone_name,
+                    polygons=polygons,
+                    bbox=bbox,
+                    area=area,
+                )
+            )
+        return features
 
-        paths = sorted(self.geojson_dir.glob("*.geojson"))
+    @classmethod
+    def _read_geojson(cls, path: Path) -> List[BiddingZoneFeature]:
+        with path.open("r", encoding="utf-8") as f:
+            doc = json.load(f)
+        return cls._features_from_doc(path, doc)
+
+    @staticmethod
+    def _geojson_paths(geojson_dir: Path) -> List[Path]:
+        if not geojson_dir.exists() or not geojson_dir.is_dir():
+            raise BiddingZoneResolverError(f"GeoJSON directory not found: {geojson_dir}")
+
+        paths = sorted(geojson_dir.glob("*.geojson"))
         if not paths:
-            raise BiddingZoneResolverError(f"No GeoJSON files found in: {self.geojson_dir}")
+            raise BiddingZoneResolverError(f"No GeoJSON files found in: {geojson_dir}")
+        return paths
 
+    def _load_geojsons(self) -> None:
         features: List[BiddingZoneFeature] = []
-        for path in paths:
-            with path.open("r", encoding="utf-8") as f:
-                doc = json.load(f)
-            if not isinstance(doc, dict) or doc.get("type") != "FeatureCollection":
-                continue
-            raw_features = doc.get("features") or []
-            for idx, raw in enumerate(raw_features):
-                props = raw.get("properties") or {}
-                zone_name = str(props.get("zoneName") or "").strip()
-                if not zone_name:
-                    raise BiddingZoneResolverError(
-                        f"{path.name} feature #{idx} missing properties.zoneName"
-                    )
-
-                geom = raw.get("geometry")
-                if not isinstance(geom, dict):
-                    continue
-                polygons = self._parse_geometry(geom)
-                bbox = self._bbox_for_polygons(polygons)
-                area = self._area_for_polygons(polygons)
-                features.append(
-                    BiddingZoneFeature(
-                        zone_name=zone_name,
-                        polygons=polygons,
-                        bbox=bbox,
-                        area=area,
-                    )
-                )
+        for path in self._geojson_paths(self.geojson_dir):
+            features.extend(self._read_geojson(path))
 
         if not features:
             raise BiddingZoneResolverError("No valid bidding zone features loaded")
 
         self._features = features
 
+    def _load_manifest(self, manifest_path: Path) -> None:
+        try:
+            with manifest_path.open("r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, json.JSONDecodeError) as exc:
+            raise BiddingZoneResolverError(f"Cannot read zone manifest {manifest_path}: {exc}") from exc
+        if not isinstance(doc, dict) or doc.get("version") != MANIFEST_VERSION:
+            raise BiddingZoneResolverError(
+                f"Unsupported zone manifest version in {manifest_path}: "
+                f"{doc.get('version') if isinstance(doc, dict) else None}"
+            )
+
+        entries: List[ManifestEntry] = []
+        for idx, raw in enumerate(doc.get("zones") or []):
+            try:
+                bbox = tuple(float(v) for v in raw["bbox"])
+                if len(bbox) != 4:
+                    raise ValueError("bbox must have 4 values")
+                entries.append(
+                    ManifestEntry(
+                        zone_name=str(raw["zone_name"]).strip(),
+                        file=str(raw["file"]),
+                        feature_index=int(raw.get("feature_index", 0)),
+                        bbox=bbox,  # type: ignore[arg-type]
+                        area=float(raw["area"]),
+                    )
+                )
+            except (KeyError, TypeError, ValueError) as exc:
+                raise BiddingZoneResolverError(
+                    f"{manifest_path.name} zone #{idx} is invalid: {exc}"
+                ) from exc
+
+        if not entries:
+            raise BiddingZoneResolverError(f"Zone manifest lists no zones: {manifest_path}")
+
+        self._manifest = entries
+
+    def _features_for_file(self, name: str) -> List[BiddingZoneFeature]:
+        cached = self._file_cache.get(name)
+        if cached is not None:
+            return cached
+        with self._file_lock:
+            cached = self._file_cache.get(name)
+            if cached is None:
+                path = self.geojson_dir / name
+                if not path.is_file():
+                    raise BiddingZoneResolverError(f"Manifest references missing GeoJSON file: {path}")
+                cached = self._read_geojson(path)
+                self._file_cache[name] = cached
+        return cached
+
+    def _manifest_feature(self, entry: ManifestEntry) -> BiddingZoneFeature:
+        features = self._features_for_file(entry.file)
+        if entry.feature_index >= len(features):
+            raise BiddingZoneResolverError(
+                f"Manifest feature #{entry.feature_index} not found in {entry.file}"
+            )
+        feature = features[entry.feature_index]
+        if feature.zone_name != entry.zone_name:
+            raise BiddingZoneResolverError(
+                f"Manifest is stale: {entry.file} feature #{entry.feature_index} "
+                f"is {feature.zone_name}, expected {entry.zone_name}"
+            )
+        return feature
+
+    @property
+    def loaded_files(self) -> List[str]:
+        """GeoJSON files whose full geometry is currently held in memory."""
+        if not self._manifest:
+            return [p.name for p in self._geojson_paths(self.geojson_dir)]
+        return sorted(self._file_cache)
+
     @staticmethod
     def _validate_lat_lon(lat: float, lon: float) -> None:
         if not (-90.0 <= lat <= 90.0):
@@ -268,13 +376,23 @@ class BiddingZoneResolver:
         min_lon, min_lat, max_lon, max_lat = bbox
         return min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
 
+    def _candidate_features(self, lon: float, lat: float) -> Iterator[BiddingZoneFeature]:
+        if self._manifest:
+            for entry in self._manifest:
+                if self.use_spatial_index and not self._bbox_contains(entry.bbox, lon, lat):
+                    continue
+                yield self._manifest_feature(entry)
+            return
+        for feature in self._features:
+            if self.use_spatial_index and not self._bbox_contains(feature.bbox, lon, lat):
+                continue
+            yield feature
+
     def resolve_zone_name(self, lat: float, lon: float) -> str:
         self._validate_lat_lon(lat, lon)
 
         matches: List[BiddingZoneFeature] = []
-        for feature in self._features:
-            if self.use_spatial_index and not self._bbox_contains(feature.bbox, lon, lat):
-                continue
+        for feature in self._candidate_features(lon, lat):
             for polygon in feature.polygons:
                 if _point_in_polygon(lon, lat, polygon):
                     matches.append(feature)
@@ -299,3 +417,46 @@ class BiddingZoneResolver:
         if not bz_eic:
             raise BiddingZoneResolverError(f"No EIC mapping found for zoneName={zone_name}")
         return zone_name, bz_eic
+
+
+def build_manifest(geojson_dir: Path) -> dict:
+    """Build the bbox index used by ``BiddingZoneResolver(manifest_path=...)``."""
+    zones: List[dict] = []
+    for path in BiddingZoneResolver._geojson_paths(geojson_dir):
+        for idx, feature in enumerate(BiddingZoneResolver._read_geojson(path)):
+            zones.append(
+                {
+                    "zone_name": feature.zone_name,
+                    "file": path.name,
+                    "feature_index": idx,
+                    "bbox": list(feature.bbox),
+                    "area": feature.area,
+                }
+            )
+    if not zones:
+        raise BiddingZoneResolverError("No valid bidding zone features loaded")
+    return {"version": MANIFEST_VERSION, "zones": zones}
+
+
+def write_manifest(geojson_dir: Path, manifest_path: Optional[Path] = None) -> Path:
+    target = manifest_path or (geojson_dir / DEFAULT_MANIFEST_NAME)
+    doc = build_manifest(geojson_dir)
+    tmp = target.with_name(f".{target.name}.tmp")
+    # One zone per line keeps diffs readable when the geometry pack is updated.
+    rows = ",\n".join(f"  {json.dumps(z)}" for z in doc["zones"])
+    tmp.write_text(f'{{"version": {doc["version"]}, "zones": [\n{rows}\n]}}\n', encoding="utf-8")
+    os.replace(tmp, target)
+    return target
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write the bidding-zone bbox manifest for a GeoJSON pack.")
+    parser.add_argument("geojson_dir", type=Path, help="Directory with ENTSO-E zone *.geojson files")
+    parser.add_argument("--output", type=Path, default=None, help=f"Manifest path (default: <geojson_dir>/{DEFAULT_MANIFEST_NAME})")
+    args = parser.parse_args()
+    target = write_manifest(args.geojson_dir, args.output)
+    print(f"[bz] Wrote zone manifest to {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,22 @@ API_PREFIX = "/v1"
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 
+def _add_shared_dir_to_path() -> None:
+    # Modules shared between services live in ./shared: $GD_SHARED_DIR, else the nearest
+    # shared/ above this file (repo checkout), else /opt/shared (Docker mount).
+    here = Path(__file__).resolve()
+    candidates = [os.getenv("GD_SHARED_DIR"), *(str(p / "shared") for p in here.parents), "/opt/shared"]
+    for candidate in candidates:
+        if candidate and os.path.isfile(os.path.join(candidate, "cfp_formula.py")):
+            if candidate not in sys.path:
+                sys.path.insert(0, candidate)
+            return
+
+
+_add_shared_dir_to_path()
+from cfp_formula import CFP_FORMULA_VERSION, cfp_grams, compute_cfp, round_cfp  # noqa: E402
+
+
 def _static_file_data_url(filename: str) -> str:
     candidates = [
         os.getenv("STATIC_DIR"),
@@ -108,6 +124,8 @@ CI_CACHE_HISTORICAL_FINAL_AFTER_S = int(os.getenv("CI_CACHE_HISTORICAL_FINAL_AFT
 CI_CACHE_MAX_ENTRIES = int(os.getenv("CI_CACHE_MAX_ENTRIES", "0"))
 CI_CACHE_RETENTION_S = int(os.getenv("CI_CACHE_RETENTION_S", "0"))
 BZ_GEOJSON_DIR = os.getenv("BZ_GEOJSON_DIR")
+# Optional bbox index; when set, zone geometry is loaded lazily on first hit.
+BZ_MANIFEST_FILE = os.getenv("BZ_MANIFEST_FILE")
 CI_CACHE_FILE = os.getenv(
     "CI_CACHE_FILE",
     os.path.join(os.path.dirname(__file__), "ci_cache.json"),
@@ -543,6 +561,7 @@ class CIResponse(BaseModel):
     effective_ci_gco2_per_kwh: float = Field(..., description="Effective CI = ci_gco2_per_kwh * pue.")
     cfp_g: Optional[float] = Field(default=None, description="Computed carbon footprint in grams (if energy_wh provided).")
     cfp_kg: Optional[float] = Field(default=None, description="Computed carbon footprint in kilograms (if energy_wh provided).")
+    formula_version: str = Field(default=CFP_FORMULA_VERSION, description="Version of the shared CFP formula used.")
     valid: bool = Field(..., description="Provider validity flag.")
 
 class CFPQuery(BaseModel):
@@ -558,6 +577,7 @@ class CFPResponse(BaseModel):
     energy_wh: Optional[float] = None
     cfp_g: Optional[float] = None
     cfp_kg: Optional[float] = None
+    formula_version: str = CFP_FORMULA_VERSION
 
 class MetricsEnvelope(BaseModel):
     model_config = ConfigDict(extra="allow")
@@ -957,8 +977,10 @@ def _get_bz_resolver() -> BiddingZoneResolver:
     with _BZ_LOCK:
         if _BZ_RESOLVER is None:
             geo_dir = BZ_GEOJSON_DIR or _default_bz_geojson_dir()
-            _BZ_RESOLVER = BiddingZoneResolver(Path(geo_dir))
-            print(f"[bz] Loaded bidding zone resolver from {geo_dir}", flush=True)
+            manifest = Path(BZ_MANIFEST_FILE) if BZ_MANIFEST_FILE else None
+            _BZ_RESOLVER = BiddingZoneResolver(Path(geo_dir), manifest_path=manifest)
+            mode = f"manifest {manifest}" if manifest else "eager"
+            print(f"[bz] Loaded bidding zone resolver from {geo_dir} ({mode})", flush=True)
     return _BZ_RESOLVER
 
 
@@ -1153,20 +1175,15 @@ def get_cfp(request: Request, q: CFPQuery = Depends()):
     """
     raw_auth_header = request.headers.get("authorization")
     _verify_request_token(raw_auth_header)
-    eff_ci = q.ci_g * q.pue
-    cfp_g = None
-    cfp_kg = None
-    if q.energy_wh is not None:
-        energy_kwh = q.energy_wh / 1000.0
-        cfp_g = energy_kwh * eff_ci
-        cfp_kg = cfp_g / 1000.0
+    result = compute_cfp(q.ci_g, q.pue, q.energy_wh)
     return CFPResponse(
-        ci_gco2_per_kwh=q.ci_g,
-        pue=q.pue,
-        effective_ci_gco2_per_kwh=eff_ci,
-        energy_wh=q.energy_wh,
-        cfp_g=cfp_g,
-        cfp_kg=cfp_kg,
+        ci_gco2_per_kwh=result.ci_gco2_per_kwh,
+        pue=result.pue,
+        effective_ci_gco2_per_kwh=result.effective_ci_gco2_per_kwh,
+        energy_wh=result.energy_wh,
+        cfp_g=result.cfp_g,
+        cfp_kg=result.cfp_kg,
+        formula_version=result.formula_version,
     )
 
 def _resolve_ci_window(req: CIRequest) -> tuple[datetime, datetime]:
@@ -1290,15 +1307,8 @@ def _compute_ci_response(req: CIRequest, wattnet_params: Optional[Dict[str, Any]
         zone_name = zone_name or payload.get("zone")
 
     ci, ci_dt = _extract_ci_from_payload(payload)
-    eff_ci = ci * pue_value # Effective Carbon Intensity = CI * PUE
-    
-    # Calculate CFP if energy is provided
-    cfp_g = None
-    cfp_kg = None
-    if req.energy_wh is not None:
-        energy_kwh = req.energy_wh / 1000.0
-        cfp_g = energy_kwh * eff_ci # Formula: E(kWh) * PUE * CI
-        cfp_kg = cfp_g / 1000.0
+    # Effective CI and CFP (when energy is provided) come from the shared formula module.
+    cfp = compute_cfp(ci, pue_value, req.energy_wh)
 
     return CIResponse(
         source=source,
@@ -1308,9 +1318,10 @@ def _compute_ci_response(req: CIRequest, wattnet_params: Optional[Dict[str, Any]
         datetime=ci_dt or payload.get("end") or payload.get("start"),
         ci_gco2_per_kwh=ci,
         pue=pue_value,
-        effective_ci_gco2_per_kwh=eff_ci,
-        cfp_g=cfp_g,
-        cfp_kg=cfp_kg,
+        effective_ci_gco2_per_kwh=cfp.effective_ci_gco2_per_kwh,
+        cfp_g=cfp.cfp_g,
+        cfp_kg=cfp.cfp_kg,
+        formula_version=cfp.formula_version,
         valid=bool(payload.get("valid", False))
     )
 
@@ -1491,15 +1502,14 @@ def transform_and_forward(request: Request, payload: MetricsEnvelope = Body(...)
     # 5. Calculate CFP (D4.1 Formula)
     # CFP_g = Energy(kWh) * PUE * CI(g/kWh)
     if cfp_g is None and energy_wh is not None and ci_g is not None:
-        energy_kwh = energy_wh / 1000.0
-        cfp_g = energy_kwh * resolved_pue * ci_g
+        cfp_g = cfp_grams(energy_wh, resolved_pue, ci_g)
 
     # 6. Inject Values into Payload (fact_site_event)
     fse["PUE"] = resolved_pue
     if ci_g is not None:
         fse["CI_g"] = ci_g
     if cfp_g is not None:
-        fse["CFP_g"] = round(cfp_g, 4)
+        fse["CFP_g"] = round_cfp(cfp_g)
     
     # Ensure Energy is consistent if we extracted it from elsewhere
     if energy_wh is not None and "energy_wh" not in fse:
@@ -7,7 +7,12 @@ import unittest
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
-from bidding_zone_resolver import BiddingZoneNotFoundError, BiddingZoneResolver
+from bidding_zone_resolver import (
+    BiddingZoneNotFoundError,
+    BiddingZoneResolver,
+    BiddingZoneResolverError,
+    write_manifest,
+)
 
 
 def _write_zone(path: Path, zone_name: str, coords: list[list[float]]) -> None:
@@ -91,6 +96,53 @@ class BiddingZoneResolverTests(unittest.TestCase):
             self.assertEqual(zone, "SMALL")
             self.assertEqual(eic, "EIC-SMALL")
 
+    def test_manifest_mode_loads_only_queried_zones(self) -> None:
+        with tempfile.TemporaryDirectory() as td:
+            base = Path(td)
+            _write_zone(
+                base / "DK_1.geojson",
+                "DK_1",
+                [[8.0, 55.0], [10.0, 55.0], [10.0, 57.0], [8.0, 57.0], [8.0, 55.0]],
+            )
+            _write_zone(
+                base / "FR.geojson",
+                "FR",
+                [[2.0, 45.0], [3.0, 45.0], [3.0, 46.0], [2.0, 46.0], [2.0, 45.0]],
+            )
+            manifest = write_manifest(base)
+
+            resolver = BiddingZoneResolver(
+                base,
+                area_lookup=lambda z: type("Area", (), {"value": f"EIC-{z}"})(),
+                manifest_path=manifest,
+            )
+            self.assertEqual(resolver.loaded_files, [])
+
+            zone, eic = resolver.resolve(56.0, 9.0)
+            self.assertEqual(zone, "DK_1")
+            self.assertEqual(eic, "EIC-DK_1")
+            self.assertEqual(resolver.loaded_files, ["DK_1.geojson"])
+
+            with self.assertRaises(BiddingZoneNotFoundError):
+                resolver.resolve(50.0, 10.0)
+            self.assertEqual(resolver.loaded_files, ["DK_1.geojson"])
+
+    def test_manifest_mode_detects_stale_manifest(self) -> None:
+        with tempfile.TemporaryDirectory() as td:
+            base = Path(td)
+            square = [[2.0, 45.0], [3.0, 45.0], [3.0, 46.0], [2.0, 46.0], [2.0, 45.0]]
+            _write_zone(base / "FR.geojson", "FR", square)
+            manifest = write_manifest(base)
+            _write_zone(base / "FR.geojson", "BE", square)
+
+            resolver = BiddingZoneResolver(
+                base,
+                area_lookup=lambda z: type("Area", (), {"value": z})(),
+                manifest_path=manifest,
+            )
+            with self.assertRaises(BiddingZoneResolverError):
+                resolver.resolve(45.5, 2.5)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "shared"))
+from cfp_formula import CFP_FORMULA_VERSION, cfp_grams, compute_cfp, round_cfp
+
+
+class CFPFormulaTests(unittest.TestCase):
+    def test_cfp_grams_matches_d41_formula(self) -> None:
+        # 2500 Wh at PUE 1.4 and 300 gCO2/kWh -> 2.5 * 1.4 * 300 = 1050 g
+        self.assertAlmostEqual(cfp_grams(2500.0, 1.4, 300.0), 1050.0)
+        self.assertEqual(round_cfp(1.234567), 1.2346)
+
+    def test_compute_cfp_without_energy(self) -> None:
+        result = compute_cfp(200.0, 1.5)
+        self.assertAlmostEqual(result.effective_ci_gco2_per_kwh, 300.0)
+        self.assertIsNone(result.cfp_g)
+        self.assertIsNone(result.cfp_kg)
+        self.assertEqual(result.formula_version, CFP_FORMULA_VERSION)
+
+    def test_compute_cfp_with_energy(self) -> None:
+        result = compute_cfp(200.0, 1.5, energy_wh=4000.0)
+        self.assertAlmostEqual(result.cfp_g, 1200.0)
+        self.assertAlmostEqual(result.cfp_kg, 1.2)
+        self.assertAlmostEqual(result.cfp_g, cfp_grams(4000.0, 1.5, 200.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
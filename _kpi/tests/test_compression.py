@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import sys
+import unittest
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "shared"))
+import compression
+from compression import (
+    BodyDecodeError,
+    BodyTooLarge,
+    DecompressingReader,
+    StreamDecoder,
+    UnsupportedEncoding,
+    gzip_body,
+    normalise_encoding,
+)
+
+BODY = json.dumps([{"SiteName": "CNR-ISTI", "n": i, "pad": "x" * (i % 50)} for i in range(5000)]).encode("utf-8")
+
+
+def _reader(data: bytes, encoding: str, **kwargs) -> DecompressingReader:
+    return DecompressingReader(io.BytesIO(data).read, encoding, **kwargs)
+
+
+class DecompressingReaderTests(unittest.TestCase):
+    def test_gzip_and_deflate_round_trip(self) -> None:
+        for encoding, data in (
+            ("gzip", gzip_body(BODY)),
+            ("deflate", zlib.compress(BODY)),
+            ("gzip", gzip.compress(BODY[:1000]) + gzip.compress(BODY[1000:])),  # concatenated members
+        ):
+            with self.subTest(encoding=encoding, size=len(data)):
+                self.assertEqual(_reader(data, encoding).read(), BODY)
+
+    def test_incremental_reads_and_pushback(self) -> None:
+        reader = _reader(gzip_body(BODY), "gzip")
+        head = reader.read(100)
+        self.assertEqual(head, BODY[:100])
+        self.assertFalse(reader.at_end())
+        reader.pushback(head)
+        parts = []
+        while True:
+            part = reader.read(4096)
+            if not part:
+                break
+            parts.append(part)
+        self.assertEqual(b"".join(parts), BODY)
+        self.assertTrue(reader.at_end())
+
+    def test_decoded_size_cap(self) -> None:
+        with self.assertRaises(BodyTooLarge) as ctx:
+            _reader(gzip_body(b"0" * 1_000_000), "gzip", max_bytes=100_000).read()
+        self.assertEqual(ctx.exception.status, 413)
+        self.assertEqual(len(_reader(gzip_body(BODY), "gzip", max_bytes=len(BODY)).read()), len(BODY))
+
+    def test_corrupt_and_truncated_bodies(self) -> None:
+        data = gzip_body(BODY)
+        for label, payload in (
+            ("not compressed", BODY[:2000]),
+            ("truncated", data[: len(data) // 2]),
+            ("flipped bytes", data[:40] + bytes(b ^ 0xFF for b in data[40:80]) + data[80:]),
+        ):
+            with self.subTest(label), self.assertRaises(BodyDecodeError) as ctx:
+                _reader(payload, "gzip").read()
+            self.assertEqual(ctx.exception.status, 400)
+
+    def test_unsupported_encodings(self) -> None:
+        with self.assertRaises(UnsupportedEncoding) as ctx:
+            _reader(BODY, "br")
+        self.assertEqual(ctx.exception.status, 415)
+        if compression.zstandard is None:
+            self.assertNotIn("zstd", compression.supported_encodings())
+            with self.assertRaises(UnsupportedEncoding):
+                _reader(BODY, "zstd")
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd_round_trip(self) -> None:
+        data = compression.zstandard.ZstdCompressor().compress(BODY)
+        self.assertEqual(_reader(data, "zstd").read(), BODY)
+        with self.assertRaises(BodyTooLarge):
+            _reader(data, "zstd", max_bytes=1000).read()
+        with self.assertRaises(BodyDecodeError):
+            _reader(data[: len(data) // 2], "zstd").read()
+
+
+class StreamDecoderTests(unittest.TestCase):
+    def _decode(self, data: bytes, encoding: str, chunk: int = 1000, **kwargs) -> bytes:
+        decoder = StreamDecoder(encoding, **kwargs)
+        out = b"".join(decoder.feed(data[i:i + chunk]) for i in range(0, len(data), chunk))
+        return out + decoder.finish()
+
+    def test_chunked_feed_round_trip(self) -> None:
+        members = gzip.compress(BODY[:1000]) + gzip.compress(BODY[1000:])
+        for chunk in (1, 7, 4096):
+            with self.subTest(chunk=chunk):
+                self.assertEqual(self._decode(members, "x-gzip", chunk=chunk), BODY)
+        self.assertEqual(self._decode(zlib.compress(BODY), "deflate"), BODY)
+
+    def test_truncated_body_fails_on_finish(self) -> None:
+        data = gzip_body(BODY)
+        decoder = StreamDecoder("gzip")
+        decoder.feed(data[: len(data) // 2])
+        with self.assertRaises(BodyDecodeError) as ctx:
+            decoder.finish()
+        self.assertEqual(ctx.exception.status, 400)
+
+    def test_size_cap_and_unsupported_encoding(self) -> None:
+        with self.assertRaises(BodyTooLarge):
+            self._decode(gzip_body(b"0" * 1_000_000), "gzip", max_bytes=100_000)
+        with self.assertRaises(UnsupportedEncoding):
+            StreamDecoder("br")
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_truncated_zstd_fails_on_finish(self) -> None:
+        data = compression.zstandard.ZstdCompressor().compress(BODY)
+        self.assertEqual(self._decode(data, "zstd"), BODY)
+        with self.assertRaises(BodyDecodeError):
+            self._decode(data[: len(data) // 2], "zstd")
+
+
+class HelperTests(unittest.TestCase):
+    def test_normalise_encoding(self) -> None:
+        self.assertEqual(normalise_encoding(None), "identity")
+        self.assertEqual(normalise_encoding(" Identity "), "identity")
+        self.assertEqual(normalise_encoding("X-GZIP"), "gzip")
+        self.assertEqual(normalise_encoding("zstd"), "zstd")
+
+    def test_gzip_body_is_deterministic(self) -> None:
+        self.assertEqual(gzip_body(BODY), gzip_body(BODY))
+        self.assertEqual(gzip.decompress(gzip_body(BODY)), BODY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "shared"))
+import timestamp_parser
+from timestamp_parser import parse_timestamp, parse_timestamp_utc
+
+
+class TimestampParserTests(unittest.TestCase):
+    def test_known_layouts_parse_to_naive_utc(self) -> None:
+        expected = datetime(2026, 1, 15, 9, 20, 10)
+        for raw in (
+            "2026-01-15 09:20:10",
+            "2026-01-15T09:20:10",
+            "2026-01-15T09:20:10Z",
+            "2026-01-15T10:20:10+01:00",
+            "1768468810",
+            1768468810,
+        ):
+            with self.subTest(raw=raw):
+                self.assertEqual(parse_timestamp(raw, "field"), expected)
+        self.assertEqual(
+            parse_timestamp("2026-01-14T20:07:04.773563Z"),
+            datetime(2026, 1, 14, 20, 7, 4, 773563),
+        )
+        self.assertEqual(
+            parse_timestamp_utc("2026-01-15 09:20:10"),
+            expected.replace(tzinfo=timezone.utc),
+        )
+
+    def test_cached_layout_does_not_mask_other_layouts(self) -> None:
+        parse_timestamp("2026-01-15 09:20:10", "mixed")
+        self.assertEqual(timestamp_parser._LAST_LAYOUT["mixed"], 0)
+        self.assertEqual(parse_timestamp("2026-01-15T09:20:10Z", "mixed"), datetime(2026, 1, 15, 9, 20, 10))
+        self.assertEqual(timestamp_parser._LAST_LAYOUT["mixed"], 1)
+        # Right shape, impossible date: falls through to the slow path and yields None.
+        self.assertIsNone(parse_timestamp("2026-13-15T09:20:10Z", "mixed"))
+
+    def test_unix_seconds_can_be_refused(self) -> None:
+        self.assertEqual(parse_timestamp("1768468810", "unix-field"), datetime(2026, 1, 15, 9, 20, 10))
+        # Even with the unix layout cached for this key.
+        self.assertIsNone(parse_timestamp("1768468810", "unix-field", unix_seconds=False))
+        self.assertIsNone(parse_timestamp_utc(1768468810, unix_seconds=False))
+        self.assertEqual(
+            parse_timestamp_utc("2026-01-15 09:20:10", "unix-field", unix_seconds=False),
+            datetime(2026, 1, 15, 9, 20, 10, tzinfo=timezone.utc),
+        )
+
+    def test_empty_unparseable_and_datetime_inputs(self) -> None:
+        self.assertIsNone(parse_timestamp(None))
+        self.assertIsNone(parse_timestamp("   "))
+        self.assertIsNone(parse_timestamp("not a time"))
+        aware = datetime(2026, 1, 15, 10, 0, tzinfo=timezone(timedelta(hours=1)))
+        self.assertEqual(parse_timestamp(aware), datetime(2026, 1, 15, 9, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,11 @@
+import json
 import os
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
 import psycopg2
-from psycopg2.pool import SimpleConnectionPool
+import psycopg2.extensions
+import psycopg2.extras
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,7 +16,17 @@ DB_NAME = os.environ.get("CNR_POSTEGRESQL_DB", "greendigit-db")
 DB_HOST = os.environ.get("CNR_POSTEGRESQL_HOST", "greendigit-postgresql.cloud.d4science.org")
 DB_PORT = int(os.environ.get("CNR_POSTEGRESQL_PORT", "5432"))
 
-pool: Optional[SimpleConnectionPool] = None
+# Connection pool sizing; FastAPI runs the sync endpoints on a threadpool (40 threads by default).
+POOL_MIN = int(os.environ.get("CNR_DB_POOL_MIN", "1"))
+POOL_MAX = int(os.environ.get("CNR_DB_POOL_MAX", "10"))
+# Seconds a request waits for a free connection before the adapter answers 503.
+POOL_TIMEOUT_S = float(os.environ.get("CNR_DB_POOL_TIMEOUT_S", "10"))
+# Connections older than this are closed on return and reopened on demand.
+POOL_MAX_LIFETIME_S = float(os.environ.get("CNR_DB_POOL_MAX_LIFETIME_S", "1800"))
+# Connections idle longer than this are checked with SELECT 1 before being handed out.
+POOL_CHECK_IDLE_S = float(os.environ.get("CNR_DB_POOL_CHECK_IDLE_S", "30"))
+
+pool: Optional["ConnectionPool"] = None
 _FACT_INSERT_KEYS: Optional[list[str]] = None
 _FACT_INSERT_SQL: Optional[str] = None
 
@@ -74,6 +88,12 @@ def ensure_aux_tables(cur) -> None:
           ON monitoring.service_health_probe (probe_ts);
         CREATE INDEX IF NOT EXISTS service_health_probe_service_idx
           ON monitoring.service_health_probe (service_name);
+
+        CREATE TABLE IF NOT EXISTS monitoring.ingest_idempotency (
+          idempotency_key TEXT PRIMARY KEY,
+          response JSONB,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
         """
     )
     cur.execute(
@@ -83,11 +103,268 @@ def ensure_aux_tables(cur) -> None:
         """
     )
 
-def init_pool(minconn: int = 1, maxconn: int = 5):
+def vo_key_sql(owner_col: str = "owner") -> str:
+    """
+    Normalised, lower-cased VO of a fact row (blank owners count as 'Unknown'),
+    the same expression the 15m rollups and the cnr_utilities VO scripts use.
+    Filters must spell it exactly like this to match fact_site_event_vo_key_idx.
+    """
+    return f"LOWER(COALESCE(NULLIF(TRIM({owner_col}), ''), 'Unknown'))"
+
+# Indexes serving the read endpoints (name -> target). They are built with
+# CREATE INDEX CONCURRENTLY, outside ensure_aux_tables, so ingestion is not blocked.
+READ_INDEXES = {
+    # Keyset pagination of /cnr-db/records (newest first).
+    "fact_site_event_start_event_idx": "monitoring.fact_site_event (event_start_timestamp DESC, event_id DESC)",
+    # VO-scoped listings, counts and deletes, in listing order.
+    "fact_site_event_vo_key_idx": (
+        f"monitoring.fact_site_event (({vo_key_sql()}), event_start_timestamp DESC, event_id DESC)"
+    ),
+}
+# Detail rows are read by event_id (record pages, export, delete). These are only
+# created when no existing index on the table already starts with event_id.
+DETAIL_EVENT_INDEXES = {
+    "detail_cloud_event_id_idx": "detail_cloud",
+    "detail_network_event_id_idx": "detail_network",
+    "detail_grid_event_id_idx": "detail_grid",
+}
+
+def _has_leading_index(cur, table: str, column: str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM pg_index i "
+        "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0] "
+        "WHERE i.indrelid = to_regclass(%s) AND a.attname = %s AND i.indisvalid "
+        "LIMIT 1",
+        (table, column),
+    )
+    return cur.fetchone() is not None
+
+def _index_valid(cur, name: str) -> Optional[bool]:
+    """indisvalid of monitoring.<name>, or None when there is no such index."""
+    cur.execute(
+        "SELECT i.indisvalid FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "JOIN pg_index i ON i.indexrelid = c.oid "
+        "WHERE n.nspname = 'monitoring' AND c.relname = %s",
+        (name,),
+    )
+    row = cur.fetchone()
+    return None if row is None else bool(row[0])
+
+def _build_index(cur, name: str, target: str) -> None:
+    if _index_valid(cur, name) is False:
+        # IF NOT EXISTS would keep the invalid index, which the planner never uses.
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS monitoring.{name}")
+    cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}")
+
+def ensure_read_indexes(conn) -> list[str]:
+    """
+    Create missing READ_INDEXES and DETAIL_EVENT_INDEXES; `conn` must be in
+    autocommit mode. An index left INVALID by an interrupted CONCURRENTLY build
+    is dropped and built again. Returns the names created or rebuilt.
+    """
+    created = []
+    with conn.cursor() as cur:
+        for name, target in READ_INDEXES.items():
+            if _index_valid(cur, name):
+                continue
+            _build_index(cur, name, target)
+            created.append(name)
+        for name, table in DETAIL_EVENT_INDEXES.items():
+            if _has_leading_index(cur, f"monitoring.{table}", "event_id"):
+                continue
+            _build_index(cur, name, f"monitoring.{table} (event_id)")
+            created.append(name)
+        if created:
+            # Expression indexes get planner statistics only from ANALYZE.
+            cur.execute("ANALYZE monitoring.fact_site_event")
+    return created
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded psycopg2 connection pool.
+
+    `getconn` hands out an idle connection (most recently used first), opens a
+    new one while fewer than `maxconn` exist, or waits up to `timeout_s` and
+    raises PoolTimeout. Connections idle for more than `check_idle_s` are
+    pinged before use, and connections that are broken, left inside a
+    transaction or older than `max_lifetime_s` are closed instead of reused.
+    `connect(dsn)` opens a connection (psycopg2.connect by default).
+    """
+
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        dsn: str,
+        timeout_s: float = POOL_TIMEOUT_S,
+        max_lifetime_s: float = POOL_MAX_LIFETIME_S,
+        check_idle_s: float = POOL_CHECK_IDLE_S,
+        connect: Optional[Callable[[str], Any]] = None,
+    ):
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"invalid pool size min={minconn} max={maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.timeout_s = timeout_s
+        self.max_lifetime_s = max_lifetime_s
+        self.check_idle_s = check_idle_s
+        self._factory = connect or psycopg2.connect
+        self._cond = threading.Condition()
+        self._idle: list = []  # (conn, returned_at), most recent last
+        self._opened_at: dict = {}
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._counters = {"checkouts": 0, "timeouts": 0, "opened": 0, "recycled": 0, "discarded": 0}
+        self._wait_s_total = 0.0
+        self._wait_s_max = 0.0
+        for _ in range(minconn):
+            conn = self._connect()
+            self._open += 1
+            self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        conn = self._factory(self.dsn)
+        with self._cond:
+            self._opened_at[conn] = time.monotonic()
+            self._counters["opened"] += 1
+        return conn
+
+    def _close(self, conn, counter: str) -> None:
+        with self._cond:
+            self._opened_at.pop(conn, None)
+            self._counters[counter] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _usable(self, conn, returned_at: float) -> bool:
+        if conn.closed:
+            self._close(conn, "discarded")
+            return False
+        now = time.monotonic()
+        if now - self._opened_at.get(conn, now) > self.max_lifetime_s:
+            self._close(conn, "recycled")
+            return False
+        if now - returned_at > self.check_idle_s:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                self._close(conn, "discarded")
+                return False
+        return True
+
+    def getconn(self, timeout_s: Optional[float] = None):
+        started = time.monotonic()
+        deadline = started + (self.timeout_s if timeout_s is None else timeout_s)
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no database connection free within {deadline - started:.1f}s "
+                            f"({self._in_use} in use, max {self.maxconn})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                # Reserve the slot under the lock; connect or ping outside it.
+                idle = self._idle.pop() if self._idle else None
+                if idle is None:
+                    self._open += 1
+                self._in_use += 1
+
+            try:
+                if idle is None:
+                    conn = self._connect()
+                elif self._usable(*idle):
+                    conn = idle[0]
+                else:
+                    conn = None
+            except Exception:
+                self._release_slot()
+                raise
+            if conn is None:
+                self._release_slot()
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._counters["checkouts"] += 1
+                self._wait_s_total += waited
+                self._wait_s_max = max(self._wait_s_max, waited)
+            return conn
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._open -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def putconn(self, conn, close: bool = False) -> None:
+        if not close and not conn.closed:
+            status = conn.get_transaction_status()
+            if status in (psycopg2.extensions.TRANSACTION_STATUS_INTRANS, psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                close = True
+        now = time.monotonic()
+        expired = now - self._opened_at.get(conn, now) > self.max_lifetime_s
+        if close or conn.closed or expired:
+            self._close(conn, "recycled" if expired and not close else "discarded")
+            self._release_slot()
+            return
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, now))
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close(conn, "discarded")
+
+    def stats(self) -> dict:
+        with self._cond:
+            checkouts = self._counters["checkouts"]
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                **self._counters,
+                "wait_ms_total": round(self._wait_s_total * 1000, 1),
+                "wait_ms_avg": round(self._wait_s_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                "wait_ms_max": round(self._wait_s_max * 1000, 1),
+            }
+
+
+def init_pool(minconn: int = POOL_MIN, maxconn: int = POOL_MAX):
     global pool
     if pool is None:
         dsn = f"dbname={DB_NAME} user={DB_USER} host={DB_HOST} password={DB_PASSWORD} port={DB_PORT}"
-        pool = SimpleConnectionPool(minconn, maxconn, dsn=dsn)
+        pool = ConnectionPool(minconn, maxconn, dsn=dsn)
 
 def get_conn():
     assert pool is not None, "DB pool not initialised"
@@ -97,6 +374,9 @@ def put_conn(conn):
     assert pool is not None, "DB pool not initialised"
     pool.putconn(conn)
 
+def pool_stats() -> Optional[dict]:
+    return pool.stats() if pool is not None else None
+
 def ensure_site_type_mapping(cur, site_type: str) -> str:
     mapping = { "cloud": "detail_cloud", "network": "detail_network", "grid": "detail_grid" }
     detail_table = mapping[site_type]
@@ -123,7 +403,108 @@ def get_or_create_site(cur, site_type: str, description: str) -> int:
     )
     return cur.fetchone()[0]
 
-def insert_fact_event(cur, site_id: int, fact: dict) -> int:
+class SiteCache:
+    """
+    Process-wide cache of (site_type, description) -> site_id and of the
+    site_type -> detail table mappings, shared by all request threads.
+
+    Requests go through a `session()`: lookups check the session, then the
+    process cache, then the database; rows created inside the transaction are
+    published only when the session exits cleanly (after `with conn:` has
+    committed). An exception, i.e. a rolled-back transaction, drops the whole
+    cache so ids that may not exist are never served.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sites: dict[tuple[str, str], int] = {}
+        self._mappings: dict[str, str] = {}
+
+    def warm(self, cur) -> int:
+        """Load every mapping and named site with one SELECT; returns the number of sites cached."""
+        cur.execute(
+            "SELECT std.site_type::text, std.detail_table_name, s.site_id, s.description "
+            "FROM monitoring.site_type_detail std "
+            "LEFT JOIN monitoring.sites s "
+            "  ON s.site_type = std.site_type AND s.description IS NOT NULL"
+        )
+        sites: dict[tuple[str, str], int] = {}
+        mappings: dict[str, str] = {}
+        for site_type, detail_table, site_id, description in cur.fetchall():
+            mappings[site_type] = detail_table
+            if site_id is not None:
+                sites[(site_type, description)] = site_id
+        with self._lock:
+            self._sites = sites
+            self._mappings = mappings
+        return len(sites)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._sites = {}
+            self._mappings = {}
+
+    def session(self) -> "SiteCacheSession":
+        return SiteCacheSession(self)
+
+    def _get(self, site_key: tuple[str, str]) -> Optional[int]:
+        with self._lock:
+            return self._sites.get(site_key)
+
+    def _get_mapping(self, site_type: str) -> Optional[str]:
+        with self._lock:
+            return self._mappings.get(site_type)
+
+    def _publish(self, sites: dict, mappings: dict) -> None:
+        with self._lock:
+            self._sites.update(sites)
+            self._mappings.update(mappings)
+
+
+class SiteCacheSession:
+    """Per-transaction view of a SiteCache; use as a context manager around `with conn:`."""
+
+    def __init__(self, cache: SiteCache):
+        self.cache = cache
+        self.sites: dict[tuple[str, str], int] = {}
+        self.mappings: dict[str, str] = {}
+
+    def detail_table(self, cur, site_type: str) -> str:
+        detail_table = self.mappings.get(site_type) or self.cache._get_mapping(site_type)
+        if detail_table is None:
+            detail_table = ensure_site_type_mapping(cur, site_type)
+            self.mappings[site_type] = detail_table
+        return detail_table
+
+    def site_id(self, cur, site_type: str, description: Optional[str]) -> int:
+        site_key = (site_type, description)
+        site_id = self.sites.get(site_key)
+        if site_id is None and description is not None:
+            site_id = self.cache._get(site_key)
+        if site_id is None:
+            site_id = get_or_create_site(cur, site_type, description)
+            self.sites[site_key] = site_id
+        return site_id
+
+    def __enter__(self) -> "SiteCacheSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            # Sites without a description are never matched by get_or_create_site,
+            # so they are only reused within one request.
+            self.cache._publish(
+                {k: v for k, v in self.sites.items() if k[1] is not None},
+                self.mappings,
+            )
+        else:
+            self.cache.invalidate()
+        return False
+
+
+site_cache = SiteCache()
+
+def _fact_insert_keys(cur) -> list[str]:
     global _FACT_INSERT_KEYS, _FACT_INSERT_SQL
 
     if _FACT_INSERT_KEYS is None or _FACT_INSERT_SQL is None:
@@ -157,11 +538,32 @@ def insert_fact_event(cur, site_id: int, fact: dict) -> int:
         cols = ",".join(["site_id"] + base_keys)
         placeholders = ",".join(["%s"] * (1 + len(base_keys)))
         _FACT_INSERT_SQL = f"INSERT INTO monitoring.fact_site_event ({cols}) VALUES ({placeholders}) RETURNING event_id"
+    return _FACT_INSERT_KEYS
 
-    values = [fact.get(k) for k in _FACT_INSERT_KEYS]
+def insert_fact_event(cur, site_id: int, fact: dict) -> int:
+    keys = _fact_insert_keys(cur)
+    values = [fact.get(k) for k in keys]
     cur.execute(_FACT_INSERT_SQL, (site_id, *values))
     return cur.fetchone()[0]
 
+def insert_fact_events_bulk(cur, rows: list[tuple[int, dict]], page_size: int = 5000) -> list[int]:
+    """
+    Insert (site_id, fact) pairs with multi-row INSERTs and return their event_ids
+    in input order.
+    """
+    if not rows:
+        return []
+    keys = _fact_insert_keys(cur)
+    cols = ",".join(["site_id"] + keys)
+    returned = psycopg2.extras.execute_values(
+        cur,
+        f"INSERT INTO monitoring.fact_site_event ({cols}) VALUES %s RETURNING event_id",
+        [(site_id, *[fact.get(k) for k in keys]) for site_id, fact in rows],
+        page_size=page_size,
+        fetch=True,
+    )
+    return [r[0] for r in returned]
+
 def insert_detail(cur, site_type: str, site_id: int, event_id: int, execunitid: str, detail: dict):
     if site_type == "cloud":
         cur.execute(
@@ -200,6 +602,39 @@ def insert_detail(cur, site_type: str, site_id: int, event_id: int, execunitid:
     else:
         raise ValueError(f"Unsupported site_type {site_type}")
 
+# Column order of each detail table, as bound by insert_details_bulk.
+DETAIL_INSERT_COLUMNS = {
+    "cloud": ("event_id", "site_id", "execunitid", "wallclocktime_s", "suspendduration_s", "cpuduration_s",
+              "cpunormalizationfactor", "efficiency", "cloud_type", "compute_service"),
+    "network": ("site_id", "event_id", "execunitid", "amountofdatatransferred", "networktype",
+                "measurementtype", "destinationexecunitid"),
+    "grid": ("site_id", "event_id", "execunitid", "wallclocktime_s", "cpunormalizationfactor", "ncores",
+             "normcputime_s", "efficiency", "tdp_w", "totalcputime_s", "scaledcputime_s"),
+}
+
+def insert_details_bulk(cur, site_type: str, rows: list[tuple[int, int, str, dict]], page_size: int = 5000):
+    """Bulk variant of insert_detail for (site_id, event_id, execunitid, detail) rows of one site_type."""
+    if site_type not in DETAIL_INSERT_COLUMNS:
+        raise ValueError(f"Unsupported site_type {site_type}")
+    if not rows:
+        return
+    cols = DETAIL_INSERT_COLUMNS[site_type]
+    values = []
+    for site_id, event_id, execunitid, detail in rows:
+        keys = {
+            # detail_cloud.site_id references fact_site_event(event_id); see insert_detail.
+            "site_id": event_id if site_type == "cloud" else site_id,
+            "event_id": event_id,
+            "execunitid": execunitid,
+        }
+        values.append(tuple(keys[c] if c in keys else detail.get(c) for c in cols))
+    psycopg2.extras.execute_values(
+        cur,
+        f"INSERT INTO monitoring.detail_{site_type} ({','.join(cols)}) VALUES %s",
+        values,
+        page_size=page_size,
+    )
+
 def insert_enrichment_audit(cur, event_id: int, audit: Optional[dict]):
     if not audit:
         return
@@ -234,6 +669,48 @@ def insert_enrichment_audit(cur, event_id: int, audit: Optional[dict]):
         ),
     )
 
+def insert_enrichment_audits_bulk(cur, rows: list[tuple[int, Optional[dict]]], page_size: int = 5000):
+    """Bulk variant of insert_enrichment_audit for (event_id, audit) pairs; empty audits are skipped."""
+    values = [
+        (
+            event_id,
+            audit.get("pue_source"),
+            audit.get("ci_source"),
+            audit.get("cfp_source"),
+            audit.get("cfp_null_reason"),
+            audit.get("used_default_pue"),
+            audit.get("used_cached_ci"),
+        )
+        for event_id, audit in rows
+        if audit
+    ]
+    if not values:
+        return
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO monitoring.event_enrichment_audit (
+          event_id,
+          pue_source,
+          ci_source,
+          cfp_source,
+          cfp_null_reason,
+          used_default_pue,
+          used_cached_ci
+        )
+        VALUES %s
+        ON CONFLICT (event_id) DO UPDATE SET
+          pue_source = EXCLUDED.pue_source,
+          ci_source = EXCLUDED.ci_source,
+          cfp_source = EXCLUDED.cfp_source,
+          cfp_null_reason = EXCLUDED.cfp_null_reason,
+          used_default_pue = EXCLUDED.used_default_pue,
+          used_cached_ci = EXCLUDED.used_cached_ci
+        """,
+        values,
+        page_size=page_size,
+    )
+
 def insert_ingestion_audit_rows(cur, rows: list[dict]):
     for row in rows:
         cur.execute(
@@ -296,6 +773,39 @@ def insert_service_health_rows(cur, rows: list[dict]):
             ),
         )
 
+def claim_idempotency_key(cur, key: str) -> Optional[dict]:
+    """
+    Claim `key` inside the current transaction. Returns None when the key is new
+    (the caller processes the request and calls store_idempotent_response), or
+    the stored response of the request that already used it. A concurrent claim
+    of the same key blocks until the first transaction commits or rolls back.
+    """
+    cur.execute(
+        "INSERT INTO monitoring.ingest_idempotency (idempotency_key) VALUES (%s) "
+        "ON CONFLICT (idempotency_key) DO NOTHING",
+        (key,),
+    )
+    if cur.rowcount == 1:
+        return None
+    cur.execute(
+        "SELECT response FROM monitoring.ingest_idempotency WHERE idempotency_key = %s",
+        (key,),
+    )
+    row = cur.fetchone()
+    return (row[0] if row else None) or {}
+
+def store_idempotent_response(cur, key: str, response: dict) -> None:
+    cur.execute(
+        "UPDATE monitoring.ingest_idempotency SET response = %s::jsonb WHERE idempotency_key = %s",
+        (json.dumps(response), key),
+    )
+
+def purge_idempotency_keys(cur, max_age_days: int) -> None:
+    cur.execute(
+        "DELETE FROM monitoring.ingest_idempotency WHERE created_at < now() - make_interval(days => %s)",
+        (max_age_days,),
+    )
+
 def find_detail_table_for_event(cur, event_id: int) -> Tuple[str, str]:
     cur.execute(
         "SELECT s.site_type::text, std.detail_table_name "
@@ -1,29 +1,125 @@
-from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, ValidationError
 from datetime import datetime, timezone
 from typing import Any, Optional
+import base64
+import hashlib
+import json
+import threading
+import time
 import traceback
 import logging
+import os
+import sys
+import uuid
+import zlib
+from pathlib import Path
 
 
 from cnr_db import (
-    init_pool, get_conn, put_conn, ensure_site_type_mapping,
-    get_or_create_site, insert_fact_event, insert_detail,
-    delete_event, find_detail_table_for_event, ensure_aux_tables,
-    insert_enrichment_audit, insert_ingestion_audit_rows, insert_service_health_rows
+    init_pool, get_conn, put_conn, pool_stats, PoolTimeout, site_cache, SiteCacheSession,
+    insert_fact_event, insert_detail,
+    insert_fact_events_bulk, insert_details_bulk, insert_enrichment_audits_bulk,
+    delete_event, ensure_aux_tables, ensure_read_indexes, vo_key_sql, DETAIL_INSERT_COLUMNS,
+    insert_enrichment_audit, insert_ingestion_audit_rows, insert_service_health_rows,
+    claim_idempotency_key, store_idempotent_response, purge_idempotency_keys
 )
 from schemas import (
     CloudDetail, NetworkDetail, GridDetail, Envelope,
     IngestionAuditPayload, ServiceHealthPayload
 )
 
+
+def _add_shared_dir_to_path() -> None:
+    # Modules shared between services live in ./shared: $GD_SHARED_DIR, else the nearest
+    # shared/ above this file (repo checkout), else /opt/shared (Docker mount).
+    here = Path(__file__).resolve()
+    candidates = [os.getenv("GD_SHARED_DIR"), *(str(p / "shared") for p in here.parents), "/opt/shared"]
+    for candidate in candidates:
+        if candidate and os.path.isfile(os.path.join(candidate, "cfp_formula.py")):
+            if candidate not in sys.path:
+                sys.path.insert(0, candidate)
+            return
+
+
+_add_shared_dir_to_path()
+from compression import BodyDecodeError, StreamDecoder, normalise_encoding  # noqa: E402
+
 app = FastAPI(title="CNR Metrics Submission API", version="0.1.0")
 
 logger = logging.getLogger("adapter")
 logging.basicConfig(level=logging.INFO)
 
 RECORDS_MAX_LIMIT = 500
+# Bulk Idempotency-Key records older than this are purged at startup and then every
+# IDEMPOTENCY_PURGE_INTERVAL_S (0 purges at startup only).
+IDEMPOTENCY_RETENTION_DAYS = int(os.getenv("IDEMPOTENCY_RETENTION_DAYS", "14"))
+IDEMPOTENCY_PURGE_INTERVAL_S = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_S", "3600"))
+# Cap on the decoded size of a Content-Encoding compressed request body.
+MAX_DECODED_BODY_BYTES = int(os.getenv("MAX_DECODED_BODY_BYTES", str(1024 * 1024 * 1024)))
+# Build missing read indexes (cnr_db.READ_INDEXES) in the background at startup.
+ENSURE_READ_INDEXES = os.getenv("CNR_DB_ENSURE_INDEXES", "1").strip().lower() not in ("0", "false", "no")
+# /cnr-db/records/count results are reused for this long per normalised filter set (0 disables).
+COUNT_CACHE_TTL_S = float(os.getenv("CNR_COUNT_CACHE_TTL_S", "30"))
+COUNT_CACHE_MAX_ENTRIES = 1024
+# Rows per round trip of the /cnr-db/records/export server-side cursor.
+EXPORT_FETCH_SIZE = int(os.getenv("CNR_EXPORT_FETCH_SIZE", "5000"))
+EXPORT_MAX_FETCH_SIZE = 100000
+
+
+class DecompressRequestMiddleware:
+    """
+    ASGI middleware that decodes gzip/deflate (and zstd, if `zstandard` is
+    installed) request bodies chunk by chunk as the endpoint reads them, so the
+    CIM service can send large bulk posts compressed.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_DECODED_BODY_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = ""
+        for name, value in scope.get("headers") or []:
+            if name == b"content-encoding":
+                encoding = normalise_encoding(value.decode("latin-1"))
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+        try:
+            decoder = StreamDecoder(encoding, max_bytes=self.max_bytes)
+        except BodyDecodeError as e:
+            response = JSONResponse({"detail": str(e)}, status_code=e.status)
+            await response(scope, receive, send)
+            return
+
+        # The endpoint sees a plain body of unknown length.
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+
+        async def receive_decoded():
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            try:
+                body = decoder.feed(message.get("body", b""))
+                if not message.get("more_body"):
+                    body += decoder.finish()
+            except BodyDecodeError as e:
+                raise HTTPException(status_code=e.status, detail=str(e))
+            return {**message, "body": body}
+
+        await self.app(scope, receive_decoded, send)
+
+
+app.add_middleware(DecompressRequestMiddleware)
 
 # class CNRDeleteRequest(BaseModel):
 #     site_id: Optional[int] = None
@@ -32,18 +128,10 @@ RECORDS_MAX_LIMIT = 500
 #     start: datetime
 #     end: datetime
 
-def _submit_one(cur, payload: Envelope, site_cache: dict, mapping_cache: dict) -> dict:
+def _resolve_site(cur, payload: Envelope, sites: SiteCacheSession) -> tuple[int, dict]:
     site_type = payload.sites.site_type
-    if site_type not in mapping_cache:
-        mapping_cache[site_type] = ensure_site_type_mapping(cur, site_type)
-
-    site_desc = payload.fact_site_event.get("site")
-    site_key = (site_type, site_desc)
-    if site_key in site_cache:
-        site_id = site_cache[site_key]
-    else:
-        site_id = get_or_create_site(cur, site_type, site_desc)
-        site_cache[site_key] = site_id
+    sites.detail_table(cur, site_type)
+    site_id = sites.site_id(cur, site_type, payload.fact_site_event.get("site"))
 
     if site_type == "cloud":
         detail = payload.detail_cloud or {}
@@ -56,6 +144,11 @@ def _submit_one(cur, payload: Envelope, site_cache: dict, mapping_cache: dict) -
         GridDetail(**detail)
     else:
         raise HTTPException(status_code=400, detail="Unsupported site_type")
+    return site_id, detail
+
+def _submit_one(cur, payload: Envelope, sites: SiteCacheSession) -> dict:
+    site_type = payload.sites.site_type
+    site_id, detail = _resolve_site(cur, payload, sites)
 
     f = payload.fact_site_event
     event_id = insert_fact_event(cur, site_id, f)
@@ -63,7 +156,39 @@ def _submit_one(cur, payload: Envelope, site_cache: dict, mapping_cache: dict) -
     insert_detail(cur, site_type, site_id, event_id, execunitid, detail)
     insert_enrichment_audit(cur, event_id, payload.audit.model_dump() if payload.audit else None)
 
-    return {"ok": True, "event_id": event_id, "detail_table": mapping_cache[site_type], "site_id": site_id}
+    return {"ok": True, "event_id": event_id, "detail_table": sites.detail_table(cur, site_type), "site_id": site_id}
+
+def _submit_many(cur, payloads: list[Envelope], sites: SiteCacheSession) -> list[dict]:
+    """
+    Set-based variant of _submit_one: envelopes are grouped by site_type, each
+    group's facts go in with one multi-row INSERT ... RETURNING event_id, then
+    details per group and all audits in bulk. Results keep the input order.
+    """
+    groups: dict[str, list[int]] = {}
+    resolved: list[tuple[int, dict]] = []
+    for i, p in enumerate(payloads):
+        resolved.append(_resolve_site(cur, p, sites))
+        groups.setdefault(p.sites.site_type, []).append(i)
+
+    results: list[Optional[dict]] = [None] * len(payloads)
+    audits: list[tuple[int, Optional[dict]]] = []
+    for site_type, idxs in groups.items():
+        detail_table = sites.detail_table(cur, site_type)
+        event_ids = insert_fact_events_bulk(
+            cur, [(resolved[i][0], payloads[i].fact_site_event) for i in idxs]
+        )
+        details = []
+        for i, event_id in zip(idxs, event_ids):
+            site_id, detail = resolved[i]
+            details.append((site_id, event_id, payloads[i].fact_site_event.get("execunitid"), detail))
+            audit = payloads[i].audit
+            audits.append((event_id, audit.model_dump() if audit else None))
+            results[i] = {
+                "ok": True, "event_id": event_id, "detail_table": detail_table, "site_id": site_id,
+            }
+        insert_details_bulk(cur, site_type, details)
+    insert_enrichment_audits_bulk(cur, audits)
+    return results
 
 def _ensure_utc(dt: datetime) -> datetime:
     if dt.tzinfo is None:
@@ -96,6 +221,7 @@ def _build_filters(
     activity: Optional[str],
     start: Optional[datetime],
     end: Optional[datetime],
+    before: Optional[tuple[datetime, int]] = None,
 ) -> tuple[str, list[Any]]:
     clauses: list[str] = []
     params: list[Any] = []
@@ -105,10 +231,8 @@ def _build_filters(
         params.append(site_id)
 
     if vo:
-        clauses.append(
-            "LOWER(COALESCE(NULLIF(TRIM(f.owner), ''), 'Unknown')) = "
-            "LOWER(COALESCE(NULLIF(TRIM(%s), ''), 'Unknown'))"
-        )
+        # Indexed by fact_site_event_vo_key_idx.
+        clauses.append(f"{vo_key_sql('f.owner')} = {vo_key_sql('%s')}")
         params.append(vo)
 
     if activity:
@@ -121,34 +245,222 @@ def _build_filters(
         clauses.append("f.event_end_timestamp >= %s")
         params.append(_ensure_utc(start))
 
+    if before is not None:
+        # Keyset position: rows strictly after `before` in the listing order.
+        clauses.append("(f.event_start_timestamp, f.event_id) < (%s, %s)")
+        params.extend(before)
+
     where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
     return where_sql, params
 
 
-def _get_cnr_entry_dict(cur, event_id: int) -> dict[str, Any]:
-    site_type, detail_table = find_detail_table_for_event(cur, event_id)
+def _filters_fingerprint(**filters: Any) -> str:
+    raw = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _encode_records_cursor(fact: dict[str, Any], fingerprint: str) -> str:
+    token = {"ts": _ensure_utc(fact["event_start_timestamp"]).isoformat(), "id": int(fact["event_id"]), "q": fingerprint}
+    return base64.urlsafe_b64encode(json.dumps(token, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_records_cursor(cursor: str, fingerprint: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        token = json.loads(raw)
+        position = (datetime.fromisoformat(token["ts"]), int(token["id"]))
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if token.get("q") != fingerprint:
+        raise HTTPException(status_code=400, detail="cursor was issued for different filters")
+    return position
+
+
+class _CountCache:
+    """Thread-safe TTL cache for record counts."""
+
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: dict[tuple, tuple[float, dict[str, Any]]] = {}
+
+    def get(self, key: tuple) -> Optional[dict[str, Any]]:
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            if hit[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            return hit[1]
+
+    def put(self, key: tuple, value: dict[str, Any]) -> None:
+        if self.ttl_s <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (time.monotonic() + self.ttl_s, value)
+
+
+_count_cache = _CountCache(COUNT_CACHE_TTL_S, COUNT_CACHE_MAX_ENTRIES)
+
+
+def _count_cache_key(
+    *,
+    site_id: Optional[int],
+    vo: Optional[str],
+    activity: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    approximate: bool,
+) -> tuple:
+    # Same normalisation as vo_key_sql(): TRIM strips spaces, blank means 'Unknown'.
+    vo_key = None if not vo else (vo.strip(" ") or "Unknown").lower()
+    return (
+        site_id,
+        vo_key,
+        activity,
+        _ensure_utc(start) if start else None,
+        _ensure_utc(end) if end else None,
+        approximate,
+    )
+
 
+def _floor_15m(dt: datetime) -> datetime:
+    dt = _ensure_utc(dt)
+    return dt.replace(minute=dt.minute - dt.minute % 15, second=0, microsecond=0)
+
+
+def _approximate_count(
+    cur,
+    *,
+    site_id: Optional[int],
+    vo: Optional[str],
+    activity: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime],
+) -> tuple[int, str]:
+    """
+    Count from the 15-minute rollup when it exists (as of its last refresh, by
+    event start bucket), otherwise from the planner's row estimate.
+    Returns (count, source).
+    """
+    cur.execute("SELECT to_regclass('monitoring.mv_fact_site_event_15m_base') IS NOT NULL")
+    if cur.fetchone()[0]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        if site_id is not None:
+            clauses.append("m.site_id = %s")
+            params.append(site_id)
+        if vo:
+            clauses.append(f"LOWER(m.vo) = {vo_key_sql('%s')}")
+            params.append(vo)
+        if activity:
+            clauses.append("m.activity = %s")
+            params.append(activity)
+        if start is not None and end is not None:
+            clauses.append("m.bucket_15m >= %s AND m.bucket_15m <= %s")
+            params.extend([_floor_15m(start), _ensure_utc(end)])
+        where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        cur.execute(
+            f"SELECT COALESCE(SUM(m.records), 0) FROM monitoring.mv_fact_site_event_15m_base m {where_sql}",
+            tuple(params),
+        )
+        return int(cur.fetchone()[0]), "rollup"
+
+    where_sql, params = _build_filters(cur, site_id=site_id, vo=vo, activity=activity, start=start, end=end)
     cur.execute(
-        "SELECT f.*, s.site_type::text AS site_type, s.description AS site_description "
+        "EXPLAIN (FORMAT JSON) SELECT 1 "
         "FROM monitoring.fact_site_event f "
         "JOIN monitoring.sites s ON s.site_id = f.site_id "
-        "WHERE f.event_id = %s",
-        (event_id,),
+        f"{where_sql}",
+        tuple(params),
     )
-    fact = _fetchone_dict(cur)
-    if not fact:
-        raise HTTPException(status_code=404, detail="Event not found")
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"]), "planner"
+
+
+# Fact row joined with its site and detail table name; _attach_details pops `_detail_table`.
+_ENTRY_SELECT = (
+    "SELECT f.*, s.site_type::text AS site_type, s.description AS site_description, "
+    "std.detail_table_name AS _detail_table "
+    "FROM monitoring.fact_site_event f "
+    "JOIN monitoring.sites s ON s.site_id = f.site_id "
+    "JOIN monitoring.site_type_detail std ON std.site_type = s.site_type "
+)
 
-    cur.execute(f"SELECT * FROM monitoring.{detail_table} WHERE event_id = %s", (event_id,))
-    detail = _fetchone_dict(cur)
 
-    return {
-        "event_id": event_id,
-        "site_type": site_type,
-        "detail_table": detail_table,
-        "fact": fact,
-        "detail": detail,
-    }
+# One NDJSON line per record, built by PostgreSQL in the /cnr-db/records entry
+# shape (key order inside `fact`/`detail` follows jsonb rules).
+_EXPORT_SELECT = (
+    "SELECT json_build_object("
+    "'event_id', f.event_id, "
+    "'site_type', s.site_type::text, "
+    "'detail_table', std.detail_table_name, "
+    "'fact', to_jsonb(f) || jsonb_build_object('site_type', s.site_type::text, 'site_description', s.description), "
+    "'detail', CASE std.detail_table_name "
+    + " ".join(
+        f"WHEN 'detail_{t}' THEN (SELECT to_jsonb(d) FROM monitoring.detail_{t} d WHERE d.event_id = f.event_id LIMIT 1)"
+        for t in DETAIL_INSERT_COLUMNS
+    )
+    + " END)::text "
+    "FROM monitoring.fact_site_event f "
+    "JOIN monitoring.sites s ON s.site_id = f.site_id "
+    "JOIN monitoring.site_type_detail std ON std.site_type = s.site_type "
+)
+
+
+def _attach_details(cur, facts: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Build CNR entries for fact rows selected with _ENTRY_SELECT, loading the
+    details with one `event_id = ANY(...)` query per detail table.
+    """
+    by_table: dict[str, list[int]] = {}
+    for fact in facts:
+        by_table.setdefault(fact["_detail_table"], []).append(int(fact["event_id"]))
+
+    details: dict[tuple[str, int], dict[str, Any]] = {}
+    for detail_table, event_ids in by_table.items():
+        cur.execute(f"SELECT * FROM monitoring.{detail_table} WHERE event_id = ANY(%s)", (event_ids,))
+        for row in _fetchall_dict(cur):
+            details.setdefault((detail_table, int(row["event_id"])), row)
+
+    entries = []
+    for fact in facts:
+        detail_table = fact.pop("_detail_table")
+        event_id = int(fact["event_id"])
+        entries.append({
+            "event_id": event_id,
+            "site_type": fact["site_type"],
+            "detail_table": detail_table,
+            "fact": fact,
+            "detail": details.get((detail_table, event_id)),
+        })
+    return entries
+
+
+def _get_cnr_entry_dict(cur, event_id: int) -> dict[str, Any]:
+    cur.execute(_ENTRY_SELECT + "WHERE f.event_id = %s", (event_id,))
+    fact = _fetchone_dict(cur)
+    if not fact:
+        raise ValueError("Event not found")
+    return _attach_details(cur, [fact])[0]
+
+@app.exception_handler(PoolTimeout)
+async def _pool_timeout(request: Request, exc: PoolTimeout):
+    logger.warning("DB pool exhausted on %s: %s", request.url.path, exc)
+    return JSONResponse(
+        {"detail": f"Database busy: {exc}"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
 
 @app.middleware("http")
 async def log_exceptions(request: Request, call_next):
@@ -167,21 +479,59 @@ def _startup():
         with conn:
             with conn.cursor() as cur:
                 ensure_aux_tables(cur)
+                purge_idempotency_keys(cur, IDEMPOTENCY_RETENTION_DAYS)
+                cached = site_cache.warm(cur)
+        print(f"[adapter] Site cache warmed with {cached} sites", flush=True)
     finally:
         put_conn(conn)
+    if ENSURE_READ_INDEXES:
+        threading.Thread(target=_build_read_indexes, name="read-indexes", daemon=True).start()
+    if IDEMPOTENCY_PURGE_INTERVAL_S > 0:
+        threading.Thread(target=_purge_idempotency_keys_loop, name="idempotency-purge", daemon=True).start()
+
+def _purge_idempotency_keys_loop():
+    while True:
+        time.sleep(IDEMPOTENCY_PURGE_INTERVAL_S)
+        try:
+            conn = get_conn()
+        except PoolTimeout:
+            continue  # busy; try again next interval
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    purge_idempotency_keys(cur, IDEMPOTENCY_RETENTION_DAYS)
+        except Exception:
+            logger.exception("purging idempotency keys failed")
+        finally:
+            put_conn(conn)
+
+def _build_read_indexes():
+    conn = get_conn()
+    try:
+        conn.autocommit = True
+        created = ensure_read_indexes(conn)
+        if created:
+            print(f"[adapter] Created read indexes: {', '.join(created)}", flush=True)
+    except Exception:
+        logger.exception("building read indexes failed")
+    finally:
+        if not conn.closed:
+            conn.autocommit = False
+        put_conn(conn)
 
 @app.get("/health")
 def health():
+    """Database round trip plus connection pool metrics (in use, waiting, wait time)."""
     conn = get_conn()
     try:
         with conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT 1")
                 cur.fetchone()
-        return {"status": "ok", "db": "ok"}
+        return {"status": "ok", "db": "ok", "pool": pool_stats()}
     except Exception as e:
         logger.exception("healthcheck failed")
-        raise HTTPException(status_code=503, detail={"status": "degraded", "db": str(e)})
+        raise HTTPException(status_code=503, detail={"status": "degraded", "db": str(e), "pool": pool_stats()})
     finally:
         put_conn(conn)
 
@@ -190,11 +540,9 @@ def submit_metrics(payload: Envelope):
     print("Submitting metrics...")
     conn = get_conn()
     try:
-        with conn:
+        with site_cache.session() as sites, conn:
             with conn.cursor() as cur:
-                site_cache: dict = {}
-                mapping_cache: dict = {}
-                res = _submit_one(cur, payload, site_cache, mapping_cache)
+                res = _submit_one(cur, payload, sites)
                 print(f"[DEBUG]: Site type: {payload.sites.site_type}")
                 print(f"[DEBUG]: Generated event_id: {res.get('event_id')}", flush=True)
                 return JSONResponse(res)
@@ -207,24 +555,37 @@ def submit_metrics(payload: Envelope):
 
 
 @app.post("/cnr-sql-adapter-bulk")
-def submit_metrics_bulk(payloads: list[Envelope]):
+def submit_metrics_bulk(
+    payloads: list[Envelope],
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    idempotency_replay: Optional[str] = Header(default=None, alias="X-Idempotency-Replay"),
+):
     """
     Bulk submission to avoid per-entry HTTP overhead.
-    Processes all envelopes in a single DB transaction.
+    Processes all envelopes in a single DB transaction, with set-based inserts
+    per site_type (see _submit_many).
+    With an Idempotency-Key header, a repeated key returns the first response
+    instead of inserting the envelopes again. Callers that generate their own
+    keys (the CIM service) send `X-Idempotency-Replay: minimal`: only the key is
+    kept, and a repeat answers `{"ok", "count", "replayed"}` without results.
     """
     print(f"Submitting metrics bulk... count={len(payloads)}")
     if not payloads:
         raise HTTPException(status_code=400, detail="Empty payload list")
     conn = get_conn()
     try:
-        results: list[dict] = []
-        with conn:
+        with site_cache.session() as sites, conn:
             with conn.cursor() as cur:
-                site_cache: dict = {}
-                mapping_cache: dict = {}
-                for p in payloads:
-                    results.append(_submit_one(cur, p, site_cache, mapping_cache))
-        return {"ok": True, "count": len(payloads), "results": results}
+                if idempotency_key:
+                    previous = claim_idempotency_key(cur, idempotency_key)
+                    if previous is not None:
+                        print(f"[bulk] Idempotency-Key {idempotency_key} already applied", flush=True)
+                        return {"ok": True, "count": len(payloads), **previous, "replayed": True}
+                results = _submit_many(cur, payloads, sites)
+                response = {"ok": True, "count": len(payloads), "results": results}
+                if idempotency_key and (idempotency_replay or "").strip().lower() != "minimal":
+                    store_idempotent_response(cur, idempotency_key, response)
+        return response
     except ValidationError as ve:
         raise HTTPException(status_code=400, detail=ve.errors())
     except Exception as e:
@@ -284,11 +645,27 @@ def list_cnr_records(
     end: Optional[datetime] = Query(default=None),
     limit: int = Query(default=100, ge=1, le=RECORDS_MAX_LIMIT),
     offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(default=None, description="`next_cursor` of the previous page (keyset pagination)."),
 ):
+    """
+    Lists records newest first. Pages can be walked with `offset`, or with the
+    opaque `next_cursor` of each response passed back as `cursor`, which costs
+    the same at any depth.
+    """
     if (start is None) != (end is None):
         raise HTTPException(status_code=400, detail="Provide both start and end, or neither")
     if start is not None and end is not None and _ensure_utc(start) > _ensure_utc(end):
         raise HTTPException(status_code=400, detail="start must be <= end")
+    if cursor and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both")
+    fingerprint = _filters_fingerprint(
+        site_id=site_id,
+        vo=vo,
+        activity=activity,
+        start=_ensure_utc(start) if start else None,
+        end=_ensure_utc(end) if end else None,
+    )
+    before = _decode_records_cursor(cursor, fingerprint) if cursor else None
 
     conn = get_conn()
     try:
@@ -301,18 +678,19 @@ def list_cnr_records(
                     activity=activity,
                     start=start,
                     end=end,
+                    before=before,
                 )
                 cur.execute(
-                    "SELECT f.event_id "
-                    "FROM monitoring.fact_site_event f "
-                    "JOIN monitoring.sites s ON s.site_id = f.site_id "
-                    f"{where_sql} "
+                    _ENTRY_SELECT
+                    + f"{where_sql} "
                     "ORDER BY f.event_start_timestamp DESC, f.event_id DESC "
                     "LIMIT %s OFFSET %s",
                     (*params, limit, offset),
                 )
-                event_rows = _fetchall_dict(cur)
-                records = [_get_cnr_entry_dict(cur, int(row["event_id"])) for row in event_rows]
+                records = _attach_details(cur, _fetchall_dict(cur))
+                next_cursor = None
+                if len(records) == limit:
+                    next_cursor = _encode_records_cursor(records[-1]["fact"], fingerprint)
                 return {
                     "ok": True,
                     "site_id": site_id,
@@ -320,6 +698,8 @@ def list_cnr_records(
                     "activity": activity,
                     "limit": limit,
                     "offset": offset,
+                    "cursor": cursor,
+                    "next_cursor": next_cursor,
                     "returned": len(records),
                     "records": records,
                 }
@@ -338,39 +718,57 @@ def count_cnr_records(
     activity: Optional[str] = Query(default=None),
     start: Optional[datetime] = Query(default=None),
     end: Optional[datetime] = Query(default=None),
+    approximate: bool = Query(default=False, description="Answer from the 15m rollup or planner estimates instead of COUNT(*)."),
 ):
+    """
+    Counts records matching the filters. Results are cached for
+    CNR_COUNT_CACHE_TTL_S per normalised filter set; `exact` and `source`
+    ("count", "rollup" or "planner") say how the number was obtained.
+    """
     if (start is None) != (end is None):
         raise HTTPException(status_code=400, detail="Provide both start and end, or neither")
     if start is not None and end is not None and _ensure_utc(start) > _ensure_utc(end):
         raise HTTPException(status_code=400, detail="start must be <= end")
 
+    response = {
+        "ok": True,
+        "site_id": site_id,
+        "vo": vo,
+        "activity": activity,
+    }
+    cache_key = _count_cache_key(
+        site_id=site_id, vo=vo, activity=activity, start=start, end=end, approximate=approximate
+    )
+    cached = _count_cache.get(cache_key)
+    if cached is not None:
+        return {**response, **cached, "cached": True}
+
     conn = get_conn()
     try:
         with conn:
             with conn.cursor() as cur:
-                where_sql, params = _build_filters(
-                    cur,
-                    site_id=site_id,
-                    vo=vo,
-                    activity=activity,
-                    start=start,
-                    end=end,
-                )
-                cur.execute(
-                    "SELECT COUNT(*) AS count "
-                    "FROM monitoring.fact_site_event f "
-                    "JOIN monitoring.sites s ON s.site_id = f.site_id "
-                    f"{where_sql}",
-                    tuple(params),
-                )
-                row = cur.fetchone()
-                return {
-                    "ok": True,
-                    "site_id": site_id,
-                    "vo": vo,
-                    "activity": activity,
-                    "count": int(row[0] if row else 0),
-                }
+                if approximate:
+                    count, source = _approximate_count(
+                        cur, site_id=site_id, vo=vo, activity=activity, start=start, end=end
+                    )
+                else:
+                    where_sql, params = _build_filters(
+                        cur,
+                        site_id=site_id,
+                        vo=vo,
+                        activity=activity,
+                        start=start,
+                        end=end,
+                    )
+                    cur.execute(
+                        "SELECT COUNT(*) AS count "
+                        "FROM monitoring.fact_site_event f "
+                        "JOIN monitoring.sites s ON s.site_id = f.site_id "
+                        f"{where_sql}",
+                        tuple(params),
+                    )
+                    row = cur.fetchone()
+                    count, source = int(row[0] if row else 0), "count"
     except HTTPException:
         raise
     except Exception as e:
@@ -378,6 +776,74 @@ def count_cnr_records(
     finally:
         put_conn(conn)
 
+    result = {"count": count, "exact": source == "count", "source": source}
+    _count_cache.put(cache_key, result)
+    return {**response, **result, "cached": False}
+
+
+@app.get("/cnr-db/records/export")
+def export_cnr_records(
+    site_id: Optional[int] = Query(default=None),
+    vo: Optional[str] = Query(default=None),
+    activity: Optional[str] = Query(default=None),
+    start: Optional[datetime] = Query(default=None),
+    end: Optional[datetime] = Query(default=None),
+    fetch_size: int = Query(default=EXPORT_FETCH_SIZE, ge=1, le=EXPORT_MAX_FETCH_SIZE),
+    gzip: bool = Query(default=False, description="gzip the stream (Content-Encoding: gzip)."),
+):
+    """
+    Streams every record matching the /cnr-db/records filters as NDJSON, one
+    /cnr-db/records entry per line, in no particular order. Rows come from a
+    single query through a named server-side cursor, `fetch_size` rows per
+    round trip, so memory stays flat however many rows are exported.
+    """
+    if (start is None) != (end is None):
+        raise HTTPException(status_code=400, detail="Provide both start and end, or neither")
+    if start is not None and end is not None and _ensure_utc(start) > _ensure_utc(end):
+        raise HTTPException(status_code=400, detail="start must be <= end")
+
+    def rows():
+        conn = get_conn()
+        exported = 0
+        compressor = zlib.compressobj(wbits=31) if gzip else None
+        try:
+            with conn:
+                with conn.cursor(name=f"cnr_export_{uuid.uuid4().hex}") as cur:
+                    cur.itersize = fetch_size
+                    where_sql, params = _build_filters(
+                        cur,
+                        site_id=site_id,
+                        vo=vo,
+                        activity=activity,
+                        start=start,
+                        end=end,
+                    )
+                    cur.execute(_EXPORT_SELECT + where_sql, tuple(params))
+                    yield b""
+                    while True:
+                        batch = cur.fetchmany(fetch_size)
+                        if not batch:
+                            break
+                        exported += len(batch)
+                        chunk = ("\n".join(row[0] for row in batch) + "\n").encode("utf-8")
+                        if compressor is not None:
+                            chunk = compressor.compress(chunk)
+                        if chunk:
+                            yield chunk
+            if compressor is not None:
+                yield compressor.flush()
+            print(f"[export] {exported} records", flush=True)
+        finally:
+            put_conn(conn)
+
+    # Run up to the first (empty) chunk here: a busy pool still answers 503, and
+    # from now on the generator owns the connection, which its `finally` returns
+    # even if the response is dropped before streaming starts.
+    body = rows()
+    next(body)
+    headers = {"Content-Encoding": "gzip"} if gzip else None
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
 
 # @app.post("/cnr-db/delete")
 # def delete_cnr_records(payload: CNRDeleteRequest):
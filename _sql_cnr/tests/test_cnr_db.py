@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+try:
+    import psycopg2
+except ImportError:  # cnr_db needs psycopg2 at import time
+    psycopg2 = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+if psycopg2 is not None:
+    import psycopg2.extensions
+    from cnr_db import DETAIL_EVENT_INDEXES, READ_INDEXES, ConnectionPool, PoolTimeout, SiteCache, ensure_read_indexes
+
+
+class _FakeCursor:
+    def __init__(self, conn: "_FakeConnection") -> None:
+        self.conn = conn
+        self._row = None
+
+    def __enter__(self) -> "_FakeCursor":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def execute(self, sql: str, params=()) -> None:
+        self.conn.executed.append(" ".join(sql.split()))
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        sites = self.conn.sites
+        indexes = self.conn.indexes
+        if sql.startswith("SELECT i.indisvalid"):
+            self._row = (indexes[params[0]],) if params[0] in indexes else None
+        elif sql.startswith("SELECT 1 FROM pg_index i "):
+            name = f"{params[0].split('.')[1]}_event_id_idx"
+            self._row = (1,) if indexes.get(name) else None
+        elif sql.startswith("SELECT s.site_id"):
+            site_id = sites.get(tuple(params))
+            self._row = (site_id,) if site_id is not None else None
+        elif sql.startswith("INSERT INTO monitoring.sites"):
+            sites[tuple(params)] = len(sites) + 1
+            self._row = (sites[tuple(params)],)
+        else:
+            self._row = None
+
+    def fetchone(self):
+        return self._row
+
+    def fetchmany(self, size: int) -> list:
+        batch, self.conn.rows = self.conn.rows[:size], self.conn.rows[size:]
+        return batch
+
+
+class _FakeConnection:
+    """Just enough of a psycopg2 connection for ConnectionPool and SiteCacheSession."""
+
+    def __init__(self, dsn: str = "", sites: dict | None = None) -> None:
+        self.dsn = dsn
+        self.closed = 0
+        self.broken = False
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+        self.executed = []
+        self.sites = {} if sites is None else sites
+        self.indexes: dict[str, bool] = {}  # index name -> indisvalid
+        self.rows = []  # returned by fetchmany
+
+    def __enter__(self) -> "_FakeConnection":
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        return False
+
+    def cursor(self, name: str | None = None) -> _FakeCursor:
+        return _FakeCursor(self)
+
+    def get_transaction_status(self) -> int:
+        return self.status
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+@unittest.skipIf(psycopg2 is None, "psycopg2 is not installed")
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.opened = []
+
+    def _connect(self, dsn: str) -> _FakeConnection:
+        conn = _FakeConnection(dsn)
+        self.opened.append(conn)
+        return conn
+
+    def _pool(self, maxconn: int = 1, **kwargs) -> ConnectionPool:
+        return ConnectionPool(0, maxconn, "dbname=test", connect=self._connect, **kwargs)
+
+    def test_exhausted_pool_times_out(self) -> None:
+        pool = self._pool(timeout_s=0.05)
+        conn = pool.getconn()
+        started = time.monotonic()
+        with self.assertRaisesRegex(PoolTimeout, r"1 in use, max 1"):
+            pool.getconn()
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        stats = pool.stats()
+        self.assertEqual((stats["opened"], stats["timeouts"], stats["checkouts"]), (1, 1, 2))
+
+    def test_waiter_gets_the_returned_connection(self) -> None:
+        pool = self._pool(timeout_s=5.0)
+        conn = pool.getconn()
+        threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_dirty_and_broken_connections_are_not_reused(self) -> None:
+        pool = self._pool(maxconn=2, check_idle_s=0.0)
+        conn = pool.getconn()
+        conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(conn)
+        self.assertEqual(conn.rollbacks, 1)
+
+        conn.broken = True  # fails the SELECT 1 ping on checkout
+        fresh = pool.getconn()
+        self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["discarded"], 1)
+        self.assertEqual(pool.stats()["open"], 1)
+
+
+@unittest.skipIf(psycopg2 is None, "psycopg2 is not installed")
+class SiteCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = SiteCache()
+        self.db = _FakeConnection()
+
+    def _lookup(self, site: str | None = "CNR-ISTI") -> int:
+        with self.cache.session() as sites:
+            cur = self.db.cursor()
+            sites.detail_table(cur, "cloud")
+            return sites.site_id(cur, "cloud", site)
+
+    def test_miss_then_hit(self) -> None:
+        site_id = self._lookup()
+        self.assertEqual(len(self.db.executed), 3)  # mapping upsert, site SELECT, site INSERT
+        self.db.executed.clear()
+        self.assertEqual(self._lookup(), site_id)
+        self.assertEqual(self.db.executed, [])
+
+    def test_sites_without_description_are_not_published(self) -> None:
+        self._lookup(None)
+        self.db.executed.clear()
+        self._lookup(None)
+        self.assertTrue(any("monitoring.sites" in sql for sql in self.db.executed))
+
+    def test_rolled_back_session_invalidates_the_cache(self) -> None:
+        self._lookup("CNR-ISTI")
+        with self.assertRaises(RuntimeError):
+            with self.cache.session() as sites:
+                sites.site_id(self.db.cursor(), "cloud", "New-Site")
+                raise RuntimeError("transaction rolled back")
+        self.db.executed.clear()
+        self._lookup("CNR-ISTI")
+        self.assertEqual(len(self.db.executed), 2)  # mapping and site both looked up again
+        self.assertIsNone(self.cache._get(("cloud", "New-Site")))
+
+
+@unittest.skipIf(psycopg2 is None, "psycopg2 is not installed")
+class EnsureReadIndexesTests(unittest.TestCase):
+    def test_invalid_indexes_are_dropped_and_rebuilt(self) -> None:
+        conn = _FakeConnection()
+        conn.indexes = {name: True for name in (*READ_INDEXES, *DETAIL_EVENT_INDEXES)}
+        self.assertEqual(ensure_read_indexes(conn), [])
+
+        # What an interrupted CREATE INDEX CONCURRENTLY leaves behind.
+        conn.indexes["fact_site_event_vo_key_idx"] = False
+        conn.indexes["detail_grid_event_id_idx"] = False
+        conn.executed.clear()
+        self.assertEqual(ensure_read_indexes(conn), ["fact_site_event_vo_key_idx", "detail_grid_event_id_idx"])
+        ddl = [sql for sql in conn.executed if not sql.startswith("SELECT")]
+        self.assertEqual(ddl[0], "DROP INDEX CONCURRENTLY IF EXISTS monitoring.fact_site_event_vo_key_idx")
+        self.assertTrue(ddl[1].startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS fact_site_event_vo_key_idx ON"))
+        self.assertEqual(ddl[2], "DROP INDEX CONCURRENTLY IF EXISTS monitoring.detail_grid_event_id_idx")
+        self.assertEqual(ddl[4], "ANALYZE monitoring.fact_site_event")
+
+    def test_missing_indexes_are_created_without_a_drop(self) -> None:
+        conn = _FakeConnection()
+        created = ensure_read_indexes(conn)
+        self.assertEqual(created, [*READ_INDEXES, *DETAIL_EVENT_INDEXES])
+        self.assertFalse(any(sql.startswith("DROP") for sql in conn.executed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import base64
+import gc
+import gzip
+import json
+import sys
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import psycopg2
+    from fastapi import HTTPException
+    from fastapi.testclient import TestClient
+except ImportError:  # the adapter needs psycopg2 and fastapi (TestClient also needs httpx)
+    psycopg2 = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+if psycopg2 is not None:
+    import cnr_db
+    import main
+    import compression  # importable once main has put shared/ on sys.path
+    from cnr_db import ConnectionPool
+
+    from test_cnr_db import _FakeConnection
+
+requires_adapter = unittest.skipIf(psycopg2 is None, "psycopg2/fastapi is not installed")
+
+FACT = {"event_start_timestamp": datetime(2026, 3, 1, 12, 30), "event_id": 42}
+
+
+def _token(cursor: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+
+def _cursor(token: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(token).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@requires_adapter
+class RecordsCursorTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.fingerprint = main._filters_fingerprint(site_id=None, vo="atlas", activity=None, start=None, end=None)
+
+    def _decode_error(self, cursor: str, fingerprint: str | None = None) -> str:
+        with self.assertRaises(HTTPException) as ctx:
+            main._decode_records_cursor(cursor, fingerprint or self.fingerprint)
+        self.assertEqual(ctx.exception.status_code, 400)
+        return ctx.exception.detail
+
+    def test_round_trip(self) -> None:
+        cursor = main._encode_records_cursor(FACT, self.fingerprint)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(
+            main._decode_records_cursor(cursor, self.fingerprint),
+            (datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc), 42),
+        )
+
+    def test_tampered_cursor(self) -> None:
+        cursor = main._encode_records_cursor(FACT, self.fingerprint)
+        token = _token(cursor)
+        for label, bad in (
+            ("truncated", cursor[: len(cursor) // 2]),
+            ("not base64 json", "not-a-cursor"),
+            ("bad timestamp", _cursor({**token, "ts": "yesterday"})),
+            ("bad id", _cursor({**token, "id": "x"})),
+            ("missing id", _cursor({"ts": token["ts"], "q": token["q"]})),
+            ("not an object", _cursor([1, 2])),
+        ):
+            with self.subTest(label):
+                self.assertEqual(self._decode_error(bad), "Invalid cursor")
+
+    def test_cursor_for_other_filters_is_rejected(self) -> None:
+        other = main._filters_fingerprint(site_id=None, vo="cms", activity=None, start=None, end=None)
+        self.assertNotEqual(other, self.fingerprint)
+        cursor = main._encode_records_cursor(FACT, other)
+        self.assertEqual(self._decode_error(cursor), "cursor was issued for different filters")
+        forged = _cursor({**_token(cursor), "q": "0" * 16})
+        self.assertEqual(self._decode_error(forged), "cursor was issued for different filters")
+
+
+@requires_adapter
+class RecordsEndpointTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._pool = cnr_db.pool
+        cnr_db.pool = ConnectionPool(0, 1, "dbname=test", timeout_s=0.05, connect=self._connect)
+        self.client = TestClient(main.app)  # no `with`: the startup hook would connect to PostgreSQL
+
+    def tearDown(self) -> None:
+        cnr_db.pool = self._pool
+
+    @staticmethod
+    def _connect(dsn: str) -> "_FakeConnection":
+        conn = _FakeConnection(dsn)
+        conn.rows = [(json.dumps({"event_id": i}),) for i in range(5)]
+        return conn
+
+    def test_cursor_is_checked_before_a_connection_is_taken(self) -> None:
+        fingerprint = main._filters_fingerprint(site_id=None, vo="cms", activity=None, start=None, end=None)
+        cursor = main._encode_records_cursor(FACT, fingerprint)
+        for params, detail in (
+            ({"vo": "atlas", "cursor": cursor}, "cursor was issued for different filters"),
+            ({"vo": "cms", "cursor": "garbage"}, "Invalid cursor"),
+            ({"vo": "cms", "cursor": cursor, "offset": 10}, "Use either cursor or offset, not both"),
+        ):
+            with self.subTest(**params):
+                resp = self.client.get("/cnr-db/records", params=params)
+                self.assertEqual(resp.status_code, 400)
+                self.assertEqual(resp.json()["detail"], detail)
+        self.assertEqual(cnr_db.pool.stats()["checkouts"], 0)
+
+    def test_exhausted_pool_answers_503(self) -> None:
+        held = cnr_db.get_conn()
+        try:
+            resp = self.client.get("/cnr-db/records/count", params={"vo": "pool-exhaustion-test"})
+        finally:
+            cnr_db.put_conn(held)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers["Retry-After"], "1")
+        self.assertTrue(resp.json()["detail"].startswith("Database busy: no database connection free"))
+        self.assertEqual(cnr_db.pool.stats()["timeouts"], 1)
+
+    def test_export_streams_and_returns_the_connection(self) -> None:
+        resp = self.client.get("/cnr-db/records/export", params={"fetch_size": 2})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([json.loads(line)["event_id"] for line in resp.text.splitlines()], [0, 1, 2, 3, 4])
+        self.assertEqual(cnr_db.pool.stats()["in_use"], 0)
+
+    def test_export_response_dropped_before_streaming_returns_the_connection(self) -> None:
+        resp = main.export_cnr_records(
+            site_id=None, vo=None, activity=None, start=None, end=None, fetch_size=2, gzip=False
+        )
+        self.assertEqual(cnr_db.pool.stats()["in_use"], 1)
+        del resp
+        gc.collect()
+        self.assertEqual(cnr_db.pool.stats()["in_use"], 0)
+
+    def test_export_on_exhausted_pool_answers_503(self) -> None:
+        held = cnr_db.get_conn()
+        try:
+            resp = self.client.get("/cnr-db/records/export")
+        finally:
+            cnr_db.put_conn(held)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(cnr_db.pool.stats()["in_use"], 0)
+
+
+@requires_adapter
+class CompressedBodyTests(unittest.TestCase):
+    BODY = json.dumps([{"fact_site_event": {"event_id": i}} for i in range(200)]).encode("utf-8")
+
+    def setUp(self) -> None:
+        self.client = TestClient(main.app)
+
+    def _post(self, data: bytes, encoding: str):
+        return self.client.post(
+            "/cnr-sql-adapter-bulk", content=data,
+            headers={"Content-Type": "application/json", "Content-Encoding": encoding},
+        )
+
+    def test_invalid_envelopes_are_decoded_before_validation(self) -> None:
+        resp = self._post(gzip.compress(self.BODY), "gzip")
+        self.assertEqual(resp.status_code, 422)
+
+    def test_truncated_bodies_are_rejected(self) -> None:
+        bodies = {"gzip": gzip.compress(self.BODY)}
+        if compression.zstandard is not None:
+            bodies["zstd"] = compression.zstandard.ZstdCompressor().compress(self.BODY)
+        for encoding, data in bodies.items():
+            with self.subTest(encoding=encoding):
+                resp = self._post(data[: len(data) // 2], encoding)
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn("truncated", resp.json()["detail"])
+
+    def test_unsupported_encoding_answers_415(self) -> None:
+        self.assertEqual(self._post(self.BODY, "br").status_code, 415)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -142,7 +142,8 @@ mkdir -p "$DUMP_BASE/02_dump_processed/"
 ./bin/python ./scripts/batch_submit_cnr/process_dump.py "$DUMP_BASE/01_mongo/metrics.jsonl" \
   --emails "$EMAILS" \
   --out-dir "$DUMP_BASE/02_dump_processed" \
-  --cache-granularity-s 86400
+  --cache-granularity-s 86400 \
+  --workers "${PROCESS_DUMP_WORKERS:-1}"
   # --disable-kpi-enri≈chment
   # --start $START \
   # --end "$END" \
@@ -20,6 +20,11 @@ python3 process_dump.py /path/to/mongoexport.jsonl \
 
 We also support input where each line is directly a metric entry (body).
 
+`--workers N` (0 = one per CPU) converts JSONL input in parallel: the file is split
+into line-aligned byte ranges, each worker writes per-publisher part files, and the
+parts are concatenated in input order. Files and summary counters are the same as
+a serial run with the same `--recorded-at`.
+
 This script can enrich missing CI/PUE via KPI-service with local caches.
 
 CFP policy for offline consistency:
@@ -32,31 +37,43 @@ from __future__ import annotations
 import argparse
 import json
 import os
+import shutil
 import socket
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse, urlunparse
 import urllib.error
 import urllib.request
 
 
+def _add_shared_dir_to_path() -> None:
+    # Modules shared between services live in ./shared: $GD_SHARED_DIR, else the nearest
+    # shared/ above this file (repo checkout), else /opt/shared (Docker mount).
+    here = Path(__file__).resolve()
+    candidates = [os.getenv("GD_SHARED_DIR"), *(str(p / "shared") for p in here.parents), "/opt/shared"]
+    for candidate in candidates:
+        if candidate and os.path.isfile(os.path.join(candidate, "cfp_formula.py")):
+            if candidate not in sys.path:
+                sys.path.insert(0, candidate)
+            return
+
+
+_add_shared_dir_to_path()
+from timestamp_parser import parse_timestamp_utc  # noqa: E402
+
+
 def _to_iso_z(dt: datetime) -> str:
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 
-def _parse_iso_dt(raw: str) -> Optional[datetime]:
-    s = str(raw).strip()
-    if not s:
-        return None
-    try:
-        return datetime.fromisoformat(s.replace("Z", "+00:00")).astimezone(timezone.utc)
-    except Exception:
-        return None
+def _parse_iso_dt(raw: str, key: str = "cli") -> Optional[datetime]:
+    return parse_timestamp_utc(raw, key, unix_seconds=False)
 
 
 def _ensure_utc(dt: datetime) -> datetime:
@@ -90,18 +107,8 @@ def _infer_times(fact: Dict[str, Any]) -> Tuple[datetime, datetime]:
         or fact.get("event_end")
     )
 
-    def _coerce_dt(v: Any) -> Optional[datetime]:
-        if v is None:
-            return None
-        if isinstance(v, datetime):
-            return _ensure_utc(v)
-        try:
-            return _ensure_utc(datetime.fromisoformat(str(v).replace("Z", "+00:00")))
-        except Exception:
-            return None
-
-    start = _coerce_dt(start_raw)
-    stop = _coerce_dt(stop_raw)
+    start = parse_timestamp_utc(start_raw, "start", unix_seconds=False)
+    stop = parse_timestamp_utc(stop_raw, "stop", unix_seconds=False)
 
     # If one side is missing, keep the one we have and set the other to the same value.
     if start is None and stop is not None:
@@ -411,27 +418,20 @@ class InputDoc:
     body: Any
 
 
-def iter_input_docs(path: Path) -> Iterator[InputDoc]:
-    """Yield InputDoc from JSONL or JSON (array/object)."""
-    # Streaming JSONL path (fast, low memory): extension hint or first-lines heuristic.
-    suffix = path.suffix.lower()
-    if suffix in {".jsonl", ".ndjson"}:
-        with path.open("r", encoding="utf-8") as fh:
-            for ln in fh:
-                s = ln.strip()
-                if not s:
-                    continue
-                obj = json.loads(s)
-                if isinstance(obj, dict) and "body" in obj:
-                    yield InputDoc(
-                        publisher_email=(obj.get("publisher_email") or obj.get("publisher") or None),
-                        timestamp=(obj.get("timestamp") or obj.get("ts") or None),
-                        body=obj.get("body"),
-                    )
-                else:
-                    yield InputDoc(publisher_email=None, timestamp=None, body=obj)
-        return
+def _doc_from_obj(obj: Any) -> InputDoc:
+    if isinstance(obj, dict) and "body" in obj:
+        return InputDoc(
+            publisher_email=(obj.get("publisher_email") or obj.get("publisher") or None),
+            timestamp=(obj.get("timestamp") or obj.get("ts") or None),
+            body=obj.get("body"),
+        )
+    return InputDoc(publisher_email=None, timestamp=None, body=obj)
+
 
+def is_jsonl_input(path: Path) -> bool:
+    """Extension hint or first-lines heuristic (several lines that each start with '{')."""
+    if path.suffix.lower() in {".jsonl", ".ndjson"}:
+        return True
     with path.open("r", encoding="utf-8") as fh:
         probe: List[str] = []
         for ln in fh:
@@ -441,21 +441,19 @@ def iter_input_docs(path: Path) -> Iterator[InputDoc]:
             probe.append(s)
             if len(probe) >= 5:
                 break
-    if len(probe) > 1 and all(ln.lstrip().startswith("{") for ln in probe):
+    return len(probe) > 1 and all(ln.lstrip().startswith("{") for ln in probe)
+
+
+def iter_input_docs(path: Path) -> Iterator[InputDoc]:
+    """Yield InputDoc from JSONL or JSON (array/object)."""
+    # Streaming JSONL path (fast, low memory).
+    if is_jsonl_input(path):
         with path.open("r", encoding="utf-8") as fh:
             for ln in fh:
                 s = ln.strip()
                 if not s:
                     continue
-                obj = json.loads(s)
-                if isinstance(obj, dict) and "body" in obj:
-                    yield InputDoc(
-                        publisher_email=(obj.get("publisher_email") or obj.get("publisher") or None),
-                        timestamp=(obj.get("timestamp") or obj.get("ts") or None),
-                        body=obj.get("body"),
-                    )
-                else:
-                    yield InputDoc(publisher_email=None, timestamp=None, body=obj)
+                yield _doc_from_obj(json.loads(s))
         return
 
     # Otherwise treat as JSON
@@ -463,26 +461,48 @@ def iter_input_docs(path: Path) -> Iterator[InputDoc]:
     obj = json.loads(text)
     if isinstance(obj, list):
         for item in obj:
-            if isinstance(item, dict) and "body" in item:
-                yield InputDoc(
-                    publisher_email=(item.get("publisher_email") or item.get("publisher") or None),
-                    timestamp=(item.get("timestamp") or item.get("ts") or None),
-                    body=item.get("body"),
-                )
-            else:
-                yield InputDoc(publisher_email=None, timestamp=None, body=item)
+            yield _doc_from_obj(item)
         return
 
-    if isinstance(obj, dict) and "body" in obj:
-        yield InputDoc(
-            publisher_email=(obj.get("publisher_email") or obj.get("publisher") or None),
-            timestamp=(obj.get("timestamp") or obj.get("ts") or None),
-            body=obj.get("body"),
-        )
-        return
+    # Single document, or fallback: treat as direct metric entry
+    yield _doc_from_obj(obj)
 
-    # Fallback: treat as direct metric entry
-    yield InputDoc(publisher_email=None, timestamp=None, body=obj)
+
+def jsonl_shards(path: Path, count: int) -> List[Tuple[int, int]]:
+    """Split a JSONL file into up to `count` byte ranges that start and end on line boundaries."""
+    size = path.stat().st_size
+    if size == 0:
+        return []
+    bounds = [0]
+    with path.open("rb") as fh:
+        for i in range(1, max(1, count)):
+            target = size * i // count
+            if target <= bounds[-1]:
+                continue
+            # The next line start at or after `target`.
+            fh.seek(target - 1)
+            fh.readline()
+            pos = fh.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_jsonl_range(path: Path, start: int, end: int) -> Iterator[InputDoc]:
+    """Yield InputDoc for the JSONL lines that start inside [start, end)."""
+    with path.open("rb") as fh:
+        fh.seek(start)
+        pos = start
+        while pos < end:
+            ln = fh.readline()
+            if not ln:
+                break
+            pos += len(ln)
+            s = ln.decode("utf-8").strip()
+            if not s:
+                continue
+            yield _doc_from_obj(json.loads(s))
 
 
 def slugify(email: str) -> str:
@@ -640,6 +660,274 @@ def apply_cfp_policy(fact: Dict[str, Any], enricher: Optional[KPIEnricher]) -> O
     return {"outcome": "null", "reason": "other"}
 
 
+PUBLISHER_COUNTERS = (
+    "envelopes",
+    "errors",
+    "cfp_looked_into",
+    "cfp_injected",
+    "cfp_null",
+    "cfp_null_no_ci_pue",
+    "cfp_null_other",
+)
+TOTAL_COUNTERS = (
+    "docs_seen",
+    "docs_selected",
+    "docs_filtered_out",
+    "entries_seen",
+    "metrics_processed",
+) + PUBLISHER_COUNTERS
+
+
+def _publisher_paths(out_dir: Path, key: str) -> Tuple[Path, Path]:
+    return out_dir / f"envelopes_{slugify(key)}.jsonl", out_dir / f"errors_{slugify(key)}.jsonl"
+
+
+def process_docs(
+    docs: Iterable[InputDoc],
+    *,
+    converter: Any,
+    enricher: Optional[KPIEnricher],
+    emails: Optional[set[str]],
+    start_dt: Optional[datetime],
+    end_dt: Optional[datetime],
+    out_dir: Path,
+    on_metric: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Tuple[Dict[str, int], Dict[str, Dict[str, Any]]]:
+    """
+    Filter, convert and CFP-review `docs`, writing envelopes/errors per publisher
+    into `out_dir`. Returns (totals, per-publisher counters in first-seen order).
+    """
+    totals = dict.fromkeys(TOTAL_COUNTERS, 0)
+    by_email_out: Dict[str, Dict[str, Any]] = {}
+
+    def _count(sink: Dict[str, Any], counter: str) -> None:
+        sink[counter] += 1
+        totals[counter] += 1
+
+    try:
+        for doc in docs:
+            totals["docs_seen"] += 1
+            pub = doc.publisher_email.lower() if isinstance(doc.publisher_email, str) else None
+
+            if emails is not None:
+                if pub is None or pub not in emails:
+                    totals["docs_filtered_out"] += 1
+                    continue
+
+            if doc.timestamp and (start_dt or end_dt):
+                ts_dt = _parse_iso_dt(doc.timestamp, "doc_timestamp")
+                if ts_dt is None:
+                    # Skip if timestamp filter requested and we can't parse
+                    totals["docs_filtered_out"] += 1
+                    continue
+                if start_dt is not None and ts_dt < start_dt:
+                    totals["docs_filtered_out"] += 1
+                    continue
+                if end_dt is not None and ts_dt > end_dt:
+                    totals["docs_filtered_out"] += 1
+                    continue
+
+            totals["docs_selected"] += 1
+            key = pub or "unknown"
+            if key not in by_email_out:
+                out_path, err_path = _publisher_paths(out_dir, key)
+                by_email_out[key] = {
+                    "out": out_path.open("w", encoding="utf-8"),
+                    "err": err_path.open("w", encoding="utf-8"),
+                    "out_path": out_path,
+                    "err_path": err_path,
+                    **dict.fromkeys(PUBLISHER_COUNTERS, 0),
+                }
+
+            sink = by_email_out[key]
+
+            body = doc.body
+            totals["entries_seen"] += 1
+
+            try:
+                recs = converter.convert(body)
+            except Exception as exc:
+                _count(sink, "errors")
+                sink["err"].write(json.dumps({"error": str(exc), "publisher_email": pub, "timestamp": doc.timestamp}) + "\n")
+                continue
+
+            for rec in recs:
+                totals["metrics_processed"] += 1
+                try:
+                    fact = dict(rec.fact_site_event)
+                    cfp_audit = apply_cfp_policy(fact, enricher)
+                    if cfp_audit is not None:
+                        _count(sink, "cfp_looked_into")
+                        if cfp_audit["outcome"] == "injected":
+                            _count(sink, "cfp_injected")
+                        else:
+                            _count(sink, "cfp_null")
+                            if cfp_audit["reason"] in {"no_ci", "no_pue", "no_ci_and_pue"}:
+                                _count(sink, "cfp_null_no_ci_pue")
+                            else:
+                                _count(sink, "cfp_null_other")
+
+                    env = build_envelope(rec.payload_type, fact, rec.detail_table, dict(rec.detail_row))
+                except Exception as exc:
+                    _count(sink, "errors")
+                    sink["err"].write(
+                        json.dumps({"error": str(exc), "publisher_email": pub, "timestamp": doc.timestamp, "raw": rec.raw}) + "\n"
+                    )
+                else:
+                    sink["out"].write(json.dumps(env, separators=(",", ":")) + "\n")
+                    _count(sink, "envelopes")
+
+                if on_metric is not None:
+                    on_metric(totals)
+    finally:
+        for sink in by_email_out.values():
+            sink.pop("out").close()
+            sink.pop("err").close()
+
+    return totals, by_email_out
+
+
+# --- parallel mode ------------------------------------------------------------------
+
+
+@dataclass
+class ShardTask:
+    index: int
+    dump: Path
+    start: int
+    end: int
+    out_dir: Path
+    emails: Optional[set[str]]
+    start_dt: Optional[datetime]
+    end_dt: Optional[datetime]
+    recorded_at: datetime
+    enricher_kwargs: Optional[Dict[str, Any]]
+
+
+def _process_shard(task: ShardTask) -> Dict[str, Any]:
+    """Worker entry point: convert one byte range of the dump into task.out_dir."""
+    CNRConverter = _load_cnr_converter()
+    converter = CNRConverter(recorded_at_fn=lambda: task.recorded_at)
+    enricher = KPIEnricher(**task.enricher_kwargs) if task.enricher_kwargs else None
+    pue_known = set(enricher.pue_cache) if enricher is not None else set()
+    ci_known = set(enricher.ci_cache) if enricher is not None else set()
+
+    task.out_dir.mkdir(parents=True, exist_ok=True)
+    totals, publishers = process_docs(
+        iter_jsonl_range(task.dump, task.start, task.end),
+        converter=converter,
+        enricher=enricher,
+        emails=task.emails,
+        start_dt=task.start_dt,
+        end_dt=task.end_dt,
+        out_dir=task.out_dir,
+    )
+    return {
+        "index": task.index,
+        "totals": totals,
+        "publishers": {k: {c: v[c] for c in PUBLISHER_COUNTERS} for k, v in publishers.items()},
+        # The parent merges what each worker learned into the persistent caches.
+        "enricher_stats": dict(enricher.stats) if enricher is not None else {},
+        "pue_cache_new": {k: v for k, v in enricher.pue_cache.items() if k not in pue_known} if enricher else {},
+        "ci_cache_new": {k: v for k, v in enricher.ci_cache.items() if k not in ci_known} if enricher else {},
+    }
+
+
+def merge_shard_outputs(
+    results: List[Dict[str, Any]],
+    parts_dir: Path,
+    out_dir: Path,
+) -> Tuple[Dict[str, int], Dict[str, Dict[str, Any]]]:
+    """
+    Concatenate per-shard publisher files in shard order and sum the counters, so
+    files and summary match a serial run over the same input.
+    """
+    results = sorted(results, key=lambda r: r["index"])
+    totals = dict.fromkeys(TOTAL_COUNTERS, 0)
+    publishers: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        for counter, value in result["totals"].items():
+            totals[counter] += value
+        for key, counters in result["publishers"].items():
+            if key not in publishers:
+                out_path, err_path = _publisher_paths(out_dir, key)
+                publishers[key] = {"out_path": out_path, "err_path": err_path, **dict.fromkeys(PUBLISHER_COUNTERS, 0)}
+            for counter, value in counters.items():
+                publishers[key][counter] += value
+
+    for key, pub in publishers.items():
+        for final_path in (pub["out_path"], pub["err_path"]):
+            with final_path.open("wb") as dst:
+                for result in results:
+                    part = parts_dir / f"{result['index']:05d}" / final_path.name
+                    if part.is_file():
+                        with part.open("rb") as src:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    return totals, publishers
+
+
+def run_parallel(
+    args: argparse.Namespace,
+    *,
+    workers: int,
+    emails: Optional[set[str]],
+    start_dt: Optional[datetime],
+    end_dt: Optional[datetime],
+    recorded_at: datetime,
+    enricher: Optional[KPIEnricher],
+    enricher_kwargs: Optional[Dict[str, Any]],
+) -> Tuple[Dict[str, int], Dict[str, Dict[str, Any]]]:
+    # More shards than workers keeps cores busy when publishers cluster in the file.
+    shards = jsonl_shards(args.dump, workers * 4)
+    parts_dir = args.out_dir / ".parts"
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    tasks = [
+        ShardTask(
+            index=i,
+            dump=args.dump,
+            start=start,
+            end=end,
+            out_dir=parts_dir / f"{i:05d}",
+            emails=emails,
+            start_dt=start_dt,
+            end_dt=end_dt,
+            recorded_at=recorded_at,
+            enricher_kwargs=enricher_kwargs,
+        )
+        for i, (start, end) in enumerate(shards)
+    ]
+    print(f"[process_dump] parallel mode: workers={workers} shards={len(tasks)}", file=sys.stderr, flush=True)
+
+    results: List[Dict[str, Any]] = []
+    processed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_process_shard, tasks):
+            results.append(result)
+            processed += result["totals"]["metrics_processed"]
+            if args.progress_every > 0:
+                print(
+                    f"[process_dump] shard {result['index'] + 1}/{len(tasks)} done processed_metrics={processed}",
+                    file=sys.stderr,
+                    flush=True,
+                )
+
+    if enricher is not None:
+        for result in results:
+            for counter, value in result["enricher_stats"].items():
+                enricher.stats[counter] = enricher.stats.get(counter, 0) + value
+            for cache, new_entries, flag in (
+                (enricher.pue_cache, result["pue_cache_new"], "_dirty_pue_cache"),
+                (enricher.ci_cache, result["ci_cache_new"], "_dirty_ci_cache"),
+            ):
+                for k, v in new_entries.items():
+                    if k not in cache:
+                        cache[k] = v
+                        setattr(enricher, flag, True)
+
+    return merge_shard_outputs(results, parts_dir, args.out_dir)
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(description="Convert Mongo export to CNR envelopes (JSONL).")
     ap.add_argument("dump", type=Path, help="Path to mongoexport file (JSONL or JSON).")
@@ -672,6 +960,21 @@ def main() -> int:
         action="store_true",
         help="Disable KPI enrichment calls/cache and keep only in-row CI/PUE values.",
     )
+    ap.add_argument(
+        "--recorded-at",
+        type=str,
+        default="",
+        help="recorded_at written on every row (ISO; default: run start). Set it to reproduce a previous run byte for byte.",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            "Worker processes (0 = one per CPU). Above 1, JSONL input is split into line-aligned byte ranges "
+            "converted in parallel; output files match a serial run. Each worker keeps its own KPI caches."
+        ),
+    )
     ap.add_argument(
         "--progress-every",
         type=int,
@@ -701,182 +1004,112 @@ def main() -> int:
     (args.out_dir / "export.txt").write_text(json.dumps(export_meta, indent=2) + "\n", encoding="utf-8")
 
     enricher: Optional[KPIEnricher] = None
+    enricher_kwargs: Optional[Dict[str, Any]] = None
     if not args.disable_kpi_enrichment:
         jwt_token = os.getenv("JWT_TOKEN", "").strip().strip("'").strip('"')
         if jwt_token:
-            enricher = KPIEnricher(
-                kpi_base=args.kpi_base,
-                jwt_token=jwt_token,
-                cache_granularity_s=args.cache_granularity_s,
-                sites_map_path=args.sites_map_path,
-                pue_cache_path=args.pue_cache_path,
-                ci_cache_path=args.ci_cache_path,
-            )
+            enricher_kwargs = {
+                "kpi_base": args.kpi_base,
+                "jwt_token": jwt_token,
+                "cache_granularity_s": args.cache_granularity_s,
+                "sites_map_path": args.sites_map_path,
+                "pue_cache_path": args.pue_cache_path,
+                "ci_cache_path": args.ci_cache_path,
+            }
+            enricher = KPIEnricher(**enricher_kwargs)
         else:
             print("[process_dump] JWT_TOKEN not found; KPI enrichment disabled.", file=sys.stderr)
 
-    CNRConverter = _load_cnr_converter()
-    converter = CNRConverter()
-
-    by_email_out: Dict[str, Any] = {}
-
-    total_docs = 0
-    total_docs_selected = 0
-    total_docs_filtered_out = 0
-    total_entries = 0
-    total_envelopes = 0
-    total_errors = 0
-    total_cfp_looked_into = 0
-    total_cfp_injected = 0
-    total_cfp_null = 0
-    total_cfp_null_no_ci_pue = 0
-    total_cfp_null_other = 0
-    total_metrics_processed = 0
-    bucket_start_metrics = 0
-    bucket_start_pue_req = 0
-    bucket_start_ci_req = 0
-
-    def _req_totals() -> Tuple[int, int]:
-        if enricher is None:
-            return 0, 0
-        pue_req = int(enricher.stats.get("pue_api_hit", 0)) + int(enricher.stats.get("pue_api_fail", 0))
-        ci_req = int(enricher.stats.get("ci_api_hit", 0)) + int(enricher.stats.get("ci_api_fail", 0))
-        return pue_req, ci_req
-
-    def _maybe_log_progress(force: bool = False) -> None:
-        nonlocal bucket_start_metrics, bucket_start_pue_req, bucket_start_ci_req
-        if args.progress_every <= 0:
-            return
-        if not force and (total_metrics_processed % args.progress_every) != 0:
-            return
-        if force and total_metrics_processed == bucket_start_metrics:
-            return
-        pue_req_total, ci_req_total = _req_totals()
-        pue_req_bucket = pue_req_total - bucket_start_pue_req
-        ci_req_bucket = ci_req_total - bucket_start_ci_req
-        metrics_bucket = total_metrics_processed - bucket_start_metrics
-        print(
-            (
-                f"[process_dump] processed_metrics={total_metrics_processed} "
-                f"bucket_metrics={metrics_bucket} "
-                f"req_pue={pue_req_total} (bucket={pue_req_bucket}) "
-                f"req_ci={ci_req_total} (bucket={ci_req_bucket}) "
-                f"docs_seen={total_docs} docs_selected={total_docs_selected} "
-                f"entries_seen={total_entries}"
-            ),
-            file=sys.stderr,
-            flush=True,
+    # One recorded_at for the whole run, so serial and parallel runs write the same rows.
+    recorded_at_dt = _parse_iso_dt(args.recorded_at) if args.recorded_at else None
+    if args.recorded_at and recorded_at_dt is None:
+        ap.error(f"Invalid --recorded-at: {args.recorded_at}")
+    recorded_at = (recorded_at_dt or datetime.now(timezone.utc)).replace(tzinfo=None)
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    if workers > 1 and not is_jsonl_input(args.dump):
+        print("[process_dump] --workers needs JSONL input; falling back to serial mode.", file=sys.stderr)
+        workers = 1
+
+    if workers > 1:
+        totals, by_email_out = run_parallel(
+            args,
+            workers=workers,
+            emails=emails,
+            start_dt=start_dt,
+            end_dt=end_dt,
+            recorded_at=recorded_at,
+            enricher=enricher,
+            enricher_kwargs=enricher_kwargs,
         )
-        bucket_start_metrics = total_metrics_processed
-        bucket_start_pue_req = pue_req_total
-        bucket_start_ci_req = ci_req_total
-
-    for doc in iter_input_docs(args.dump):
-        total_docs += 1
-        pub = doc.publisher_email.lower() if isinstance(doc.publisher_email, str) else None
-
-        if emails is not None:
-            if pub is None or pub not in emails:
-                total_docs_filtered_out += 1
-                continue
-
-        if doc.timestamp and (start_dt or end_dt):
-            ts_dt = _parse_iso_dt(doc.timestamp)
-            if ts_dt is None:
-                # Skip if timestamp filter requested and we can't parse
-                total_docs_filtered_out += 1
-                continue
-            if start_dt is not None and ts_dt < start_dt:
-                total_docs_filtered_out += 1
-                continue
-            if end_dt is not None and ts_dt > end_dt:
-                total_docs_filtered_out += 1
-                continue
-
-        total_docs_selected += 1
-        key = pub or "unknown"
-        if key not in by_email_out:
-            out_path = args.out_dir / f"envelopes_{slugify(key)}.jsonl"
-            err_path = args.out_dir / f"errors_{slugify(key)}.jsonl"
-            by_email_out[key] = {
-                "out": out_path.open("w", encoding="utf-8"),
-                "err": err_path.open("w", encoding="utf-8"),
-                "out_path": out_path,
-                "err_path": err_path,
-                "envelopes": 0,
-                "errors": 0,
-                "cfp_looked_into": 0,
-                "cfp_injected": 0,
-                "cfp_null": 0,
-                "cfp_null_no_ci_pue": 0,
-                "cfp_null_other": 0,
-            }
-
-        sink = by_email_out[key]
-
-        body = doc.body
-        total_entries += 1
-
-        try:
-            recs = converter.convert(body)
-        except Exception as exc:
-            sink["errors"] += 1
-            total_errors += 1
-            sink["err"].write(json.dumps({"error": str(exc), "publisher_email": pub, "timestamp": doc.timestamp}) + "\n")
-            continue
-
-        for rec in recs:
-            total_metrics_processed += 1
-            try:
-                fact = dict(rec.fact_site_event)
-                cfp_audit = apply_cfp_policy(fact, enricher)
-                if cfp_audit is not None:
-                    sink["cfp_looked_into"] += 1
-                    total_cfp_looked_into += 1
-                    if cfp_audit["outcome"] == "injected":
-                        sink["cfp_injected"] += 1
-                        total_cfp_injected += 1
-                    else:
-                        sink["cfp_null"] += 1
-                        total_cfp_null += 1
-                        if cfp_audit["reason"] in {"no_ci", "no_pue", "no_ci_and_pue"}:
-                            sink["cfp_null_no_ci_pue"] += 1
-                            total_cfp_null_no_ci_pue += 1
-                        else:
-                            sink["cfp_null_other"] += 1
-                            total_cfp_null_other += 1
-
-                env = build_envelope(rec.payload_type, fact, rec.detail_table, dict(rec.detail_row))
-            except Exception as exc:
-                sink["errors"] += 1
-                total_errors += 1
-                sink["err"].write(
-                    json.dumps({"error": str(exc), "publisher_email": pub, "timestamp": doc.timestamp, "raw": rec.raw}) + "\n"
-                )
-            else:
-                sink["out"].write(json.dumps(env, separators=(",", ":")) + "\n")
-                sink["envelopes"] += 1
-                total_envelopes += 1
-
-            _maybe_log_progress(force=False)
+    else:
+        CNRConverter = _load_cnr_converter()
+        converter = CNRConverter(recorded_at_fn=lambda: recorded_at)
+
+        bucket_start_metrics = 0
+        bucket_start_pue_req = 0
+        bucket_start_ci_req = 0
+
+        def _req_totals() -> Tuple[int, int]:
+            if enricher is None:
+                return 0, 0
+            pue_req = int(enricher.stats.get("pue_api_hit", 0)) + int(enricher.stats.get("pue_api_fail", 0))
+            ci_req = int(enricher.stats.get("ci_api_hit", 0)) + int(enricher.stats.get("ci_api_fail", 0))
+            return pue_req, ci_req
+
+        def _maybe_log_progress(counts: Dict[str, int], force: bool = False) -> None:
+            nonlocal bucket_start_metrics, bucket_start_pue_req, bucket_start_ci_req
+            total_metrics_processed = counts["metrics_processed"]
+            if args.progress_every <= 0:
+                return
+            if not force and (total_metrics_processed % args.progress_every) != 0:
+                return
+            if force and total_metrics_processed == bucket_start_metrics:
+                return
+            pue_req_total, ci_req_total = _req_totals()
+            pue_req_bucket = pue_req_total - bucket_start_pue_req
+            ci_req_bucket = ci_req_total - bucket_start_ci_req
+            metrics_bucket = total_metrics_processed - bucket_start_metrics
+            print(
+                (
+                    f"[process_dump] processed_metrics={total_metrics_processed} "
+                    f"bucket_metrics={metrics_bucket} "
+                    f"req_pue={pue_req_total} (bucket={pue_req_bucket}) "
+                    f"req_ci={ci_req_total} (bucket={ci_req_bucket}) "
+                    f"docs_seen={counts['docs_seen']} docs_selected={counts['docs_selected']} "
+                    f"entries_seen={counts['entries_seen']}"
+                ),
+                file=sys.stderr,
+                flush=True,
+            )
+            bucket_start_metrics = total_metrics_processed
+            bucket_start_pue_req = pue_req_total
+            bucket_start_ci_req = ci_req_total
+
+        totals, by_email_out = process_docs(
+            iter_input_docs(args.dump),
+            converter=converter,
+            enricher=enricher,
+            emails=emails,
+            start_dt=start_dt,
+            end_dt=end_dt,
+            out_dir=args.out_dir,
+            on_metric=_maybe_log_progress,
+        )
+        _maybe_log_progress(totals, force=True)
 
-    for sink in by_email_out.values():
-        sink["out"].close()
-        sink["err"].close()
     if enricher is not None:
         enricher.persist()
 
-    _maybe_log_progress(force=True)
-
     summary = {
         "dump": str(args.dump),
         "out_dir": str(args.out_dir),
-        "docs_seen": total_docs,
-        "docs_selected": total_docs_selected,
-        "docs_filtered_out": total_docs_filtered_out,
-        "entries_seen": total_entries,
-        "envelopes_written": total_envelopes,
-        "errors": total_errors,
+        "docs_seen": totals["docs_seen"],
+        "docs_selected": totals["docs_selected"],
+        "docs_filtered_out": totals["docs_filtered_out"],
+        "entries_seen": totals["entries_seen"],
+        "envelopes_written": totals["envelopes"],
+        "errors": totals["errors"],
         "kpi_enrichment": {
             "enabled": enricher is not None,
             "kpi_base": args.kpi_base,
@@ -887,12 +1120,12 @@ def main() -> int:
             "stats": (enricher.stats if enricher is not None else {}),
         },
         "cfp_review": {
-            "looked_into_rows": total_cfp_looked_into,
-            "successfully_injected_rows": total_cfp_injected,
-            "null_rows": total_cfp_null,
+            "looked_into_rows": totals["cfp_looked_into"],
+            "successfully_injected_rows": totals["cfp_injected"],
+            "null_rows": totals["cfp_null"],
             "null_reasons": {
-                "no_ci_pue": total_cfp_null_no_ci_pue,
-                "other": total_cfp_null_other,
+                "no_ci_pue": totals["cfp_null_no_ci_pue"],
+                "other": totals["cfp_null_other"],
             },
         },
         "per_publisher": {
@@ -0,0 +1,61 @@
+# cfp_formula.py
+"""
+Carbon footprint (CFP) formula shared by the KPI service and the CIM transformer.
+
+Both services import this module (mounted at /opt/shared in the containers) so a
+record's CFP is identical whether it is computed by KPI `/ci`, KPI `/cfp` or
+in-process by the CIM service. Bump CFP_FORMULA_VERSION whenever the formula or
+its rounding changes.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+CFP_FORMULA_VERSION = "1"
+
+# Stored CFP values are rounded to this many decimals (grams).
+CFP_ROUND_DIGITS = 4
+
+
+@dataclass(frozen=True)
+class CFPResult:
+    ci_gco2_per_kwh: float
+    pue: float
+    effective_ci_gco2_per_kwh: float
+    energy_wh: Optional[float]
+    cfp_g: Optional[float]
+    cfp_kg: Optional[float]
+    formula_version: str = CFP_FORMULA_VERSION
+
+
+def effective_ci(ci_g: float, pue: float) -> float:
+    """Effective carbon intensity in gCO2/kWh: CI * PUE."""
+    return ci_g * pue
+
+
+def cfp_grams(energy_wh: float, pue: float, ci_g: float) -> float:
+    """CFP in grams: E(kWh) * PUE * CI(gCO2/kWh)."""
+    return (energy_wh / 1000.0) * effective_ci(ci_g, pue)
+
+
+def round_cfp(cfp_g: float) -> float:
+    return round(cfp_g, CFP_ROUND_DIGITS)
+
+
+def compute_cfp(ci_g: float, pue: float, energy_wh: Optional[float] = None) -> CFPResult:
+    """Full breakdown as returned by the KPI endpoints; CFP fields are None without energy."""
+    eff_ci = effective_ci(ci_g, pue)
+    cfp_g = None
+    cfp_kg = None
+    if energy_wh is not None:
+        cfp_g = (energy_wh / 1000.0) * eff_ci
+        cfp_kg = cfp_g / 1000.0
+    return CFPResult(
+        ci_gco2_per_kwh=ci_g,
+        pue=pue,
+        effective_ci_gco2_per_kwh=eff_ci,
+        energy_wh=energy_wh,
+        cfp_g=cfp_g,
+        cfp_kg=cfp_kg,
+    )
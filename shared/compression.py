@@ -0,0 +1,172 @@
+# compression.py
+"""
+Content-Encoding support shared by the CIM service, the SQL adapter and the auth
+server: streaming decompression of request bodies (gzip/deflate, zstd when the
+`zstandard` package happens to be installed) and gzip compression of large
+internal forwards.
+
+`StreamDecoder` is fed chunks as they arrive (ASGI bodies); `DecompressingReader`
+wraps it as a file-like `read(size)` over a blocking source (http.server).
+"""
+from __future__ import annotations
+
+import gzip
+import zlib
+from typing import Callable, List, Optional
+
+try:  # optional; the service images do not install it
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+_READ_SIZE = 16 * 1024
+
+
+class BodyDecodeError(ValueError):
+    status = 400
+
+
+class BodyTooLarge(BodyDecodeError):
+    status = 413
+
+
+class UnsupportedEncoding(BodyDecodeError):
+    status = 415
+
+
+def supported_encodings() -> List[str]:
+    encodings = ["gzip", "deflate"]
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+def normalise_encoding(header: Optional[str]) -> str:
+    value = (header or "").strip().lower()
+    if value in ("", "identity"):
+        return "identity"
+    if value == "x-gzip":
+        return "gzip"
+    return value
+
+
+class _ZlibStream:
+    # wbits=47 accepts both gzip and zlib framing; concatenated gzip members are handled below.
+    def __init__(self) -> None:
+        self._obj = zlib.decompressobj(wbits=47)
+
+    def feed(self, data: bytes) -> bytes:
+        out = self._obj.decompress(data)
+        while self._obj.eof and self._obj.unused_data:
+            rest = self._obj.unused_data
+            self._obj = zlib.decompressobj(wbits=47)
+            out += self._obj.decompress(rest)
+        return out
+
+    def finish(self) -> bytes:
+        if not self._obj.eof:
+            raise BodyDecodeError("truncated compressed body")
+        return self._obj.flush()
+
+
+class _ZstdStream:
+    def __init__(self) -> None:
+        self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def feed(self, data: bytes) -> bytes:
+        return self._obj.decompress(data)
+
+    def finish(self) -> bytes:
+        # `eof` exists on zstandard >= 0.17; older releases cannot tell a truncated frame.
+        if not getattr(self._obj, "eof", True):
+            raise BodyDecodeError("truncated compressed body")
+        return b""
+
+
+class StreamDecoder:
+    """
+    Incremental decoder for one request body: `feed` each received chunk, then
+    `finish` once the body has ended (a truncated stream raises there).
+    `max_bytes` caps the decoded size (0 = unlimited). All failures raise
+    BodyDecodeError subclasses carrying the HTTP status to answer with.
+    """
+
+    def __init__(self, encoding: str, *, max_bytes: int = 0) -> None:
+        encoding = normalise_encoding(encoding)
+        if encoding in ("gzip", "deflate"):
+            self._stream = _ZlibStream()
+        elif encoding == "zstd" and zstandard is not None:
+            self._stream = _ZstdStream()
+        else:
+            raise UnsupportedEncoding(f"Unsupported Content-Encoding: {encoding}")
+        self._max_bytes = max_bytes
+        self._decoded = 0
+
+    def _count(self, out: bytes) -> bytes:
+        self._decoded += len(out)
+        if self._max_bytes and self._decoded > self._max_bytes:
+            raise BodyTooLarge(f"Decoded body exceeds {self._max_bytes} bytes")
+        return out
+
+    def feed(self, data: bytes) -> bytes:
+        try:
+            out = self._stream.feed(data) if data else b""
+        except Exception as exc:
+            raise BodyDecodeError(f"Invalid compressed body: {exc}") from exc
+        return self._count(out)
+
+    def finish(self) -> bytes:
+        try:
+            out = self._stream.finish()
+        except BodyDecodeError:
+            raise
+        except Exception as exc:
+            raise BodyDecodeError(f"Invalid compressed body: {exc}") from exc
+        return self._count(out)
+
+
+class DecompressingReader:
+    """
+    File-like `read(size)` over a compressed byte source. Output is produced as
+    input is consumed, so neither the whole compressed nor the whole decoded body
+    has to be in memory. `max_bytes` caps the decoded size (0 = unlimited).
+    """
+
+    def __init__(self, read: Callable[[int], bytes], encoding: str, *, max_bytes: int = 0) -> None:
+        self._decoder = StreamDecoder(encoding, max_bytes=max_bytes)
+        self._read = read
+        self._buf = bytearray()
+        self.eof = False
+
+    def _fill(self) -> None:
+        raw = self._read(_READ_SIZE)
+        if raw:
+            self._buf += self._decoder.feed(raw)
+        else:
+            self._buf += self._decoder.finish()
+            self.eof = True
+
+    def read(self, size: int = -1) -> bytes:
+        """Return `size` bytes (fewer only at end of stream); size < 0 reads everything."""
+        while not self.eof and (size < 0 or len(self._buf) < size):
+            self._fill()
+        if size < 0 or size >= len(self._buf):
+            data = bytes(self._buf)
+            self._buf.clear()
+            return data
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+    def at_end(self) -> bool:
+        while not self._buf and not self.eof:
+            self._fill()
+        return not self._buf
+
+    def pushback(self, data: bytes) -> None:
+        self._buf[:0] = data
+
+
+def gzip_body(data: bytes, level: int = 5) -> bytes:
+    # mtime=0 keeps the output deterministic for identical payloads.
+    return gzip.compress(data, compresslevel=level, mtime=0)
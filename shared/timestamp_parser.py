@@ -0,0 +1,142 @@
+# timestamp_parser.py
+"""
+Timestamp parsing shared by the CIM transform, the auth server and the offline dump
+processor.
+
+Partner payloads use a handful of layouts (DIRAC "YYYY-MM-DD HH:MM:SS", ISO 8601
+with "Z" or an offset, optional fractional seconds, Unix seconds). Each layout is
+recognised by a precompiled pattern and converted without raising, and the layout
+that last worked is remembered per `key` (e.g. a field name) and tried first, so a
+batch of records in one layout skips detection entirely. Anything unrecognised
+falls back to the permissive `fromisoformat`/`strptime` path.
+
+Unix seconds are only accepted from callers that expect them (the CIM transform);
+the auth server and process_dump pass `unix_seconds=False` and keep their
+ISO/DIRAC-only behaviour.
+
+Usage:
+    parse_timestamp("2026-01-15 09:20:10", key="StartExecTime")   # naive UTC
+    parse_timestamp_utc("2026-01-14T20:07:04.773563Z")            # aware UTC
+"""
+from __future__ import annotations
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_FALLBACK_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f")
+
+
+# Shape of each layout; converters below only run on strings that match.
+_DATETIME = r"[0-9]{4}-[0-9]{2}-[0-9]{2}[T ][0-9]{2}:[0-9]{2}:[0-9]{2}(?:\.[0-9]{1,6})?"
+_NAIVE_RE = re.compile(_DATETIME)
+_Z_RE = re.compile(_DATETIME + "Z")
+_OFFSET_RE = re.compile(_DATETIME + r"[+-][0-9]{2}:[0-9]{2}")
+# Unix seconds (rare, but happens). \d, not [0-9]: float() accepts any Unicode digits.
+_UNIX_RE = re.compile(r"\d{10}(?:\.\d+)?")
+
+
+# --- layouts: (shape, converter to naive UTC) -------------------------------------
+
+
+def _conv_naive(s: str) -> datetime:
+    return datetime.fromisoformat(s)
+
+
+def _conv_z(s: str) -> datetime:
+    return datetime.fromisoformat(s[:-1])
+
+
+def _conv_offset(s: str) -> datetime:
+    if s.endswith(("+00:00", "-00:00")):
+        return datetime.fromisoformat(s[:-6])
+    return datetime.fromisoformat(s).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _conv_unix(s: str) -> datetime:
+    if len(s) == 10:
+        return _EPOCH + timedelta(seconds=int(s))
+    return datetime.fromtimestamp(float(s), tz=timezone.utc).replace(tzinfo=None)
+
+
+_LAYOUTS: Tuple[Tuple[str, Callable[[str], Any], Callable[[str], datetime]], ...] = (
+    ("naive", _NAIVE_RE.fullmatch, _conv_naive),
+    ("utc_z", _Z_RE.fullmatch, _conv_z),
+    ("offset", _OFFSET_RE.fullmatch, _conv_offset),
+    ("unix", _UNIX_RE.fullmatch, _conv_unix),
+)
+_UNIX_LAYOUT = len(_LAYOUTS) - 1
+
+# key -> index into _LAYOUTS of the layout that last parsed a value for that key.
+_LAST_LAYOUT: Dict[Hashable, int] = {}
+_LAST_LAYOUT_MAX = 1024
+
+
+def _parse_slow(s: str) -> Optional[datetime]:
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(s)
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timezone.utc)
+        return dt.replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in _FALLBACK_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_timestamp(value: Any, key: Hashable = None, *, unix_seconds: bool = True) -> Optional[datetime]:
+    """
+    Parse `value` into a naive UTC datetime (offsets are converted, naive input is
+    taken as UTC). Returns None for None, empty or unparseable values.
+    `key` selects the layout cache; use the field name or source the value came from.
+    `unix_seconds=False` rejects Unix-second strings instead of converting them.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.replace(tzinfo=None)
+
+    s = value.strip() if isinstance(value, str) else str(value).strip()
+    if not s:
+        return None
+
+    last = _LAST_LAYOUT.get(key)
+    if last is not None and (unix_seconds or last != _UNIX_LAYOUT):
+        _, match, convert = _LAYOUTS[last]
+        if match(s):
+            try:
+                return convert(s)
+            except (ValueError, OverflowError, OSError):
+                pass  # right shape, impossible value (e.g. month 13)
+
+    layouts = _LAYOUTS if unix_seconds else _LAYOUTS[:_UNIX_LAYOUT]
+    for i, (_, match, convert) in enumerate(layouts):
+        if i == last or not match(s):
+            continue
+        try:
+            dt = convert(s)
+        except (ValueError, OverflowError, OSError):
+            break
+        if len(_LAST_LAYOUT) >= _LAST_LAYOUT_MAX and key not in _LAST_LAYOUT:
+            _LAST_LAYOUT.clear()
+        _LAST_LAYOUT[key] = i
+        return dt
+
+    return _parse_slow(s)
+
+
+def parse_timestamp_utc(value: Any, key: Hashable = None, *, unix_seconds: bool = True) -> Optional[datetime]:
+    """Like `parse_timestamp`, but returns a timezone-aware UTC datetime."""
+    dt = parse_timestamp(value, key, unix_seconds=unix_seconds)
+    return None if dt is None else dt.replace(tzinfo=timezone.utc)